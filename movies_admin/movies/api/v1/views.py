@@ -2,17 +2,13 @@
 import uuid
 
 # Third Party
-from django.contrib.postgres.aggregates import ArrayAgg
-from django.db.models import Q
+from django.db.models.fields.json import KeyTransform
 from django.http import JsonResponse
 from django.views.generic.detail import BaseDetailView
 from django.views.generic.list import BaseListView
 
 # First Party
-from movies.models import (
-    Filmwork,
-    PersonFilmWork,
-)
+from movies.models import Filmwork
 
 
 class MoviesApiMixin:
@@ -20,33 +16,15 @@ class MoviesApiMixin:
     http_method_names = ["get"]
 
     def get_queryset(self):
-        """Реализация взята отсюда: https://app.pachca.com/chats?thread_id=3049591
-        С некоторыми уточнениями.
+        """Жанры и персоны по ролям берутся из готового документа фильма
+        (content.film_work_document), а не агрегируются заново на каждый запрос.
         """
-        return (
-            MoviesListApi.model.objects.select_related(
-                "genrefilmwork",
-                "personfilmwork",
-            )
-            .values("id", "title", "description", "creation_date", "rating", "type")
-            .annotate(
-                genres=ArrayAgg("genrefilmwork__genre__name", distinct=True),
-                actors=ArrayAgg(
-                    "personfilmwork__person__full_name",
-                    distinct=True,
-                    filter=Q(personfilmwork__role=PersonFilmWork.RoleTypes.ACTOR),
-                ),
-                directors=ArrayAgg(
-                    "personfilmwork__person__full_name",
-                    distinct=True,
-                    filter=Q(personfilmwork__role=PersonFilmWork.RoleTypes.DIRECTOR),
-                ),
-                writers=ArrayAgg(
-                    "personfilmwork__person__full_name",
-                    distinct=True,
-                    filter=Q(personfilmwork__role=PersonFilmWork.RoleTypes.WRITER),
-                ),
-            )
+        fields = ("id", "title", "description", "creation_date", "rating", "type")
+        return MoviesListApi.model.objects.values(*fields).annotate(
+            genres=KeyTransform("genre", "document__document"),
+            actors=KeyTransform("actors_names", "document__document"),
+            directors=KeyTransform("director", "document__document"),
+            writers=KeyTransform("writers_names", "document__document"),
         )
 
     def render_to_response(self, context, **response_kwargs):
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.5 on 2026-10-18 10:12
+
+# Third Party
+from django.db import (
+    migrations,
+    models,
+)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("movies", "0012_alter_personfilmwork_role"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="filmwork",
+            index=models.Index(
+                fields=["updated_at", "id"],
+                name="film_work_updated_at_id_idx",
+            ),
+        ),
+    ]
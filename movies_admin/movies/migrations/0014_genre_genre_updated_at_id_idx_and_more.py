@@ -0,0 +1,30 @@
+# Generated by Django 4.2.5 on 2026-10-18 11:02
+
+# Third Party
+from django.db import (
+    migrations,
+    models,
+)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("movies", "0013_filmwork_film_work_updated_at_id_idx"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="genre",
+            index=models.Index(
+                fields=["updated_at", "id"],
+                name="genre_updated_at_id_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="person",
+            index=models.Index(
+                fields=["updated_at", "id"],
+                name="person_updated_at_id_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 4.2.5 on 2026-10-18 12:40
+
+# Third Party
+from django.db import migrations
+
+
+NOTIFY_FUNCTION = """
+CREATE OR REPLACE FUNCTION content.notify_content_change() RETURNS trigger AS $$
+DECLARE
+    id_column text := TG_ARGV[1];
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM pg_notify(
+            'content_changes',
+            json_build_object('table', TG_ARGV[0], 'id', to_jsonb(OLD) ->> id_column)::text
+        );
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM pg_notify(
+            'content_changes',
+            json_build_object('table', TG_ARGV[0], 'id', to_jsonb(NEW) ->> id_column)::text
+        );
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+# Таблица, изменения которой слушаем -> (таблица-источник ETL, колонка с её id).
+TRIGGERS = {
+    "film_work": ("film_work", "id"),
+    "person": ("person", "id"),
+    "genre": ("genre", "id"),
+    "person_film_work": ("film_work", "film_work_id"),
+    "genre_film_work": ("film_work", "film_work_id"),
+}
+
+
+def create_trigger_sql(table: str, producer: str, id_column: str) -> str:
+    return (
+        f"CREATE TRIGGER {table}_notify_change "
+        f"AFTER INSERT OR UPDATE OR DELETE ON content.{table} "
+        f"FOR EACH ROW EXECUTE FUNCTION content.notify_content_change('{producer}', '{id_column}')"
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("movies", "0014_genre_genre_updated_at_id_idx_and_more"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            NOTIFY_FUNCTION,
+            reverse_sql="DROP FUNCTION IF EXISTS content.notify_content_change();",
+        ),
+        *(
+            migrations.RunSQL(
+                create_trigger_sql(table, producer, id_column),
+                reverse_sql=f"DROP TRIGGER IF EXISTS {table}_notify_change ON content.{table};",
+            )
+            for table, (producer, id_column) in TRIGGERS.items()
+        ),
+    ]
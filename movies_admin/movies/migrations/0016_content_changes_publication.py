@@ -0,0 +1,34 @@
+# Generated by Django 4.2.5 on 2026-10-18 13:20
+
+# Third Party
+from django.db import migrations
+
+
+CONTENT_TABLES = ("film_work", "person", "genre", "person_film_work", "genre_film_work")
+LINK_TABLES = ("person_film_work", "genre_film_work")
+
+
+class Migration(migrations.Migration):
+    """Публикация для логической репликации в postgres_to_es.
+
+    Удаления из таблиц связей должны нести film_work_id, поэтому у них
+    REPLICA IDENTITY FULL.
+    """
+
+    dependencies = [
+        ("movies", "0015_content_change_notify"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            "CREATE PUBLICATION content_changes FOR TABLE " + ", ".join(f"content.{table}" for table in CONTENT_TABLES),
+            reverse_sql="DROP PUBLICATION IF EXISTS content_changes",
+        ),
+        *(
+            migrations.RunSQL(
+                f"ALTER TABLE content.{table} REPLICA IDENTITY FULL",
+                reverse_sql=f"ALTER TABLE content.{table} REPLICA IDENTITY DEFAULT",
+            )
+            for table in LINK_TABLES
+        ),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 4.2.5 on 2026-10-18 15:10
+
+# Third Party
+from django.db import migrations
+
+
+TOMBSTONE_TABLE = """
+CREATE TABLE content.tombstone (
+    id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+    table_name text NOT NULL,
+    row_id uuid NOT NULL,
+    film_work_id uuid,
+    person_id uuid,
+    genre_id uuid,
+    deleted_at timestamp with time zone NOT NULL DEFAULT clock_timestamp(),
+    sealed_at timestamp with time zone
+);
+CREATE INDEX tombstone_sealed_at_id_idx ON content.tombstone (sealed_at, id);
+CREATE INDEX tombstone_unsealed_idx ON content.tombstone (id) WHERE sealed_at IS NULL;
+"""
+
+# Один INSERT на оператор DELETE: удалённые строки берутся из переходной таблицы.
+TOMBSTONE_FUNCTION = """
+CREATE OR REPLACE FUNCTION content.record_tombstones() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO content.tombstone (table_name, row_id, film_work_id, person_id, genre_id)
+    SELECT
+        TG_TABLE_NAME,
+        d.id,
+        (to_jsonb(d) ->> 'film_work_id')::uuid,
+        (to_jsonb(d) ->> 'person_id')::uuid,
+        (to_jsonb(d) ->> 'genre_id')::uuid
+    FROM deleted d;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+CONTENT_TABLES = ("film_work", "person", "genre", "person_film_work", "genre_film_work")
+
+
+def create_trigger_sql(table: str) -> str:
+    return (
+        f"CREATE TRIGGER {table}_record_tombstones "
+        f"AFTER DELETE ON content.{table} REFERENCING OLD TABLE AS deleted "
+        f"FOR EACH STATEMENT EXECUTE FUNCTION content.record_tombstones()"
+    )
+
+
+class Migration(migrations.Migration):
+    """Надгробия удалённых строк content.* для postgres_to_es.
+
+    Удалённую строку ETL уже не найдёт ни по updated_at, ни по id, поэтому
+    триггеры записывают её id (и id связанных строк для таблиц связей)
+    в content.tombstone. Время удаления не годится для курсора: надгробие
+    долгой транзакции появляется после более поздних. Поэтому ETL сам
+    проставляет sealed_at уже зафиксированным надгробиям и читает их по
+    ключу (sealed_at, id).
+    """
+
+    dependencies = [
+        ("movies", "0016_content_changes_publication"),
+    ]
+
+    operations = [
+        migrations.RunSQL(TOMBSTONE_TABLE, reverse_sql="DROP TABLE IF EXISTS content.tombstone;"),
+        migrations.RunSQL(
+            TOMBSTONE_FUNCTION,
+            reverse_sql="DROP FUNCTION IF EXISTS content.record_tombstones();",
+        ),
+        *(
+            migrations.RunSQL(
+                create_trigger_sql(table),
+                reverse_sql=f"DROP TRIGGER IF EXISTS {table}_record_tombstones ON content.{table};",
+            )
+            for table in CONTENT_TABLES
+        ),
+    ]
@@ -0,0 +1,282 @@
+# Generated by Django 4.2.5 on 2026-10-18 16:30
+
+# Third Party
+import django.db.models.deletion
+from django.db import (
+    migrations,
+    models,
+)
+
+
+DOCUMENT_TABLE = """
+CREATE TABLE content.film_work_document (
+    id uuid PRIMARY KEY,
+    document jsonb NOT NULL,
+    updated_at timestamp with time zone NOT NULL
+);
+CREATE INDEX film_work_document_updated_at_id_idx ON content.film_work_document (updated_at, id);
+"""
+
+# Документ собирается так же, как movie_index_sql_script() в postgres_to_es:
+# персоны и жанры агрегируются по фильмам отдельно и присоединяются готовыми.
+# Строка переписывается, только если документ изменился, поэтому updated_at -
+# время последнего изменения самого документа.
+REFRESH_FUNCTION = """
+CREATE OR REPLACE FUNCTION content.refresh_film_work_documents(film_ids uuid[]) RETURNS void AS $$
+BEGIN
+    IF cardinality(film_ids) = 0 THEN
+        RETURN;
+    END IF;
+    INSERT INTO content.film_work_document AS d (id, document, updated_at)
+    SELECT
+        fw.id,
+        jsonb_build_object(
+            'id', fw.id,
+            'imdb_rating', fw.rating,
+            'title', fw.title,
+            'description', fw.description,
+            'genre', COALESCE(genres.genre, '[]'),
+            'director', COALESCE(persons.director, '[]'),
+            'actors_names', COALESCE(persons.actors_names, '[]'),
+            'writers_names', COALESCE(persons.writers_names, '[]'),
+            'actors', COALESCE(persons.actors, '[]'),
+            'writers', COALESCE(persons.writers, '[]')
+        ),
+        now()
+    FROM content.film_work fw
+    LEFT JOIN (
+        SELECT
+            pfw.film_work_id,
+            JSONB_AGG(DISTINCT p.full_name) FILTER (WHERE pfw.role = 'director') AS director,
+            JSONB_AGG(DISTINCT jsonb_build_object('id', p.id, 'name', p.full_name))
+                FILTER (WHERE pfw.role = 'actor') AS actors,
+            JSONB_AGG(DISTINCT jsonb_build_object('id', p.id, 'name', p.full_name))
+                FILTER (WHERE pfw.role = 'writer') AS writers,
+            JSONB_AGG(DISTINCT p.full_name) FILTER (WHERE pfw.role = 'actor') AS actors_names,
+            JSONB_AGG(DISTINCT p.full_name) FILTER (WHERE pfw.role = 'writer') AS writers_names
+        FROM content.person_film_work pfw
+        JOIN content.person p ON p.id = pfw.person_id
+        WHERE pfw.film_work_id = ANY(film_ids)
+        GROUP BY pfw.film_work_id
+    ) persons ON persons.film_work_id = fw.id
+    LEFT JOIN (
+        SELECT
+            gfw.film_work_id,
+            JSONB_AGG(DISTINCT g.name) AS genre
+        FROM content.genre_film_work gfw
+        JOIN content.genre g ON g.id = gfw.genre_id
+        WHERE gfw.film_work_id = ANY(film_ids)
+        GROUP BY gfw.film_work_id
+    ) genres ON genres.film_work_id = fw.id
+    WHERE fw.id = ANY(film_ids)
+    ON CONFLICT (id) DO UPDATE
+        SET document = EXCLUDED.document, updated_at = EXCLUDED.updated_at
+        WHERE d.document IS DISTINCT FROM EXCLUDED.document;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+# Триггеры уровня оператора: затронутые фильмы берутся из переходных таблиц
+# и пересобираются одним вызовом на оператор.
+TRIGGER_FUNCTIONS = """
+CREATE OR REPLACE FUNCTION content.film_work_document_on_film_work() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        DELETE FROM content.film_work_document WHERE id IN (SELECT id FROM old_rows);
+    ELSE
+        PERFORM content.refresh_film_work_documents(ARRAY(SELECT id FROM new_rows));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION content.film_work_document_on_link() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM content.refresh_film_work_documents(ARRAY(SELECT DISTINCT film_work_id FROM new_rows));
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM content.refresh_film_work_documents(ARRAY(SELECT DISTINCT film_work_id FROM old_rows));
+    ELSE
+        PERFORM content.refresh_film_work_documents(
+            ARRAY(SELECT film_work_id FROM old_rows UNION SELECT film_work_id FROM new_rows)
+        );
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION content.film_work_document_on_person() RETURNS trigger AS $$
+BEGIN
+    PERFORM content.refresh_film_work_documents(ARRAY(
+        SELECT DISTINCT pfw.film_work_id
+        FROM new_rows n
+        JOIN old_rows o ON o.id = n.id
+        JOIN content.person_film_work pfw ON pfw.person_id = n.id
+        WHERE n.full_name IS DISTINCT FROM o.full_name
+    ));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION content.film_work_document_on_genre() RETURNS trigger AS $$
+BEGIN
+    PERFORM content.refresh_film_work_documents(ARRAY(
+        SELECT DISTINCT gfw.film_work_id
+        FROM new_rows n
+        JOIN old_rows o ON o.id = n.id
+        JOIN content.genre_film_work gfw ON gfw.genre_id = n.id
+        WHERE n.name IS DISTINCT FROM o.name
+    ));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+TRIGGER_FUNCTION_NAMES = (
+    "film_work_document_on_film_work",
+    "film_work_document_on_link",
+    "film_work_document_on_person",
+    "film_work_document_on_genre",
+)
+
+TRANSITION_TABLES = {
+    "INSERT": "NEW TABLE AS new_rows",
+    "UPDATE": "OLD TABLE AS old_rows NEW TABLE AS new_rows",
+    "DELETE": "OLD TABLE AS old_rows",
+}
+
+# Таблица -> (функция триггера, операции). Удаление персоны или жанра
+# приходит через удаление их связей; вставка - ещё без связей.
+TRIGGERS = {
+    "film_work": ("film_work_document_on_film_work", ("INSERT", "UPDATE", "DELETE")),
+    "person_film_work": ("film_work_document_on_link", ("INSERT", "UPDATE", "DELETE")),
+    "genre_film_work": ("film_work_document_on_link", ("INSERT", "UPDATE", "DELETE")),
+    "person": ("film_work_document_on_person", ("UPDATE",)),
+    "genre": ("film_work_document_on_genre", ("UPDATE",)),
+}
+
+# Триггеры, через которые изменения таблицы видит ETL: ими и членством
+# в публикации content_changes управляет content.track_film_work_document().
+TRACKING_TRIGGERS = {
+    "film_work_document_notify_change": (
+        "CREATE TRIGGER film_work_document_notify_change "
+        "AFTER INSERT OR UPDATE OR DELETE ON content.film_work_document "
+        "FOR EACH ROW EXECUTE FUNCTION content.notify_content_change('film_work_document', 'id')"
+    ),
+    "film_work_document_record_tombstones": (
+        "CREATE TRIGGER film_work_document_record_tombstones "
+        "AFTER DELETE ON content.film_work_document REFERENCING OLD TABLE AS deleted "
+        "FOR EACH STATEMENT EXECUTE FUNCTION content.record_tombstones()"
+    ),
+}
+
+TRACKING_FUNCTION = """
+CREATE OR REPLACE FUNCTION content.track_film_work_document(enabled boolean) RETURNS void AS $$
+DECLARE
+    published boolean := EXISTS (
+        SELECT FROM pg_publication_tables
+        WHERE pubname = 'content_changes' AND schemaname = 'content' AND tablename = 'film_work_document'
+    );
+BEGIN
+    IF enabled THEN
+        ALTER TABLE content.film_work_document ENABLE TRIGGER film_work_document_notify_change;
+        ALTER TABLE content.film_work_document ENABLE TRIGGER film_work_document_record_tombstones;
+        IF NOT published THEN
+            ALTER PUBLICATION content_changes ADD TABLE content.film_work_document;
+        END IF;
+    ELSE
+        ALTER TABLE content.film_work_document DISABLE TRIGGER film_work_document_notify_change;
+        ALTER TABLE content.film_work_document DISABLE TRIGGER film_work_document_record_tombstones;
+        IF published THEN
+            ALTER PUBLICATION content_changes DROP TABLE content.film_work_document;
+        END IF;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+
+def trigger_name(table: str, operation: str) -> str:
+    return f"{table}_document_{operation.lower()}"
+
+
+def create_trigger_sql(table: str, function: str, operation: str) -> str:
+    # Переходные таблицы допустимы только у триггера на одну операцию.
+    return (
+        f"CREATE TRIGGER {trigger_name(table, operation)} "
+        f"AFTER {operation} ON content.{table} REFERENCING {TRANSITION_TABLES[operation]} "
+        f"FOR EACH STATEMENT EXECUTE FUNCTION content.{function}()"
+    )
+
+
+class Migration(migrations.Migration):
+    """Готовые документы фильмов в content.film_work_document.
+
+    Триггеры на пяти таблицах content.* пересобирают документы затронутых
+    фильмов, поэтому postgres_to_es и API фильмов читают одну узкую таблицу
+    вместо соединения пяти. NOTIFY, надгробия и публикация таблицы нужны
+    только ETL в режиме FILM_WORK_DOCUMENT_TABLE, поэтому триггеры создаются
+    выключенными, а включает их сам ETL через content.track_film_work_document().
+    """
+
+    dependencies = [
+        ("movies", "0017_content_tombstones"),
+    ]
+
+    operations = [
+        migrations.RunSQL(DOCUMENT_TABLE, reverse_sql="DROP TABLE IF EXISTS content.film_work_document;"),
+        migrations.RunSQL(
+            REFRESH_FUNCTION,
+            reverse_sql="DROP FUNCTION IF EXISTS content.refresh_film_work_documents(uuid[]);",
+        ),
+        migrations.RunSQL(
+            TRIGGER_FUNCTIONS,
+            reverse_sql="".join(f"DROP FUNCTION IF EXISTS content.{name}();" for name in TRIGGER_FUNCTION_NAMES),
+        ),
+        *(
+            migrations.RunSQL(
+                create_trigger_sql(table, function, operation),
+                reverse_sql=f"DROP TRIGGER IF EXISTS {trigger_name(table, operation)} ON content.{table};",
+            )
+            for table, (function, operations) in TRIGGERS.items()
+            for operation in operations
+        ),
+        migrations.RunSQL(
+            "SELECT content.refresh_film_work_documents(ARRAY(SELECT id FROM content.film_work))",
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        *(
+            migrations.RunSQL(
+                f"{sql}; ALTER TABLE content.film_work_document DISABLE TRIGGER {name}",
+                reverse_sql=f"DROP TRIGGER IF EXISTS {name} ON content.film_work_document;",
+            )
+            for name, sql in TRACKING_TRIGGERS.items()
+        ),
+        migrations.RunSQL(
+            TRACKING_FUNCTION,
+            reverse_sql="DROP FUNCTION IF EXISTS content.track_film_work_document(boolean);",
+        ),
+        migrations.CreateModel(
+            name="FilmworkDocument",
+            fields=[
+                (
+                    "film_work",
+                    models.OneToOneField(
+                        db_column="id",
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        primary_key=True,
+                        related_name="document",
+                        serialize=False,
+                        to="movies.filmwork",
+                    ),
+                ),
+                ("document", models.JSONField()),
+                ("updated_at", models.DateTimeField()),
+            ],
+            options={
+                "db_table": 'content"."film_work_document',
+                "managed": False,
+            },
+        ),
+    ]
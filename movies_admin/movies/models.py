@@ -57,6 +57,9 @@ class UUIDMixin(models.Model):
 class Genre(UUIDMixin, TimeStampedMixin):
     class Meta:
         db_table = 'content"."genre'
+        indexes = [
+            models.Index(fields=["updated_at", "id"], name="genre_updated_at_id_idx"),
+        ]
         verbose_name = _("Genre")
         verbose_name_plural = _("Genres")
 
@@ -70,6 +73,9 @@ class Genre(UUIDMixin, TimeStampedMixin):
 class Person(UUIDMixin, TimeStampedMixin):
     class Meta:
         db_table = 'content"."person'
+        indexes = [
+            models.Index(fields=["updated_at", "id"], name="person_updated_at_id_idx"),
+        ]
         verbose_name = _("Actor")
         verbose_name_plural = _("Actors")
 
@@ -84,6 +90,7 @@ class Filmwork(UUIDMixin, TimeStampedMixin):
         db_table = 'content"."film_work'
         indexes = [
             models.Index(fields=["creation_date"], name="film_work_creation_date_idx"),
+            models.Index(fields=["updated_at", "id"], name="film_work_updated_at_id_idx"),
         ]
         verbose_name = _("Film")
         verbose_name_plural = _("Films")
@@ -148,3 +155,22 @@ class PersonFilmWork(UUIDMixin):
     created_at = models.DateTimeField(auto_now_add=True)
     film_work = models.ForeignKey("Filmwork", on_delete=models.DO_NOTHING)
     person = models.ForeignKey("Person", on_delete=models.DO_NOTHING)
+
+
+class FilmworkDocument(models.Model):
+    """Готовый документ фильма: таблицу ведут триггеры Postgres (миграция 0018)."""
+
+    class Meta:
+        db_table = 'content"."film_work_document'
+        managed = False
+
+    document = models.JSONField()
+    updated_at = models.DateTimeField()
+    film_work = models.OneToOneField(
+        "Filmwork",
+        primary_key=True,
+        db_column="id",
+        db_constraint=False,
+        on_delete=models.DO_NOTHING,
+        related_name="document",
+    )
@@ -1,3 +1,65 @@
+# Third Party
 from django.test import TestCase
 
-# Create your tests here.
+# First Party
+from movies.models import (
+    Filmwork,
+    Genre,
+    GenreFilmWork,
+    Person,
+    PersonFilmWork,
+)
+
+
+class MoviesApiTest(TestCase):
+    """API фильмов читает жанры и персоны из content.film_work_document, который ведут триггеры."""
+
+    @classmethod
+    def setUpTestData(cls):
+        drama = Genre.objects.create(name="Drama")
+        ann = Person.objects.create(full_name="Ann")
+        cls.bob = Person.objects.create(full_name="Bob")
+        cls.film = Filmwork.objects.create(title="Full", rating=7.5, type=Filmwork.FilmworkTypes.MOVIE)
+        cls.bare = Filmwork.objects.create(title="Bare", type=Filmwork.FilmworkTypes.MOVIE)
+        GenreFilmWork.objects.create(film_work=cls.film, genre=drama)
+        for person, role in (
+            (ann, PersonFilmWork.RoleTypes.DIRECTOR),
+            (cls.bob, PersonFilmWork.RoleTypes.ACTOR),
+            (ann, PersonFilmWork.RoleTypes.ACTOR),
+            (cls.bob, PersonFilmWork.RoleTypes.WRITER),
+        ):
+            PersonFilmWork.objects.create(film_work=cls.film, person=person, role=role)
+
+    def get_movie(self, film: Filmwork) -> dict:
+        response = self.client.get(f"/api/v1/movies/{film.id}/")
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_detail(self):
+        movie = self.get_movie(self.film)
+        self.assertEqual(movie["title"], "Full")
+        self.assertEqual(movie["genres"], ["Drama"])
+        self.assertEqual(movie["actors"], ["Ann", "Bob"])
+        self.assertEqual(movie["directors"], ["Ann"])
+        self.assertEqual(movie["writers"], ["Bob"])
+
+    def test_film_without_genres_and_persons_gets_empty_lists(self):
+        # Агрегат по LEFT JOIN жанров отдавал таким фильмам genres = [null], вопреки схеме API.
+        movie = self.get_movie(self.bare)
+        for field in ("genres", "actors", "directors", "writers"):
+            self.assertEqual(movie[field], [])
+
+    def test_list(self):
+        response = self.client.get("/api/v1/movies/")
+        self.assertEqual(response.status_code, 200)
+        results = {movie["title"]: movie for movie in response.json()["results"]}
+        self.assertEqual(response.json()["count"], 2)
+        self.assertEqual(results["Full"]["genres"], ["Drama"])
+        self.assertEqual(results["Bare"]["genres"], [])
+
+    def test_person_rename_reaches_document(self):
+        self.bob.full_name = "Robert"
+        self.bob.save()
+        movie = self.get_movie(self.film)
+        self.assertEqual(movie["actors"], ["Ann", "Robert"])
+        self.assertEqual(movie["writers"], ["Robert"])
@@ -0,0 +1,289 @@
+# Standard Library
+import asyncio
+import logging
+from typing import (
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
+
+# Third Party
+from elasticsearch import (
+    AsyncElasticsearch,
+    helpers,
+)
+from es_loader import (
+    ESLoader,
+    RetryableBulkError,
+    bulk_error_id,
+    make_dead_letters,
+    split_bulk_errors,
+)
+from postgres_extractor import PGExtractor
+from psycopg import (
+    AsyncClientCursor,
+    AsyncConnection,
+)
+from psycopg.rows import dict_row
+from tenacity import AsyncRetrying
+
+# First Party
+from config.etl_config import (
+    RETRY_CONFIG,
+    ESConfigSettings,
+    ETLConfig,
+    ETLIndexes,
+    ETLProducers,
+    PostgresConnectParameters,
+)
+from config.etl_models import (
+    KeysetCursor,
+    RawDocument,
+    document_id,
+)
+from config.index_registry import get_index_spec
+from config.metrics import (
+    BULK_SECONDS,
+    DEAD_LETTERED_DOCUMENTS,
+    FAILED_DOCUMENTS,
+    PG_QUERY_SECONDS,
+    STAGE_ROWS,
+    label,
+    timed,
+)
+from config.sql_queries import (
+    PreparedStatement,
+    film_work_ids_sql_script,
+    get_query_by_index,
+    keyset_page_sql_script,
+    related_ids_sql_script,
+)
+from config.states import RedisState
+from etl import (
+    ETL,
+    SyncReport,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+class PageCommitted(NamedTuple):
+    """Маркер конца страницы: идёт по очередям следом за её документами."""
+
+    table: str
+    cursor: KeysetCursor
+    films: int
+
+
+class AsyncETL(ETL):
+    """Асинхронный движок ETL.
+
+    Извлечение (psycopg 3), преобразование и загрузка (AsyncElasticsearch)
+    работают одновременно и связаны очередями размером ASYNC_QUEUE_SIZE:
+    медленная стадия останавливает предыдущие, а не копит данные в памяти.
+    Курсор страницы сохраняется, когда до загрузчика доходит её маркер,
+    то есть после загрузки всех её документов; курсор своей таблицы индекса,
+    кроме того, сдвигается после каждой подтверждённой ES пачки.
+    Неизменившиеся документы, как и в синхронном движке, отсеиваются по хэшу,
+    а хэши сохраняются после подтверждения ES.
+    """
+
+    def __init__(
+        self,
+        postgres_settings: PostgresConnectParameters,
+        state: RedisState,
+        es_conn: AsyncElasticsearch,
+        es_config: Optional[ESConfigSettings],
+    ) -> None:
+        super().__init__(postgres_settings, state, es_conn, es_config)
+        self._pg_conn: Optional[AsyncConnection] = None
+        self._prepared: Set[str] = set()
+
+    async def arun(self, indexes: ETLIndexes) -> SyncReport:
+        report = SyncReport()
+        for index in self._known_indexes(indexes):
+            query = get_query_by_index(index=index, passthrough=self._passthrough_for(index))
+
+            cursors = await asyncio.to_thread(self.prepare_cursors, index)
+            rows: asyncio.Queue = asyncio.Queue(maxsize=ETLConfig.queue_size)
+            documents: asyncio.Queue = asyncio.Queue(maxsize=ETLConfig.queue_size)
+            tasks = [
+                asyncio.create_task(self._extract(index, query, cursors, rows, report)),
+                asyncio.create_task(self._transform(index, rows, documents)),
+                asyncio.create_task(self._load(index, documents)),
+            ]
+            try:
+                await asyncio.gather(*tasks)
+            finally:
+                for task in tasks:
+                    task.cancel()
+        return report
+
+    async def close(self) -> None:
+        if self._pg_conn is not None:
+            await self._pg_conn.close()
+        await self._es_conn.close()
+
+    async def _pg_connection(self) -> AsyncConnection:
+        if self._pg_conn is None or self._pg_conn.closed:
+            self._pg_conn = await AsyncConnection.connect(
+                **self._postgres_settings().model_dump(),
+                row_factory=dict_row,
+                cursor_factory=AsyncClientCursor,
+            )
+            self._prepared = set()
+        return self._pg_conn
+
+    async def _fetch_prepared(self, statement: PreparedStatement, params: Sequence = ()) -> List[dict]:
+        conn = await self._pg_connection()
+        async with conn.cursor() as cur:
+            if statement.name not in self._prepared:
+                await cur.execute(statement.prepare)
+                self._prepared.add(statement.name)
+            with timed(PG_QUERY_SECONDS, statement.name):
+                await cur.execute(statement.execute, params)
+                rows = await cur.fetchall()
+        await conn.rollback()
+        return rows
+
+    async def _extract(
+        self,
+        index: str,
+        query: str,
+        cursors: Dict[str, KeysetCursor],
+        out: asyncio.Queue,
+        report: SyncReport,
+    ) -> None:
+        page_size = ETLConfig.page_size
+        own_table = get_index_spec(index).table
+        for table, cursor in cursors.items():
+            while page := await self._get_page(table, cursor, page_size):
+                report.account(page)
+                ids = [str(row.id) for row in page]
+                if table != own_table:
+                    ids = await self._related_ids(own_table, table, ids)
+                for start in range(0, len(ids), page_size):
+                    await self._stream_documents(query, ids[start : start + page_size], table == own_table, out)
+
+                cursor = page[-1]
+                await out.put(PageCommitted(table=table, cursor=cursor, films=len(ids)))
+                if len(page) < page_size:
+                    break
+        await out.put(None)
+
+    async def _get_page(self, table: str, cursor: KeysetCursor, page_size: int) -> List[KeysetCursor]:
+        async for attempt in AsyncRetrying(**RETRY_CONFIG):
+            with attempt:
+                rows = await self._fetch_prepared(
+                    keyset_page_sql_script(table),
+                    (cursor.updated_at, str(cursor.id), page_size),
+                )
+        return [KeysetCursor(**row) for row in rows]
+
+    async def _related_ids(self, own_table: str, table: str, ids: List[str]) -> List[str]:
+        """id строк own_table, чьи документы зависят от изменённых строк table, как в ETL.resolve_changes."""
+        if own_table == ETLProducers.film_work:
+            statement = film_work_ids_sql_script(table)
+        else:
+            statement = related_ids_sql_script(own_table)
+        return [str(row["id"]) for row in await self._fetch_prepared(statement, (ids,))]
+
+    async def _stream_documents(self, query: str, ids: List[str], checkpoint: bool, out: asyncio.Queue) -> None:
+        itersize = ETLConfig.batch_size
+        conn = await self._pg_connection()
+        async with conn.cursor(name="async_extractor") as cur:
+            await cur.execute(query, {"ids": ids})
+            while rows := await cur.fetchmany(itersize):
+                for row in rows:
+                    await out.put((row, checkpoint))
+        await conn.rollback()
+
+    async def _transform(self, index: str, inp: asyncio.Queue, out: asyncio.Queue) -> None:
+        model = PGExtractor.get_model(index)
+        while (item := await inp.get()) is not None:
+            if not isinstance(item, PageCommitted):
+                row, checkpoint = item
+                cursor = KeysetCursor.model_construct(id=row["id"], updated_at=row["modified"]) if checkpoint else None
+                item = (PGExtractor.to_document(model, row, self._passthrough_for(index)), cursor)
+            await out.put(item)
+        await out.put(None)
+
+    async def _load(self, index: str, inp: asyncio.Queue) -> None:
+        itersize = ETLConfig.batch_size
+        chunk: List[Tuple[Union[dict, RawDocument], Optional[KeysetCursor]]] = []
+        while (item := await inp.get()) is not None:
+            if isinstance(item, PageCommitted):
+                await self._bulk(index, chunk)
+                chunk = []
+                await asyncio.to_thread(self.set_cursor, index, item.cursor, item.table)
+                logger.info(f"Page of {item.table} committed for index {index}: {item.films} films at {item.cursor}")
+                continue
+
+            chunk.append(item)
+            if len(chunk) >= itersize:
+                await self._bulk(index, chunk)
+                chunk = []
+        await self._bulk(index, chunk)
+
+    async def _bulk(self, index: str, chunk: List[Tuple[Union[dict, RawDocument], Optional[KeysetCursor]]]) -> None:
+        """Загрузить пачку без неизменившихся документов и сохранить хэши и курсор после подтверждения ES."""
+        if not chunk:
+            return
+        pending, hashes = await asyncio.to_thread(
+            self._transformer.drop_unchanged,
+            index,
+            [document for document, _ in chunk],
+        )
+        rejected = await self._send(index, pending) if pending else set()
+        await asyncio.to_thread(
+            self._transformer.save_hashes,
+            index,
+            {doc_id: doc_hash for doc_id, doc_hash in hashes.items() if doc_id not in rejected},
+        )
+        logger.info(
+            f"{len(pending) - len(rejected)} saved in index {index}, {len(chunk) - len(pending)} unchanged skipped",
+        )
+
+        checkpoint = chunk[-1][1]
+        if checkpoint is not None:
+            await asyncio.to_thread(self.set_cursor, index, checkpoint, get_index_spec(index).table)
+
+    async def _send(self, index: str, pending: List[Union[dict, RawDocument]]) -> Set[str]:
+        """Отправить документы; как и ESLoader, повторяет только временные ошибки, а постоянные - в недоставленные.
+
+        Возвращает id документов, ушедших в недоставленные.
+        """
+        documents = {document_id(document): document for document in pending}
+        dead_letters: List[dict] = []
+        try:
+            async for attempt in AsyncRetrying(**{**RETRY_CONFIG, "reraise": True}):
+                with attempt, timed(BULK_SECONDS, index):
+                    indexed, errors = await helpers.async_bulk(
+                        client=self._es_conn,
+                        actions=pending,
+                        index=index,
+                        chunk_size=len(pending),
+                        expand_action_callback=ESLoader.expand_action,
+                        raise_on_error=False,
+                    )
+                    STAGE_ROWS.labels("load", label(index)).inc(indexed)
+                    retryable, permanent = split_bulk_errors(errors)
+                    dead_letters.extend(permanent)
+                    if retryable:
+                        pending = [documents[bulk_error_id(error)] for error in retryable]
+                        raise RetryableBulkError(retryable)
+        except RetryableBulkError as e:
+            FAILED_DOCUMENTS.labels(label(index)).inc(len(e.errors))
+            raise helpers.BulkIndexError(f"{len(e.errors)} document(s) failed to index.", e.errors)
+        finally:
+            if dead_letters:
+                await asyncio.to_thread(self._dead_letters.add, index, make_dead_letters(dead_letters, documents))
+                DEAD_LETTERED_DOCUMENTS.labels(label(index)).inc(len(dead_letters))
+                logger.warning(f"{len(dead_letters)} document(s) rejected by index {index} moved to dead letters")
+        return {bulk_error_id(error) for error in dead_letters}
@@ -0,0 +1,217 @@
+# Standard Library
+import argparse
+import io
+import logging
+import random
+import sys
+import uuid
+from dataclasses import dataclass
+from datetime import (
+    date,
+    datetime,
+    timedelta,
+    timezone,
+)
+from typing import (
+    Iterable,
+    List,
+    Sequence,
+)
+
+# Third Party
+import psycopg2
+from psycopg2.extensions import connection
+
+# First Party
+from config.etl_config import PostgresConnectParameters
+
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TABLES = ("person_film_work", "genre_film_work", "film_work", "person", "genre")
+
+
+@dataclass
+class CatalogShape:
+    """Размер и форма синтетического каталога.
+
+    Число участников фильма выбирается равномерно в указанных пределах,
+    а сами персоны - со смещением к началу списка: как и в реальном
+    каталоге, немногие популярные актёры снимаются в большом числе фильмов.
+    """
+
+    films: int = 10000
+    persons: int = 6000
+    genres: int = 30
+    genres_per_film: Sequence[int] = (1, 3)
+    directors_per_film: Sequence[int] = (1, 2)
+    writers_per_film: Sequence[int] = (1, 3)
+    actors_per_film: Sequence[int] = (3, 12)
+    tv_show_share: float = 0.2
+
+
+class CatalogGenerator:
+    """Заполняет content.* синтетическими данными через COPY.
+
+    Пользовательские триггеры таблиц (NOTIFY для режима listen) на время
+    загрузки выключаются, чтобы не слать уведомление на каждую строку.
+    """
+
+    def __init__(self, conn: connection, shape: CatalogShape, seed: int) -> None:
+        self._conn = conn
+        self._shape = shape
+        self._random = random.Random(seed)
+        self._now = datetime.now(timezone.utc)
+
+    @staticmethod
+    def _has_document_table(cur) -> bool:
+        cur.execute("SELECT to_regclass('content.film_work_document') IS NOT NULL")
+        return cur.fetchone()[0]
+
+    @staticmethod
+    def _copy(cur, table: str, columns: Sequence[str], rows: Iterable[tuple]) -> None:
+        buffer = io.StringIO()
+        count = 0
+        for row in rows:
+            buffer.write("\t".join(str(value) for value in row))
+            buffer.write("\n")
+            count += 1
+        buffer.seek(0)
+        cur.copy_expert(f"COPY content.{table} ({', '.join(columns)}) FROM STDIN", buffer)
+        logger.info(f"{count} rows copied into content.{table}")
+
+    def is_empty(self) -> bool:
+        with self._conn.cursor() as cur:
+            cur.execute("SELECT NOT EXISTS (SELECT 1 FROM content.film_work)")
+            return cur.fetchone()[0]
+
+    def generate(self, truncate: bool) -> None:
+        with self._conn, self._conn.cursor() as cur:
+            documents = self._has_document_table(cur)
+            for table in CONTENT_TABLES:
+                cur.execute(f"ALTER TABLE content.{table} DISABLE TRIGGER USER")
+            if truncate:
+                cur.execute(f"TRUNCATE {', '.join(f'content.{table}' for table in CONTENT_TABLES)}")
+                if documents:
+                    cur.execute("TRUNCATE content.film_work_document")
+
+            genres = self._ids(self._shape.genres)
+            persons = self._ids(self._shape.persons)
+            films = self._ids(self._shape.films)
+            self._copy(
+                cur,
+                "genre",
+                ("id", "name", "description", "created_at", "updated_at"),
+                self._genre_rows(genres),
+            )
+            self._copy(cur, "person", ("id", "full_name", "created_at", "updated_at"), self._person_rows(persons))
+            self._copy(
+                cur,
+                "film_work",
+                ("id", "title", "description", "creation_date", "rating", "type", "created_at", "updated_at"),
+                self._film_rows(films),
+            )
+            self._copy(
+                cur,
+                "genre_film_work",
+                ("id", "film_work_id", "genre_id", "created_at"),
+                self._genre_links(films, genres),
+            )
+            self._copy(
+                cur,
+                "person_film_work",
+                ("id", "film_work_id", "person_id", "role", "created_at"),
+                self._person_links(films, persons),
+            )
+
+            # Отложенные проверки внешних ключей выполняются сейчас, иначе ENABLE TRIGGER не пройдёт.
+            cur.execute("SET CONSTRAINTS ALL IMMEDIATE")
+            for table in CONTENT_TABLES:
+                cur.execute(f"ALTER TABLE content.{table} ENABLE TRIGGER USER")
+            if documents:
+                # Триггеры документов при COPY выключены: документы всех фильмов собираются одним вызовом.
+                cur.execute("SELECT content.refresh_film_work_documents(ARRAY(SELECT id FROM content.film_work))")
+                cur.execute("ANALYZE content.film_work_document")
+            cur.execute(f"ANALYZE {', '.join(f'content.{table}' for table in CONTENT_TABLES)}")
+        logger.info(f"Generated {self._shape}")
+
+    def _ids(self, count: int) -> List[str]:
+        return [self._uuid() for _ in range(count)]
+
+    def _uuid(self) -> str:
+        return str(uuid.UUID(int=self._random.getrandbits(128), version=4))
+
+    def _timestamp(self) -> str:
+        return (self._now - timedelta(seconds=self._random.randrange(365 * 24 * 3600))).isoformat()
+
+    def _pick(self, population: List[str], bounds: Sequence[int], skewed: bool) -> List[str]:
+        count = min(self._random.randint(*bounds), len(population))
+        picked = set()
+        while len(picked) < count:
+            position = self._random.random() ** 2 if skewed else self._random.random()
+            picked.add(population[int(position * len(population))])
+        return list(picked)
+
+    def _genre_rows(self, genres: List[str]) -> Iterable[tuple]:
+        for number, genre_id in enumerate(genres):
+            yield genre_id, f"Genre {number}", f"Synthetic genre {number}", self._timestamp(), self._timestamp()
+
+    def _person_rows(self, persons: List[str]) -> Iterable[tuple]:
+        for number, person_id in enumerate(persons):
+            yield person_id, f"Person {number}", self._timestamp(), self._timestamp()
+
+    def _film_rows(self, films: List[str]) -> Iterable[tuple]:
+        for number, film_id in enumerate(films):
+            yield (
+                film_id,
+                f"Film {number}",
+                " ".join(f"word{self._random.randrange(5000)}" for _ in range(self._random.randint(10, 60))),
+                (date(1950, 1, 1) + timedelta(days=self._random.randrange(27000))).isoformat(),
+                round(self._random.uniform(1, 10), 1),
+                "tv_show" if self._random.random() < self._shape.tv_show_share else "movie",
+                self._timestamp(),
+                self._timestamp(),
+            )
+
+    def _genre_links(self, films: List[str], genres: List[str]) -> Iterable[tuple]:
+        for film_id in films:
+            for genre_id in self._pick(genres, self._shape.genres_per_film, skewed=True):
+                yield self._uuid(), film_id, genre_id, self._now.isoformat()
+
+    def _person_links(self, films: List[str], persons: List[str]) -> Iterable[tuple]:
+        roles = (
+            ("director", self._shape.directors_per_film),
+            ("writer", self._shape.writers_per_film),
+            ("actor", self._shape.actors_per_film),
+        )
+        for film_id in films:
+            for role, bounds in roles:
+                for person_id in self._pick(persons, bounds, skewed=True):
+                    yield self._uuid(), film_id, person_id, role, self._now.isoformat()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Fill content.* with a synthetic catalog for ETL benchmarks")
+    parser.add_argument("--films", type=int, default=CatalogShape.films)
+    parser.add_argument("--persons", type=int, default=CatalogShape.persons)
+    parser.add_argument("--genres", type=int, default=CatalogShape.genres)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--truncate", action="store_true", help="delete the existing catalog first")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    args = parse_args()
+    pg_conn = psycopg2.connect(**PostgresConnectParameters().model_dump())
+    try:
+        generator = CatalogGenerator(
+            pg_conn,
+            CatalogShape(films=args.films, persons=args.persons, genres=args.genres),
+            seed=args.seed,
+        )
+        if not args.truncate and not generator.is_empty():
+            sys.exit("content.film_work is not empty, rerun with --truncate to replace the catalog")
+        generator.generate(truncate=args.truncate)
+    finally:
+        pg_conn.close()
@@ -0,0 +1,130 @@
+# Standard Library
+import gzip
+import json
+import threading
+import time
+from dataclasses import dataclass
+from http.server import (
+    BaseHTTPRequestHandler,
+    ThreadingHTTPServer,
+)
+from typing import (
+    Dict,
+    List,
+    Optional,
+)
+
+
+@dataclass
+class BulkRequest:
+    """Один принятый _bulk: документы, байты тела и на проводе, время на «сервере»."""
+
+    index: Optional[str]
+    documents: int
+    size: int
+    wire_size: int
+    seconds: float
+
+
+class _BulkHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "FakeElasticsearch"
+
+    def log_message(self, format: str, *args) -> None:  # noqa: A002
+        pass
+
+    def do_HEAD(self) -> None:
+        self._send_headers(200, 0)
+
+    def do_GET(self) -> None:
+        self._send({"version": {"number": "8.12.0"}, "tagline": "You Know, for Search"})
+
+    def do_PUT(self) -> None:
+        self.do_POST()
+
+    def do_POST(self) -> None:
+        wire = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = gzip.decompress(wire) if self.headers.get("Content-Encoding") == "gzip" else wire
+        parts = [part for part in self.path.split("?")[0].split("/") if part]
+        if not parts or parts[-1] != "_bulk":
+            self._send({"acknowledged": True})
+            return
+
+        start = time.perf_counter()
+        items = []
+        lines = body.splitlines()
+        for line in lines[::2]:
+            if not line:
+                continue
+            action, meta = next(iter(json.loads(line).items()))
+            items.append({action: {"_id": meta.get("_id"), "status": 200, "result": "updated"}})
+        # Документы не разбираются: stand-in меряет клиента, а не индексирование.
+        response = {"took": 0, "errors": False, "items": items}
+        self.server.record(
+            BulkRequest(
+                index=parts[0] if len(parts) > 1 else None,
+                documents=len(items),
+                size=len(body),
+                wire_size=len(wire),
+                seconds=time.perf_counter() - start,
+            ),
+        )
+        self._send(response)
+
+    def _send(self, payload: dict) -> None:
+        body = json.dumps(payload).encode()
+        self._send_headers(200, len(body))
+        self.wfile.write(body)
+
+    def _send_headers(self, status: int, length: int) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("X-Elastic-Product", "Elasticsearch")
+        self.send_header("Content-Length", str(length))
+        self.end_headers()
+
+
+class FakeElasticsearch(ThreadingHTTPServer):
+    """Заглушка Elasticsearch в том же процессе: принимает _bulk и записывает запросы.
+
+    Отвечает на любой _bulk успехом по каждому документу, на остальные
+    запросы - пустым подтверждением, поэтому ESLoader и клиент
+    elasticsearch работают с ней так же, как с кластером.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0) -> None:
+        super().__init__((host, port), _BulkHandler)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.requests: List[BulkRequest] = []
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def record(self, request: BulkRequest) -> None:
+        with self._lock:
+            self.requests.append(request)
+
+    def summary(self) -> Dict[str, float]:
+        with self._lock:
+            requests = list(self.requests)
+        return {
+            "requests": len(requests),
+            "documents": sum(request.documents for request in requests),
+            "bytes": sum(request.size for request in requests),
+            "wire_bytes": sum(request.wire_size for request in requests),
+            "server_seconds": sum(request.seconds for request in requests),
+        }
+
+    def __enter__(self) -> "FakeElasticsearch":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,168 @@
+# Standard Library
+import argparse
+import json
+import logging
+import statistics
+from typing import (
+    Any,
+    Dict,
+    List,
+    Tuple,
+)
+
+# Third Party
+import psycopg2
+from psycopg2.extensions import connection
+from psycopg2.extras import RealDictCursor
+
+# First Party
+from config.etl_config import PostgresConnectParameters
+from config.sql_queries import movie_index_sql_script
+
+
+logger = logging.getLogger(__name__)
+
+# Запрос movies до агрегации персон и жанров по фильмам: эталон, с которым сверяется movie_index_sql_script().
+LEGACY_MOVIE_QUERY = """
+        SELECT
+           fw.id,
+           fw.title,
+           fw.description,
+           fw.rating AS imdb_rating,
+           COALESCE(
+            JSON_AGG(
+                   DISTINCT p.full_name)
+                   FILTER (WHERE p.id is not null AND pfw.role = 'director'), '[]') AS director,
+           COALESCE(
+            JSON_AGG(
+                   DISTINCT jsonb_build_object('id', p.id, 'name', p.full_name))
+                   FILTER (WHERE p.id is not null AND pfw.role = 'actor'), '[]') AS actors,
+           COALESCE(
+            JSON_AGG(
+                   DISTINCT jsonb_build_object('id', p.id, 'name', p.full_name))
+                   FILTER (WHERE p.id is not null AND pfw.role = 'writer'), '[]') AS writers,
+           COALESCE(
+            JSON_AGG(DISTINCT p.full_name)
+               FILTER (WHERE p.id is not null AND pfw.role = 'actor'), '[]') AS actors_names,
+           COALESCE(
+            JSON_AGG(DISTINCT p.full_name)
+               FILTER (WHERE p.id is not null AND pfw.role = 'writer'), '[]') AS writers_names,
+           COALESCE(
+            JSON_AGG(DISTINCT g.name), '[]') AS genre,
+           fw.updated_at AS modified
+        FROM content.film_work fw
+        LEFT JOIN content.person_film_work pfw ON pfw.film_work_id = fw.id
+        LEFT JOIN content.person p ON p.id = pfw.person_id
+        LEFT JOIN content.genre_film_work gfw ON gfw.film_work_id = fw.id
+        LEFT JOIN content.genre g ON g.id = gfw.genre_id
+        WHERE fw.id = ANY(%(ids)s::uuid[])
+        GROUP BY fw.id
+        ORDER BY fw.updated_at ASC, fw.id ASC
+        """
+
+QUERIES = {
+    "legacy": LEGACY_MOVIE_QUERY,
+    "current": movie_index_sql_script(),
+}
+
+
+def film_ids(conn: connection) -> List[str]:
+    with conn.cursor() as cur:
+        cur.execute("SELECT id::text FROM content.film_work ORDER BY id")
+        return [row[0] for row in cur]
+
+
+def fetch(conn: connection, query: str, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute(query, {"ids": ids})
+        return {str(row["id"]): dict(row) for row in cur}
+
+
+def compare(conn: connection, ids: List[str], page_size: int) -> Tuple[int, int, List[str]]:
+    """Сверить документы обоих запросов по страницам ids: (совпало, только genre [null] -> [], различия).
+
+    Старый запрос отдаёт фильму без жанров genre = [null] (LEFT JOIN без
+    FILTER), новый - []: это единственное ожидаемое расхождение.
+    """
+    equal = null_genre = 0
+    different = []
+    for start in range(0, len(ids), page_size):
+        page = ids[start : start + page_size]
+        legacy, current = (fetch(conn, QUERIES[name], page) for name in ("legacy", "current"))
+        for film_id in page:
+            old, new = legacy.get(film_id), current.get(film_id)
+            if old == new:
+                equal += 1
+            elif old is not None and old["genre"] == [None] and {**old, "genre": []} == new:
+                null_genre += 1
+            else:
+                different.append(film_id)
+    return equal, null_genre, different
+
+
+def explain(conn: connection, query: str, ids: List[str], repeat: int) -> Dict[str, float]:
+    """Медиана EXPLAIN ANALYZE по repeat прогонам: время планирования, выполнения и прочитанные буферы."""
+    runs = []
+    with conn.cursor() as cur:
+        for _ in range(repeat):
+            cur.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {query}", {"ids": ids})
+            plan = cur.fetchone()[0][0]
+            runs.append(
+                {
+                    "planning_ms": plan["Planning Time"],
+                    "execution_ms": plan["Execution Time"],
+                    "buffers": plan["Plan"]["Shared Hit Blocks"] + plan["Plan"]["Shared Read Blocks"],
+                    "aggregated_rows": aggregated_rows(plan["Plan"]),
+                },
+            )
+    return {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+
+
+def aggregated_rows(node: dict) -> float:
+    """Сколько строк плана дошло до агрегатов: мера размножения персон на жанры."""
+    children = node.get("Plans", ())
+    total = sum(aggregated_rows(child) for child in children)
+    if node["Node Type"] == "Aggregate":
+        total += sum(child["Actual Rows"] * child["Actual Loops"] for child in children)
+    return total
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Check the movies query against the legacy one and compare plans")
+    parser.add_argument("--page-size", type=int, default=1000, help="film ids per query, as BATCH_SIZE in the ETL")
+    parser.add_argument("--repeat", type=int, default=5, help="EXPLAIN ANALYZE runs per query, median reported")
+    parser.add_argument("--json", dest="json_path", help="also write results to this file")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    args = parse_args()
+    pg_conn = psycopg2.connect(**PostgresConnectParameters().model_dump())
+    try:
+        ids = film_ids(pg_conn)
+        equal, null_genre, different = compare(pg_conn, ids, args.page_size)
+        logger.info(
+            f"{len(ids)} films: {equal} identical, {null_genre} differ only by genre [null] -> [],"
+            f" {len(different)} differ",
+        )
+        for film_id in different[:10]:
+            logger.warning(f"Documents differ for film {film_id}")
+
+        results = {name: explain(pg_conn, query, ids[: args.page_size], args.repeat) for name, query in QUERIES.items()}
+        logger.info(f"EXPLAIN ANALYZE, {min(args.page_size, len(ids))} films, median of {args.repeat}:")
+        logger.info(
+            f"{'query':>8}  {'planning, ms':>12}  {'execution, ms':>13}  {'buffers':>8}  {'aggregated rows':>15}",
+        )
+        for name, result in results.items():
+            logger.info(
+                f"{name:>8}  {result['planning_ms']:>12.2f}  {result['execution_ms']:>13.2f}"
+                f"  {result['buffers']:>8.0f}  {result['aggregated_rows']:>15.0f}",
+            )
+        if args.json_path:
+            with open(args.json_path, "w") as output:
+                json.dump({"films": len(ids), "different": different, "explain": results}, output, indent=2)
+    finally:
+        pg_conn.close()
+    if different:
+        raise SystemExit(1)
@@ -0,0 +1,229 @@
+# Standard Library
+import argparse
+import json
+import logging
+import multiprocessing
+import resource
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+# Third Party
+from etl import ETL
+from prometheus_client import REGISTRY
+
+# First Party
+from benchmark.fake_es import FakeElasticsearch
+from config.es_transport import make_es_client
+from config.etl_config import (
+    ESConfig,
+    ESConfigSettings,
+    ETLConfig,
+    ETLIndexes,
+    PostgresConnectParameters,
+)
+from config.etl_models import (
+    KeysetCursor,
+    RawDocument,
+)
+from config.metrics import label
+from config.states import (
+    BaseStorage,
+    RedisState,
+)
+
+
+logger = logging.getLogger(__name__)
+
+# Профили транспорта ES: настройки ESConfigSettings, которые прогон подменяет.
+PROFILES = {
+    "plain": {"http_compress": False, "fast_serializer": False},
+    "orjson": {"http_compress": False, "fast_serializer": True},
+    "tuned": {"http_compress": True, "fast_serializer": True},
+}
+
+COLUMNS = (
+    ("profile", "profile", "{}"),
+    ("batch_size", "BATCH_SIZE", "{}"),
+    ("documents", "docs", "{}"),
+    ("wall_seconds", "wall, s", "{:.2f}"),
+    ("docs_per_second", "docs/s", "{:.0f}"),
+    ("peak_rss_mb", "peak RSS, MB", "{:.1f}"),
+    ("extract_seconds", "extract, s", "{:.2f}"),
+    ("transform_seconds", "transform, s", "{:.2f}"),
+    ("load_seconds", "bulk, s", "{:.2f}"),
+    ("postgres_seconds", "postgres, s", "{:.2f}"),
+    ("bulk_requests", "bulks", "{}"),
+    ("bulk_mb", "body, MB", "{:.1f}"),
+    ("wire_mb", "wire, MB", "{:.1f}"),
+)
+
+
+class MemoryStorage(BaseStorage):
+    """Состояние в памяти: прогон начинается с нулевых курсоров и не трогает Redis."""
+
+    def __init__(self) -> None:
+        self._values: Dict[str, Any] = {}
+        self._fields: Dict[str, Dict[str, bytes]] = defaultdict(dict)
+
+    def save_state(self, state: Dict[str, Any]) -> None:
+        self._values.update(state)
+
+    def retrieve_state(self, keys: Iterable[str]) -> Dict[str, Any]:
+        return {key: self._values[key] for key in keys if key in self._values}
+
+    def delete_state(self, keys: Iterable[str]) -> None:
+        for key in keys:
+            self._values.pop(key, None)
+
+    def save_fields(self, key: str, fields: Dict[str, bytes]) -> None:
+        self._fields[key].update(fields)
+
+    def retrieve_fields(self, key: str, fields: List[str]) -> List[Optional[bytes]]:
+        stored = self._fields.get(key, {})
+        return [stored.get(field) for field in fields]
+
+    def retrieve_all_fields(self, key: str) -> Dict[str, bytes]:
+        return dict(self._fields.get(key, {}))
+
+    def delete_fields(self, key: str, fields: List[str]) -> None:
+        stored = self._fields.get(key, {})
+        for field in fields:
+            stored.pop(field, None)
+
+    def drop_fields(self, key: str) -> None:
+        self._fields.pop(key, None)
+
+    def move_fields(self, source: str, key: str) -> bool:
+        if source not in self._fields:
+            return False
+        self._fields[key] = self._fields.pop(source)
+        return True
+
+
+class TimedETL(ETL):
+    """ETL, который считает время, проведённое в генераторах извлечения и преобразования.
+
+    Генераторы связаны в цепочку, поэтому время преобразования включает
+    время извлечения; собственное время стадии - разность этих сумм.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._lock = threading.Lock()
+        self.seconds: Dict[str, float] = defaultdict(float)
+
+    def extract_data(self, *args, **kwargs) -> Iterator[Tuple[Union[dict, RawDocument], KeysetCursor]]:
+        return self._timed("extract", super().extract_data(*args, **kwargs))
+
+    def transform_data(self, *args, **kwargs) -> Iterator[Tuple[Union[dict, RawDocument], KeysetCursor]]:
+        return self._timed("transform", super().transform_data(*args, **kwargs))
+
+    def _timed(self, stage: str, data: Iterator) -> Iterator:
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(data)
+            except StopIteration:
+                return
+            finally:
+                elapsed = time.perf_counter() - start
+                with self._lock:
+                    self.seconds[stage] += elapsed
+            yield item
+
+
+def histogram_sum(name: str, **labels: str) -> float:
+    """Сумма наблюдений гистограммы из config.metrics по всем значениям остальных меток."""
+    total = 0.0
+    for metric in REGISTRY.collect():
+        for sample in metric.samples:
+            if sample.name == f"{name}_sum" and labels.items() <= sample.labels.items():
+                total += sample.value
+    return total
+
+
+def run_once(index: str, batch_size: int, profile: str) -> Dict[str, float]:
+    """Полная загрузка индекса index при заданных BATCH_SIZE и профиле транспорта; выполняется в отдельном процессе."""
+    ETLConfig.batch_size = batch_size
+    ETLConfig.skip_unchanged = False
+    for name, value in PROFILES[profile].items():
+        setattr(ESConfig, name, value)
+
+    with FakeElasticsearch() as fake_es:
+        etl = TimedETL(
+            postgres_settings=PostgresConnectParameters,
+            state=RedisState(storage=MemoryStorage()),
+            es_conn=make_es_client(hosts=fake_es.url),
+            es_config=ESConfigSettings,
+        )
+        start = time.perf_counter()
+        etl.run([index])
+        wall = time.perf_counter() - start
+        bulks = fake_es.summary()
+
+    documents = bulks["documents"]
+    return {
+        "profile": profile,
+        "batch_size": batch_size,
+        "documents": documents,
+        "wall_seconds": wall,
+        "docs_per_second": documents / wall if wall else 0.0,
+        # ru_maxrss в Linux - в килобайтах; процесс свой у каждого прогона.
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "extract_seconds": etl.seconds["extract"],
+        "transform_seconds": etl.seconds["transform"] - etl.seconds["extract"],
+        "load_seconds": histogram_sum("etl_es_bulk_seconds", index=label(index)),
+        "postgres_seconds": histogram_sum("etl_postgres_query_seconds"),
+        "bulk_requests": bulks["requests"],
+        "bulk_mb": bulks["bytes"] / 1024 / 1024,
+        "wire_mb": bulks["wire_bytes"] / 1024 / 1024,
+    }
+
+
+def print_table(results: List[Dict[str, float]]) -> None:
+    rows = [[template.format(result[key]) for key, _, template in COLUMNS] for result in results]
+    headers = [header for _, header, _ in COLUMNS]
+    widths = [max(len(cell) for cell in column) for column in zip(headers, *rows)]
+    for row in [headers, *rows]:
+        sys.stdout.write("  ".join(cell.rjust(width) for cell, width in zip(row, widths)) + "\n")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Measure ETL throughput against an in-process Elasticsearch stand-in")
+    parser.add_argument("--index", default=ETLIndexes.movies.value, choices=[index.value for index in ETLIndexes])
+    parser.add_argument("--batch-sizes", default="100,500,1000,5000", help="comma-separated BATCH_SIZE values")
+    parser.add_argument(
+        "--profiles",
+        default="plain,tuned",
+        help=f"comma-separated ES transport profiles: {', '.join(PROFILES)}",
+    )
+    parser.add_argument("--json", dest="json_path", help="also write results to this file")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    args = parse_args()
+    results = []
+    for profile in args.profiles.split(","):
+        for size in (int(value) for value in args.batch_sizes.split(",")):
+            # Новый процесс на каждый прогон: пиковый RSS и метрики не копятся между ними.
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+                results.append(executor.submit(run_once, args.index, size, profile).result())
+    print_table(results)
+    if args.json_path:
+        with open(args.json_path, "w") as output:
+            json.dump(results, output, indent=2)
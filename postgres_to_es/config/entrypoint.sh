@@ -15,8 +15,10 @@ done
 
 echo "Elasticsearch is ready"
 
-curl -XPUT ${SCHEMA}://${HOST}:${PORT}/movies -H 'Content-Type: application/json' -d @/movies.json
+for index in movies persons genres; do
+      curl -XPUT ${SCHEMA}://${HOST}:${PORT}/${index} -H 'Content-Type: application/json' -d @/${index}.json
+done
 
-echo "Elasticsearch movie index was created"
+echo "Elasticsearch movies, persons and genres indexes were created"
 
 exec $cmd
\ No newline at end of file
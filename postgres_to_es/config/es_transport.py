@@ -0,0 +1,80 @@
+# Standard Library
+from typing import (
+    Any,
+    Type,
+    TypeVar,
+    Union,
+)
+
+# Third Party
+import orjson
+from elastic_transport import SerializationError
+from elasticsearch import (
+    AsyncElasticsearch,
+    Elasticsearch,
+)
+from elasticsearch.serializer import JsonSerializer
+
+# First Party
+from config.etl_config import (
+    ESConfig,
+    ESConfigSettings,
+)
+
+
+Client = TypeVar("Client", Elasticsearch, AsyncElasticsearch)
+
+
+class OrjsonSerializer(JsonSerializer):
+    """JSON через orjson: в разы быстрее стандартного json и сразу отдаёт bytes.
+
+    Через него проходят и строки bulk (helpers сериализуют действия и
+    документы сериализатором application/json), и ответы ES.
+    """
+
+    def dumps(self, data: Any) -> bytes:
+        if isinstance(data, str):
+            return data.encode("utf-8", "surrogatepass")
+        if isinstance(data, bytes):
+            return data
+        try:
+            return orjson.dumps(data, default=self.default)
+        except TypeError as e:
+            raise SerializationError(
+                f"Unable to serialize to JSON: {data!r} (type: {type(data).__name__})",
+                errors=(e,),
+            )
+
+    def loads(self, data: bytes) -> Any:
+        if data == b"":
+            return None
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError as e:
+            raise SerializationError(f"Unable to deserialize as JSON: {data!r}", errors=(e,))
+
+
+def es_hosts(config: ESConfigSettings = ESConfig) -> list:
+    return [f"{config.http_schema}://{config.host}:{config.port}"]
+
+
+def make_es_client(
+    client_class: Type[Client] = Elasticsearch,
+    hosts: Union[str, list, None] = None,
+    config: ESConfigSettings = ESConfig,
+) -> Client:
+    """Клиент ES с профилем транспорта из ESConfigSettings.
+
+    Тела запросов сжимаются gzip (ES_HTTP_COMPRESS), JSON сериализуется
+    orjson (ES_FAST_SERIALIZER), а соединения к узлу держатся открытыми
+    в пуле на ES_CONNECTIONS_PER_NODE штук, чтобы параллельным загрузчикам
+    bulk не приходилось ждать соединения или открывать новое.
+    """
+    options = {
+        "http_compress": config.http_compress,
+        "connections_per_node": config.connections_per_node,
+        "request_timeout": config.request_timeout,
+    }
+    if config.fast_serializer:
+        options["serializer"] = OrjsonSerializer()
+    return client_class(hosts or es_hosts(config), **options)
@@ -1,6 +1,7 @@
 # Standard Library
 import logging
 from enum import Enum
+from typing import Literal
 
 # Third Party
 import tenacity
@@ -10,6 +11,9 @@ from pydantic_settings import (
     SettingsConfigDict,
 )
 
+# First Party
+from config.metrics import count_retry
+
 
 logger = logging.getLogger(__name__)
 
@@ -28,10 +32,33 @@ class PostgresConnectParameters(BaseSettings):
     )
 
 
+class PostgresPoolSettings(BaseSettings):
+    min_size: int = Field(default=1, alias="POSTGRES_POOL_MIN_SIZE")
+    max_size: int = Field(default=4, alias="POSTGRES_POOL_MAX_SIZE")
+    health_check_interval: int = Field(default=30, alias="POSTGRES_POOL_HEALTH_CHECK_INTERVAL")
+
+    model_config = SettingsConfigDict(
+        env_file="etl.env",
+        env_file_encoding="utf-8",
+        extra="ignore",
+    )
+
+
 class ESConfigSettings(BaseSettings):
     http_schema: str = Field(alias="ELASTICSEARCH_SCHEMA")
     host: str = Field(alias="ELASTICSEARCH_HOST")
     port: int = Field(alias="ELASTICSEARCH_PORT")
+    bulk_workers: int = Field(default=1, ge=1, alias="ES_BULK_WORKERS")
+    bulk_chunks_in_flight: int = Field(default=1, ge=1, alias="ES_BULK_CHUNKS_IN_FLIGHT")
+    bulk_max_bytes: int = Field(default=5 * 1024 * 1024, ge=1, alias="ES_BULK_MAX_BYTES")
+    bulk_adaptive: bool = Field(default=True, alias="ES_BULK_ADAPTIVE")
+    bulk_min_documents: int = Field(default=50, ge=1, alias="ES_BULK_MIN_DOCUMENTS")
+    bulk_max_documents: int = Field(default=10000, ge=1, alias="ES_BULK_MAX_DOCUMENTS")
+    bulk_target_latency: float = Field(default=1, gt=0, alias="ES_BULK_TARGET_LATENCY")
+    http_compress: bool = Field(default=True, alias="ES_HTTP_COMPRESS")
+    fast_serializer: bool = Field(default=True, alias="ES_FAST_SERIALIZER")
+    connections_per_node: int = Field(default=10, ge=1, alias="ES_CONNECTIONS_PER_NODE")
+    request_timeout: float = Field(default=30, gt=0, alias="ES_REQUEST_TIMEOUT")
 
     model_config = SettingsConfigDict(
         env_file="etl.env",
@@ -42,7 +69,29 @@ class ESConfigSettings(BaseSettings):
 
 class ETLProcessConfig(BaseSettings):
     batch_size: int = Field(alias="BATCH_SIZE")
+    page_size: int = Field(default=10000, alias="PAGE_SIZE")
+    commit_lag: float = Field(default=5, ge=0, alias="COMMIT_LAG_SECONDS")
+    json_passthrough: bool = Field(default=False, alias="JSON_PASSTHROUGH")
+    validation_sample_rate: float = Field(default=0.01, ge=0, le=1, alias="VALIDATION_SAMPLE_RATE")
+    skip_unchanged: bool = Field(default=True, alias="SKIP_UNCHANGED_DOCUMENTS")
+    partial_updates: bool = Field(default=True, alias="PARTIAL_UPDATES")
+    document_table: bool = Field(default=False, alias="FILM_WORK_DOCUMENT_TABLE")
+    tombstone_retention: float = Field(default=7, gt=0, alias="TOMBSTONE_RETENTION_DAYS")
+    engine: Literal["sync", "async", "listen", "cdc"] = Field(default="sync", alias="ETL_ENGINE")
+    queue_size: int = Field(default=1000, ge=1, alias="ASYNC_QUEUE_SIZE")
     frequency: int = Field(alias="FREQUENCY")
+    adaptive_schedule: bool = Field(default=True, alias="ADAPTIVE_SCHEDULE")
+    min_interval: float = Field(default=1, gt=0, alias="SCHEDULE_MIN_INTERVAL")
+    max_interval: float = Field(default=300, gt=0, alias="SCHEDULE_MAX_INTERVAL")
+    target_lag: float = Field(default=30, gt=0, alias="SCHEDULE_TARGET_LAG")
+    sweep_interval: int = Field(default=300, ge=1, alias="SWEEP_INTERVAL")
+    notify_debounce: float = Field(default=0.5, gt=0, alias="NOTIFY_DEBOUNCE")
+    notify_max_delay: float = Field(default=5, gt=0, alias="NOTIFY_MAX_DELAY")
+    notify_max_batch: int = Field(default=1000, ge=1, alias="NOTIFY_MAX_BATCH")
+    cdc_slot_name: str = Field(default="postgres_to_es", alias="CDC_SLOT_NAME")
+    metrics_port: int = Field(default=8000, ge=0, alias="METRICS_PORT")
+    state_backend: Literal["redis", "sqlite"] = Field(default="redis", alias="STATE_BACKEND")
+    state_path: str = Field(default="etl_state.sqlite3", alias="STATE_SQLITE_PATH")
 
     model_config = SettingsConfigDict(
         env_file="etl.env",
@@ -64,11 +113,13 @@ class TenacityRetryConfig(BaseSettings):
 
 
 class RedisConfig(BaseSettings):
-    host: str = Field(alias="REDIS_HOST")
-    port: int = Field(alias="REDIS_PORT")
+    # С STATE_BACKEND=sqlite Redis не нужен, поэтому настройки необязательны.
+    host: str = Field(default="localhost", alias="REDIS_HOST")
+    port: int = Field(default=6379, alias="REDIS_PORT")
 
 
 PGConfig = PostgresConnectParameters()
+PGPoolConfig = PostgresPoolSettings()
 ESConfig = ESConfigSettings()
 ETLConfig = ETLProcessConfig()
 TenacityConfig = TenacityRetryConfig()
@@ -82,8 +133,24 @@ RETRY_CONFIG = {
     ),
     "stop": tenacity.stop_after_attempt(TenacityConfig.max_retries),
     "before": tenacity.before_log(logger=logger, log_level=logging.INFO),
+    "before_sleep": count_retry,
 }
 
 
 class ETLIndexes(str, Enum):
     movies = "movies"
+    persons = "persons"
+    genres = "genres"
+
+
+class ETLProducers(str, Enum):
+    """Таблицы, изменения в которых затрагивают документы фильмов."""
+
+    film_work = "film_work"
+    person = "person"
+    genre = "genre"
+    film_work_document = "film_work_document"
+
+
+# Таблица надгробий удалённых строк content.*; курсор по ней хранится как по таблице-источнику.
+TOMBSTONES = "tombstone"
@@ -1,8 +1,15 @@
 # Standard Library
+from datetime import (
+    datetime,
+    timezone,
+)
 from enum import Enum
 from typing import (
+    Dict,
     List,
+    NamedTuple,
     Optional,
+    Union,
 )
 from uuid import UUID
 
@@ -48,3 +55,109 @@ class MovieETLSchema(BaseETLModel):
     writers_names: Optional[List[str]] = None
     actors: Optional[List[PersonFilmWork]] = None
     writers: Optional[List[PersonFilmWork]] = None
+
+
+class MoviePersons(BaseETLModel):
+    """Поля документа movies, которые зависят от персон: частичное обновление при их изменении."""
+
+    director: Optional[List[str]] = None
+    actors_names: Optional[List[str]] = None
+    writers_names: Optional[List[str]] = None
+    actors: Optional[List[PersonFilmWork]] = None
+    writers: Optional[List[PersonFilmWork]] = None
+
+
+class MovieGenres(BaseETLModel):
+    """Поля документа movies, которые зависят от жанров: частичное обновление при их изменении."""
+
+    genre: Optional[List[str]] = None
+
+
+class KeysetCursor(BaseETLModel):
+    """Позиция ETL в content.film_work: последний загруженный (updated_at, id)."""
+
+    id: UUID = UUID(int=0)
+    updated_at: datetime = datetime.min.replace(tzinfo=timezone.utc)
+
+
+class Tombstone(KeysetCursor):
+    """Удалённая строка content.*: курсор (deleted_at, id) и id строки и её связей."""
+
+    table_name: str
+    row_id: UUID
+    film_work_id: Optional[UUID] = None
+    person_id: Optional[UUID] = None
+    genre_id: Optional[UUID] = None
+
+    @property
+    def cursor(self) -> KeysetCursor:
+        return KeysetCursor(id=self.id, updated_at=self.updated_at)
+
+    @property
+    def ends(self) -> Dict[str, Optional[UUID]]:
+        """id строк таблиц-источников, которые связывала удалённая строка таблицы связей."""
+        return {"film_work": self.film_work_id, "person": self.person_id, "genre": self.genre_id}
+
+
+class RawDocument(NamedTuple):
+    """Документ ES, уже сериализованный в JSON: на стороне Postgres (str) или загрузчиком (bytes).
+
+    op_type - действие bulk: index для документа целиком, update для {"doc": {...}},
+    delete - без тела (source None).
+    """
+
+    id: str
+    source: Optional[Union[str, bytes]]
+    op_type: str = "index"
+
+
+class ShardProgress(BaseModel):
+    """Прогресс полной переиндексации одного шарда film_work по диапазону id."""
+
+    shard: int
+    shards: int
+    last_id: UUID
+    upper: UUID
+    films: int = 0
+    done: bool = False
+
+    @classmethod
+    def start(cls, shard: int, shards: int) -> "ShardProgress":
+        """Шард shard из shards делит пространство UUID на равные диапазоны (lower, upper].
+
+        Нижняя граница первого шарда, нулевой UUID, в диапазон не входит.
+        """
+        step = (1 << 128) // shards
+        upper = (1 << 128) - 1 if shard == shards - 1 else (shard + 1) * step
+        return cls(shard=shard, shards=shards, last_id=UUID(int=shard * step), upper=UUID(int=upper))
+
+
+class RebuildState(BaseModel):
+    """Незавершённая пересборка индекса: новая версия и снимок курсоров на её старте."""
+
+    target: str
+    cursors: Dict[str, KeysetCursor]
+
+    @staticmethod
+    def key(index: str) -> str:
+        return f"rebuild_in_{index}"
+
+
+class RetiredVersion(BaseModel):
+    """Версия индекса, с которой пересборка сняла алиас: когда и на каких курсорах демона.
+
+    Всё до этих курсоров в версии уже есть, откат на неё догружает остальное.
+    """
+
+    retired_at: datetime
+    cursors: Dict[str, KeysetCursor]
+
+    @staticmethod
+    def key(version: str) -> str:
+        return f"retired_{version}"
+
+
+def document_id(document: Union[dict, RawDocument]) -> str:
+    if isinstance(document, RawDocument):
+        return document.id
+    return str(document["_id"])
@@ -0,0 +1,89 @@
+# Standard Library
+from typing import (
+    Dict,
+    NamedTuple,
+    Tuple,
+    Type,
+)
+
+# First Party
+from config.etl_config import (
+    ETLConfig,
+    ETLIndexes,
+    ETLProducers,
+)
+from config.etl_models import (
+    BaseETLModel,
+    Genre,
+    MovieETLSchema,
+    MovieGenres,
+    MoviePersons,
+    Person,
+)
+
+
+class IndexSpec(NamedTuple):
+    """Описание индекса ES.
+
+    model - схема документа, table - таблица, по id строк которой собираются
+    документы, depends_on - таблицы-источники, изменения в которых меняют
+    документы (table первой), passthrough - умеет ли запрос индекса отдавать
+    готовый JSON (JSON_PASSTHROUGH), partial - схемы полей, которые при
+    изменении таблицы-источника обновляются в документах частично (PARTIAL_UPDATES).
+    """
+
+    model: Type[BaseETLModel]
+    table: str
+    depends_on: Tuple[str, ...]
+    passthrough: bool = False
+    partial: Dict[str, Type[BaseETLModel]] = {}
+
+
+INDEX_REGISTRY: Dict[str, IndexSpec] = {
+    ETLIndexes.movies: IndexSpec(
+        model=MovieETLSchema,
+        table=ETLProducers.film_work.value,
+        depends_on=(ETLProducers.film_work.value, ETLProducers.person.value, ETLProducers.genre.value),
+        passthrough=True,
+        partial={ETLProducers.person.value: MoviePersons, ETLProducers.genre.value: MovieGenres},
+    ),
+    ETLIndexes.persons: IndexSpec(
+        model=Person,
+        table=ETLProducers.person.value,
+        depends_on=(ETLProducers.person.value, ETLProducers.film_work.value),
+    ),
+    ETLIndexes.genres: IndexSpec(
+        model=Genre,
+        table=ETLProducers.genre.value,
+        depends_on=(ETLProducers.genre.value,),
+    ),
+}
+
+
+# Индексы, которые при FILM_WORK_DOCUMENT_TABLE читают готовые документы из таблицы,
+# которую ведут триггеры Postgres: изменения персон и жанров уже отражены в ней.
+DOCUMENT_TABLE_REGISTRY: Dict[str, IndexSpec] = {
+    ETLIndexes.movies: IndexSpec(
+        model=MovieETLSchema,
+        table=ETLProducers.film_work_document.value,
+        depends_on=(ETLProducers.film_work_document.value,),
+        passthrough=True,
+    ),
+}
+
+
+def source_tables() -> Tuple[str, ...]:
+    """Таблицы-источники, от которых зависят индексы в текущем режиме."""
+    tables: Dict[str, None] = {}
+    for index in ETLIndexes:
+        tables.update(dict.fromkeys(get_index_spec(index).depends_on))
+    return tuple(tables)
+
+
+def get_index_spec(index: str) -> IndexSpec:
+    if ETLConfig.document_table and index in DOCUMENT_TABLE_REGISTRY:
+        return DOCUMENT_TABLE_REGISTRY[index]
+    try:
+        return INDEX_REGISTRY[index]
+    except KeyError:
+        raise ValueError(f"There is no extraction rule for index {index}") from None
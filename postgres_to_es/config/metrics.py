@@ -0,0 +1,131 @@
+# Standard Library
+import time
+from contextlib import contextmanager
+from enum import Enum
+from typing import (
+    Iterator,
+    Union,
+)
+
+# Third Party
+import tenacity
+from prometheus_client import (
+    Counter,
+    Gauge,
+    Histogram,
+)
+
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+CHUNK_DOCUMENTS_BUCKETS = (10, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000)
+CHUNK_BYTES_BUCKETS = tuple(2**power * 1024 for power in range(4, 16, 2))
+FRESHNESS_BUCKETS = (0.5, 1, 2, 5, 10, 15, 30, 60, 120, 300, 900, 3600, 86400)
+
+STAGE_ROWS = Counter(
+    "etl_stage_rows_total",
+    "Rows passed through an ETL stage; rate() gives rows per second",
+    ["stage", "index"],
+)
+SKIPPED_DOCUMENTS = Counter(
+    "etl_skipped_documents_total",
+    "Documents not sent to ES because their content hash did not change",
+    ["index"],
+)
+FAILED_DOCUMENTS = Counter(
+    "etl_failed_documents_total",
+    "Documents ES still rejected with a retryable error after all bulk retries",
+    ["index"],
+)
+DEAD_LETTERED_DOCUMENTS = Counter(
+    "etl_dead_lettered_documents_total",
+    "Documents permanently rejected by ES and moved to the dead-letter store",
+    ["index"],
+)
+DELETED_DOCUMENTS = Counter(
+    "etl_deleted_documents_total",
+    "Documents deleted from ES because their source rows were deleted in Postgres",
+    ["index"],
+)
+PG_QUERY_SECONDS = Histogram(
+    "etl_postgres_query_seconds",
+    "Duration of Postgres round trips (statement execution or a fetch of a streaming cursor)",
+    ["query"],
+    buckets=LATENCY_BUCKETS,
+)
+BULK_SECONDS = Histogram(
+    "etl_es_bulk_seconds",
+    "Latency of ES _bulk requests",
+    ["index"],
+    buckets=LATENCY_BUCKETS,
+)
+BULK_CHUNK_DOCUMENTS = Histogram(
+    "etl_es_bulk_chunk_documents",
+    "Documents per ES _bulk request",
+    ["index"],
+    buckets=CHUNK_DOCUMENTS_BUCKETS,
+)
+BULK_CHUNK_BYTES = Histogram(
+    "etl_es_bulk_chunk_bytes",
+    "Uncompressed body size of ES _bulk requests",
+    ["index"],
+    buckets=CHUNK_BYTES_BUCKETS,
+)
+BULK_CHUNK_LIMIT_DOCUMENTS = Gauge(
+    "etl_es_bulk_chunk_limit_documents",
+    "Current document limit of ES _bulk chunks, tuned from latency and 429 rejections",
+    ["index"],
+)
+BULK_CHUNK_LIMIT_BYTES = Gauge(
+    "etl_es_bulk_chunk_limit_bytes",
+    "Body size limit of ES _bulk chunks",
+    ["index"],
+)
+REDIS_SECONDS = Histogram(
+    "etl_redis_seconds",
+    "Round-trip time of state storage commands",
+    ["operation"],
+    buckets=LATENCY_BUCKETS,
+)
+RETRIES = Counter(
+    "etl_retries_total",
+    "Retries scheduled by the RETRY_CONFIG tenacity policy",
+    ["function"],
+)
+FRESHNESS_SECONDS = Histogram(
+    "etl_freshness_lag_seconds",
+    "Time from the source row updated_at to the ES acknowledgement of its document in incremental syncs",
+    ["index"],
+    buckets=FRESHNESS_BUCKETS,
+)
+SCHEDULE_INTERVAL = Gauge(
+    "etl_schedule_interval_seconds",
+    "Pause before the next sync cycle chosen by the scheduler",
+)
+SYNC_BACKLOG_ROWS = Gauge(
+    "etl_sync_backlog_rows",
+    "Changed source rows found by the last sync cycle",
+)
+SYNC_LAG_SECONDS = Gauge(
+    "etl_sync_lag_seconds",
+    "Age of the oldest change found by the last sync cycle",
+)
+
+
+def label(value: Union[str, Enum]) -> str:
+    """Значение метки: у ETLIndexes и ETLProducers - само значение, а не имя члена перечисления."""
+    return value.value if isinstance(value, Enum) else str(value)
+
+
+@contextmanager
+def timed(histogram: Histogram, *labels: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.labels(*map(label, labels)).observe(time.perf_counter() - start)
+
+
+def count_retry(retry_state: tenacity.RetryCallState) -> None:
+    """Хук before_sleep для RETRY_CONFIG: считает повторы по функциям."""
+    function = retry_state.fn.__qualname__ if retry_state.fn is not None else "<block>"
+    RETRIES.labels(function).inc()
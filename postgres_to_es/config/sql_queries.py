@@ -1,11 +1,297 @@
 # Standard Library
-from typing import Optional
+from typing import (
+    NamedTuple,
+    Tuple,
+)
 
 # First Party
-from config.etl_config import ETLIndexes
+from config.etl_config import (
+    ETLConfig,
+    ETLIndexes,
+    ETLProducers,
+)
 
 
-def movie_index_sql_script(load_from: Optional[str]) -> str:
+class PreparedStatement(NamedTuple):
+    """Запрос, который выполняется каждый цикл и готовится на сервере один раз."""
+
+    name: str
+    query: str
+    types: Tuple[str, ...]
+
+    @property
+    def prepare(self) -> str:
+        if not self.types:
+            return f"PREPARE {self.name} AS {self.query}"
+        return f"PREPARE {self.name}({', '.join(self.types)}) AS {self.query}"
+
+    @property
+    def execute(self) -> str:
+        if not self.types:
+            return f"EXECUTE {self.name}"
+        return f"EXECUTE {self.name}({', '.join(f'%s::{type_}' for type_ in self.types)})"
+
+
+def keyset_page_sql_script(table: str) -> PreparedStatement:
+    """Очередная страница изменённых строк таблицы по ключу (updated_at, id).
+
+    Составной ключ не теряет строки с одинаковым updated_at на границе
+    страницы и использует индекс {table}_updated_at_id_idx.
+    updated_at ставится при записи строки, а видна она только после COMMIT,
+    поэтому строки моложе COMMIT_LAG_SECONDS не читаются: за это время
+    транзакция с меньшим updated_at успеет зафиксироваться, и курсор её не
+    перепрыгнет. Транзакции дольше этого окна всё равно могут быть пропущены,
+    их подбирает только пересборка индекса.
+    Параметры: updated_at, id, page_size.
+    """
+
+    table = ETLProducers(table).value
+    return PreparedStatement(
+        name=f"{table}_keyset_page",
+        query=f"""
+        SELECT
+           t.id,
+           t.updated_at
+        FROM content.{table} t
+        WHERE (t.updated_at, t.id) > ($1, $2)
+          AND t.updated_at < now() - make_interval(secs => {ETLConfig.commit_lag})
+        ORDER BY t.updated_at ASC, t.id ASC
+        LIMIT $3
+        """,
+        types=("timestamptz", "uuid", "integer"),
+    )
+
+
+def keyset_tail_sql_script(table: str) -> PreparedStatement:
+    """Курсор самой свежей строки таблицы с тем же окном COMMIT_LAG_SECONDS, что у страниц."""
+
+    table = ETLProducers(table).value
+    return PreparedStatement(
+        name=f"{table}_keyset_tail",
+        query=f"""
+        SELECT
+           t.id,
+           t.updated_at
+        FROM content.{table} t
+        WHERE t.updated_at < now() - make_interval(secs => {ETLConfig.commit_lag})
+        ORDER BY t.updated_at DESC, t.id DESC
+        LIMIT 1
+        """,
+        types=(),
+    )
+
+
+def tombstone_seal_sql_script() -> str:
+    """Проставить sealed_at надгробиям, зафиксированным после прошлой печати.
+
+    Печать идёт под advisory-блокировкой, поэтому sealed_at ещё не видимых
+    надгробий всегда позже уже видимых и курсор их не перепрыгнет.
+    """
+
+    return """
+        SELECT pg_advisory_xact_lock(hashtext('content.tombstone'));
+        UPDATE content.tombstone
+        SET sealed_at = clock_timestamp()
+        WHERE sealed_at IS NULL
+        """
+
+
+def tombstone_page_sql_script() -> PreparedStatement:
+    """Очередная страница надгробий удалённых строк по ключу (sealed_at, id).
+
+    Параметры: sealed_at, id, page_size.
+    """
+
+    return PreparedStatement(
+        name="tombstone_keyset_page",
+        query="""
+        SELECT
+           t.id,
+           t.sealed_at AS updated_at,
+           t.table_name,
+           t.row_id,
+           t.film_work_id,
+           t.person_id,
+           t.genre_id
+        FROM content.tombstone t
+        WHERE (t.sealed_at, t.id) > ($1, $2)
+        ORDER BY t.sealed_at ASC, t.id ASC
+        LIMIT $3
+        """,
+        types=("timestamptz", "uuid", "integer"),
+    )
+
+
+def tombstone_tail_sql_script() -> PreparedStatement:
+
+    return PreparedStatement(
+        name="tombstone_keyset_tail",
+        query="""
+        SELECT
+           t.id,
+           t.sealed_at AS updated_at
+        FROM content.tombstone t
+        WHERE t.sealed_at IS NOT NULL
+        ORDER BY t.sealed_at DESC, t.id DESC
+        LIMIT 1
+        """,
+        types=(),
+    )
+
+
+def tombstone_purge_sql_script() -> str:
+    """Удалить надгробия, которые уже применены до курсора (sealed_at, id) и старше before.
+
+    Параметры: sealed_at, id, before.
+    """
+
+    return """
+        DELETE FROM content.tombstone
+        WHERE (sealed_at, id) <= (%(sealed_at)s, %(id)s)
+          AND deleted_at < %(before)s
+        """
+
+
+def track_document_table_sql_script() -> str:
+    """Включить или выключить NOTIFY, надгробия и публикацию content.film_work_document.
+
+    Параметры: enabled.
+    """
+
+    return "SELECT content.track_film_work_document(%(enabled)s)"
+
+
+def existing_ids_sql_script(table: str) -> PreparedStatement:
+    """Какие из ids ещё есть в table: строку могли удалить и создать заново с тем же id.
+
+    Параметры: ids.
+    """
+
+    table = ETLProducers(table).value
+    return PreparedStatement(
+        name=f"{table}_existing_ids",
+        query=f"""
+        SELECT
+           t.id
+        FROM content.{table} t
+        WHERE t.id = ANY($1)
+        """,
+        types=("uuid[]",),
+    )
+
+
+def film_work_ids_sql_script(table: str) -> PreparedStatement:
+    """Фильмы, связанные с изменёнными персонами или жанрами.
+
+    Параметры: ids.
+    """
+
+    table = ETLProducers(table).value
+    return PreparedStatement(
+        name=f"{table}_film_work_ids",
+        query=f"""
+        SELECT DISTINCT
+           t.film_work_id AS id
+        FROM content.{table}_film_work t
+        WHERE t.{table}_id = ANY($1)
+        """,
+        types=("uuid[]",),
+    )
+
+
+def related_ids_sql_script(table: str) -> PreparedStatement:
+    """Персоны или жанры изменённых фильмов, обратное к film_work_ids_sql_script.
+
+    Параметры: ids фильмов.
+    """
+
+    table = ETLProducers(table).value
+    return PreparedStatement(
+        name=f"film_work_{table}_ids",
+        query=f"""
+        SELECT DISTINCT
+           t.{table}_id AS id
+        FROM content.{table}_film_work t
+        WHERE t.film_work_id = ANY($1)
+        """,
+        types=("uuid[]",),
+    )
+
+
+def id_range_page_sql_script(table: str = ETLProducers.film_work) -> PreparedStatement:
+    """Очередная страница строк table в шарде (lower, upper] по первичному ключу.
+
+    Параметры: lower (последний обработанный id), upper, page_size.
+    """
+
+    table = ETLProducers(table).value
+    return PreparedStatement(
+        name=f"{table}_id_range_page",
+        query=f"""
+        SELECT
+           t.id
+        FROM content.{table} t
+        WHERE t.id > $1 AND t.id <= $2
+        ORDER BY t.id ASC
+        LIMIT $3
+        """,
+        types=("uuid", "uuid", "integer"),
+    )
+
+
+def movie_persons_subquery() -> str:
+    """Персоны фильмов ids, агрегированные по фильму и ролям.
+
+    Строки связей каждого фильма читаются один раз, без размножения на жанры.
+    Актёры и сценаристы агрегируются по одному разу, а списки имён
+    actors_names и writers_names выводятся из готовых агрегатов.
+    """
+
+    return """
+        SELECT
+           roles.film_work_id,
+           roles.director,
+           roles.actors,
+           roles.writers,
+           (SELECT JSON_AGG(DISTINCT actor ->> 'name') FROM JSON_ARRAY_ELEMENTS(roles.actors) actor) AS actors_names,
+           (SELECT JSON_AGG(DISTINCT writer ->> 'name') FROM JSON_ARRAY_ELEMENTS(roles.writers) writer) AS writers_names
+        FROM (
+           SELECT
+              pfw.film_work_id,
+              JSON_AGG(DISTINCT p.full_name)
+                  FILTER (WHERE pfw.role = 'director') AS director,
+              JSON_AGG(DISTINCT jsonb_build_object('id', p.id, 'name', p.full_name))
+                  FILTER (WHERE pfw.role = 'actor') AS actors,
+              JSON_AGG(DISTINCT jsonb_build_object('id', p.id, 'name', p.full_name))
+                  FILTER (WHERE pfw.role = 'writer') AS writers
+           FROM content.person_film_work pfw
+           JOIN content.person p ON p.id = pfw.person_id
+           WHERE pfw.film_work_id = ANY(%(ids)s::uuid[])
+           GROUP BY pfw.film_work_id
+        ) roles
+        """
+
+
+def movie_genres_subquery() -> str:
+    """Жанры фильмов ids, агрегированные по фильму."""
+
+    return """
+        SELECT
+           gfw.film_work_id,
+           JSON_AGG(DISTINCT g.name) AS genre
+        FROM content.genre_film_work gfw
+        JOIN content.genre g ON g.id = gfw.genre_id
+        WHERE gfw.film_work_id = ANY(%(ids)s::uuid[])
+        GROUP BY gfw.film_work_id
+        """
+
+
+def movie_index_sql_script() -> str:
+    """Документы movies: персоны и жанры агрегируются по фильмам отдельно и присоединяются готовыми.
+
+    Общий GROUP BY по соединению персон и жанров давал на фильм
+    персоны x жанры строк, которые JSON_AGG(DISTINCT ...) потом схлопывал.
+    """
 
     return f"""
         SELECT
@@ -13,42 +299,184 @@ def movie_index_sql_script(load_from: Optional[str]) -> str:
            fw.title,
            fw.description,
            fw.rating AS imdb_rating,
-           COALESCE(
-            JSON_AGG(
-                   DISTINCT p.full_name)
-                   FILTER (WHERE p.id is not null AND pfw.role = 'director'), '[]') AS director,
-           COALESCE(
-            JSON_AGG(
-                   DISTINCT jsonb_build_object('id', p.id, 'name', p.full_name))
-                   FILTER (WHERE p.id is not null AND pfw.role = 'actor'), '[]') AS actors,
-           COALESCE(
-            JSON_AGG(
-                   DISTINCT jsonb_build_object('id', p.id, 'name', p.full_name))
-                   FILTER (WHERE p.id is not null AND pfw.role = 'writer'), '[]') AS writers,
-           COALESCE(
-            JSON_AGG(DISTINCT p.full_name)
-               FILTER (WHERE p.id is not null AND pfw.role = 'actor'), '[]') AS actors_names,
-           COALESCE(
-            JSON_AGG(DISTINCT p.full_name)
-               FILTER (WHERE p.id is not null AND pfw.role = 'writer'), '[]') AS writers_names,
-           COALESCE(
-            JSON_AGG(DISTINCT g.name), '[]') AS genre,
+           COALESCE(persons.director, '[]') AS director,
+           COALESCE(persons.actors, '[]') AS actors,
+           COALESCE(persons.writers, '[]') AS writers,
+           COALESCE(persons.actors_names, '[]') AS actors_names,
+           COALESCE(persons.writers_names, '[]') AS writers_names,
+           COALESCE(genres.genre, '[]') AS genre,
+           fw.updated_at AS modified
+        FROM content.film_work fw
+        LEFT JOIN ({movie_persons_subquery()}) persons ON persons.film_work_id = fw.id
+        LEFT JOIN ({movie_genres_subquery()}) genres ON genres.film_work_id = fw.id
+        WHERE fw.id = ANY(%(ids)s::uuid[])
+        ORDER BY fw.updated_at ASC, fw.id ASC
+        """
+
+
+def movie_persons_sql_script() -> str:
+    """Поля movies из персон фильма; агрегаты те же, что в movie_index_sql_script()."""
+
+    return f"""
+        SELECT
+           fw.id,
+           COALESCE(persons.director, '[]') AS director,
+           COALESCE(persons.actors, '[]') AS actors,
+           COALESCE(persons.writers, '[]') AS writers,
+           COALESCE(persons.actors_names, '[]') AS actors_names,
+           COALESCE(persons.writers_names, '[]') AS writers_names,
+           fw.updated_at AS modified
+        FROM content.film_work fw
+        LEFT JOIN ({movie_persons_subquery()}) persons ON persons.film_work_id = fw.id
+        WHERE fw.id = ANY(%(ids)s::uuid[])
+        ORDER BY fw.updated_at ASC, fw.id ASC
+        """
+
+
+def movie_genres_sql_script() -> str:
+    """Поле genre документа movies; агрегат тот же, что в movie_index_sql_script()."""
+
+    return f"""
+        SELECT
+           fw.id,
+           COALESCE(genres.genre, '[]') AS genre,
            fw.updated_at AS modified
         FROM content.film_work fw
-        LEFT JOIN content.person_film_work pfw ON pfw.film_work_id = fw.id
-        LEFT JOIN content.person p ON p.id = pfw.person_id
-        LEFT JOIN content.genre_film_work gfw ON gfw.film_work_id = fw.id
-        LEFT JOIN content.genre g ON g.id = gfw.genre_id
-        WHERE fw.updated_at > '{load_from}'
-        GROUP BY fw.id
-        ORDER BY fw.updated_at ASC;
+        LEFT JOIN ({movie_genres_subquery()}) genres ON genres.film_work_id = fw.id
+        WHERE fw.id = ANY(%(ids)s::uuid[])
+        ORDER BY fw.updated_at ASC, fw.id ASC
+        """
+
+
+def movie_document_sql_script() -> str:
+    """Готовый документ индекса movies, собранный на стороне Postgres.
+
+    Поля и их порядок совпадают с MovieETLSchema.model_dump().
+    """
+
+    return f"""
+        SELECT
+           m.id,
+           JSON_BUILD_OBJECT(
+               'id', m.id,
+               'imdb_rating', m.imdb_rating,
+               'title', m.title,
+               'description', m.description,
+               'genre', m.genre,
+               'director', m.director,
+               'actors_names', m.actors_names,
+               'writers_names', m.writers_names,
+               'actors', m.actors,
+               'writers', m.writers
+           )::text AS document,
+           m.modified
+        FROM ({movie_index_sql_script()}) m
+        ORDER BY m.modified ASC, m.id ASC
+        """
+
+
+def film_work_document_sql_script() -> str:
+    """Готовый документ movies из content.film_work_document, без сборки."""
+
+    return """
+        SELECT
+           d.id,
+           d.document::text AS document,
+           d.updated_at AS modified
+        FROM content.film_work_document d
+        WHERE d.id = ANY(%(ids)s::uuid[])
+        ORDER BY d.updated_at ASC, d.id ASC
+        """
+
+
+def film_work_document_fields_sql_script() -> str:
+    """Поля документа movies из content.film_work_document, как у movie_index_sql_script()."""
+
+    return """
+        SELECT
+           d.id,
+           doc.*,
+           d.updated_at AS modified
+        FROM content.film_work_document d
+        CROSS JOIN LATERAL jsonb_to_record(d.document) AS doc(
+           title text,
+           description text,
+           imdb_rating double precision,
+           genre jsonb,
+           director jsonb,
+           actors_names jsonb,
+           writers_names jsonb,
+           actors jsonb,
+           writers jsonb
+        )
+        WHERE d.id = ANY(%(ids)s::uuid[])
+        ORDER BY d.updated_at ASC, d.id ASC
+        """
+
+
+def person_index_sql_script() -> str:
+
+    return """
+        SELECT
+           p.id,
+           p.full_name AS name,
+           COALESCE(
+            ARRAY_AGG(DISTINCT pfw.role)
+               FILTER (WHERE pfw.role is not null), '{}')::text[] AS role,
+           COALESCE(
+            ARRAY_AGG(DISTINCT pfw.film_work_id)
+               FILTER (WHERE pfw.film_work_id is not null), '{}')::text[] AS film_id,
+           p.updated_at AS modified
+        FROM content.person p
+        LEFT JOIN content.person_film_work pfw ON pfw.person_id = p.id
+        WHERE p.id = ANY(%(ids)s::uuid[])
+        GROUP BY p.id
+        ORDER BY p.updated_at ASC, p.id ASC
+        """
+
+
+def genre_index_sql_script() -> str:
+
+    return """
+        SELECT
+           g.id,
+           g.name,
+           g.updated_at AS modified
+        FROM content.genre g
+        WHERE g.id = ANY(%(ids)s::uuid[])
+        ORDER BY g.updated_at ASC, g.id ASC
         """
 
 
-def get_query_by_index(index: str, load_from: Optional[str]) -> str:
+def get_query_by_index(index: str, passthrough: bool = False) -> str:
+    """Запрос документов индекса по списку id.
+
+    Готовые документы из Postgres (passthrough) собираются только для movies,
+    а при FILM_WORK_DOCUMENT_TABLE читаются из content.film_work_document.
+    """
+
+    if index == ETLIndexes.movies and ETLConfig.document_table:
+        return film_work_document_sql_script() if passthrough else film_work_document_fields_sql_script()
+
+    if index == ETLIndexes.movies:
+        return movie_document_sql_script() if passthrough else movie_index_sql_script()
+
+    if index == ETLIndexes.persons:
+        return person_index_sql_script()
+
+    if index == ETLIndexes.genres:
+        return genre_index_sql_script()
+
+    raise ValueError(f"No country (script) for old index {index}")
+
+
+def get_partial_query(index: str, table: str) -> str:
+    """Запрос полей документов index, которые меняются вместе с таблицей table."""
+
+    if index == ETLIndexes.movies and table == ETLProducers.person:
+        return movie_persons_sql_script()
 
-    if not index:
-        raise ValueError("No country (script) for old index {index}")
+    if index == ETLIndexes.movies and table == ETLProducers.genre:
+        return movie_genres_sql_script()
 
-    elif index == ETLIndexes.movies:
-        return movie_index_sql_script(load_from)
+    raise ValueError(f"No partial update of index {index} for table {table}")
@@ -1,8 +1,12 @@
 # Standard Library
 import abc
+import sqlite3
+import threading
 from typing import (
     Any,
     Dict,
+    Iterable,
+    List,
     Optional,
 )
 
@@ -13,9 +17,19 @@ from tenacity import retry
 # First Party
 from config.etl_config import (
     RETRY_CONFIG,
+    ETLConfig,
     RedisConfig,
     RedisConfiguration,
 )
+from config.metrics import (
+    REDIS_SECONDS,
+    label,
+    timed,
+)
+
+
+# Не больше параметров на запрос, чем допускают и старые сборки SQLite.
+SQLITE_MAX_PARAMETERS = 900
 
 
 class BaseStorage(abc.ABC):
@@ -25,6 +39,10 @@ class BaseStorage(abc.ABC):
     Способ хранения состояния может варьироваться в зависимости
     от итоговой реализации. Например, можно хранить информацию
     в базе данных или в распределённом файловом хранилище.
+    Несколько ключей сохраняются и читаются за одно обращение к хранилищу.
+
+    Кроме строковых ключей хранилище держит словари полей (хэши документов,
+    недоставленные документы): поля читаются и пишутся пачкой по ключу словаря.
     """
 
     @abc.abstractmethod
@@ -32,15 +50,217 @@ class BaseStorage(abc.ABC):
         """Сохранить состояние в хранилище."""
 
     @abc.abstractmethod
-    def retrieve_state(self) -> Dict[str, Any]:
-        """Получить состояние из хранилища."""
+    def retrieve_state(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """Получить состояние из хранилища: только найденные ключи из keys."""
+
+    @abc.abstractmethod
+    def delete_state(self, keys: Iterable[str]) -> None:
+        """Удалить ключи keys из хранилища."""
+
+    @abc.abstractmethod
+    def save_fields(self, key: str, fields: Dict[str, bytes]) -> None:
+        """Записать поля fields в словарь key."""
+
+    @abc.abstractmethod
+    def retrieve_fields(self, key: str, fields: List[str]) -> List[Optional[bytes]]:
+        """Значения полей fields словаря key в том же порядке, None - для отсутствующих."""
+
+    @abc.abstractmethod
+    def retrieve_all_fields(self, key: str) -> Dict[str, bytes]:
+        """Все поля словаря key."""
+
+    @abc.abstractmethod
+    def delete_fields(self, key: str, fields: List[str]) -> None:
+        """Удалить поля fields из словаря key."""
+
+    @abc.abstractmethod
+    def drop_fields(self, key: str) -> None:
+        """Удалить словарь key целиком."""
+
+    @abc.abstractmethod
+    def move_fields(self, source: str, key: str) -> bool:
+        """Заменить словарь key словарём source, если тот есть; вернуть, был ли он."""
+
+
+class RedisStorage(BaseStorage):
+    """Состояние в строковых ключах Redis: MSET/MGET/DEL - одна команда на любое число ключей."""
+
+    def __init__(self, redis_conn: Redis) -> None:
+        self._redis_conn = redis_conn
+
+    @retry(**RETRY_CONFIG)
+    def save_state(self, state: Dict[str, Any]) -> None:
+        if state:
+            with timed(REDIS_SECONDS, "mset"):
+                self._redis_conn.mset({key: value.encode() for key, value in state.items()})
+
+    @retry(**RETRY_CONFIG)
+    def retrieve_state(self, keys: Iterable[str]) -> Dict[str, Any]:
+        keys = list(keys)
+        if not keys:
+            return {}
+        with timed(REDIS_SECONDS, "mget"):
+            values = self._redis_conn.mget(keys)
+        return {key: value.decode() for key, value in zip(keys, values) if value}
+
+    @retry(**RETRY_CONFIG)
+    def delete_state(self, keys: Iterable[str]) -> None:
+        keys = list(keys)
+        if keys:
+            with timed(REDIS_SECONDS, "delete"):
+                self._redis_conn.delete(*keys)
+
+    @retry(**RETRY_CONFIG)
+    def save_fields(self, key: str, fields: Dict[str, bytes]) -> None:
+        if fields:
+            with timed(REDIS_SECONDS, "hset"):
+                self._redis_conn.hset(key, mapping=fields)
+
+    @retry(**RETRY_CONFIG)
+    def retrieve_fields(self, key: str, fields: List[str]) -> List[Optional[bytes]]:
+        if not fields:
+            return []
+        with timed(REDIS_SECONDS, "hmget"):
+            return self._redis_conn.hmget(key, fields)
+
+    @retry(**RETRY_CONFIG)
+    def retrieve_all_fields(self, key: str) -> Dict[str, bytes]:
+        with timed(REDIS_SECONDS, "hgetall"):
+            return {field.decode(): value for field, value in self._redis_conn.hgetall(key).items()}
+
+    @retry(**RETRY_CONFIG)
+    def delete_fields(self, key: str, fields: List[str]) -> None:
+        if fields:
+            with timed(REDIS_SECONDS, "hdel"):
+                self._redis_conn.hdel(key, *fields)
+
+    @retry(**RETRY_CONFIG)
+    def drop_fields(self, key: str) -> None:
+        with timed(REDIS_SECONDS, "delete"):
+            self._redis_conn.delete(key)
+
+    @retry(**RETRY_CONFIG)
+    def move_fields(self, source: str, key: str) -> bool:
+        if not self._redis_conn.exists(source):
+            return False
+        self._redis_conn.rename(source, key)
+        return True
+
+
+class SQLiteStorage(BaseStorage):
+    """Состояние в локальном файле SQLite для развёртывания на одном узле.
+
+    Журнал в режиме WAL с synchronous=NORMAL: коммит только дописывает
+    WAL без fsync, а fsync делается пачкой при автоматическом checkpoint.
+    Падение процесса ничего не теряет; при отключении питания откатываются
+    последние курсоры, и ETL повторно загрузит уже загруженные документы.
+    Файл можно открывать из нескольких процессов (демон и reindex).
+    """
+
+    def __init__(self, path: str) -> None:
+        self._path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self._path, timeout=30, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS etl_state (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS etl_fields "
+                "(key TEXT NOT NULL, field TEXT NOT NULL, value BLOB NOT NULL, PRIMARY KEY (key, field))",
+            )
+        return self._conn
+
+    def save_state(self, state: Dict[str, Any]) -> None:
+        if not state:
+            return
+        with self._lock, self.connection as conn:
+            conn.executemany(
+                "INSERT INTO etl_state (key, value) VALUES (?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+                state.items(),
+            )
+
+    def retrieve_state(self, keys: Iterable[str]) -> Dict[str, Any]:
+        keys = list(keys)
+        if not keys:
+            return {}
+        with self._lock:
+            rows = self.connection.execute(
+                f"SELECT key, value FROM etl_state WHERE key IN ({', '.join('?' * len(keys))})",
+                keys,
+            ).fetchall()
+        return dict(rows)
+
+    def delete_state(self, keys: Iterable[str]) -> None:
+        keys = list(keys)
+        if keys:
+            with self._lock, self.connection as conn:
+                conn.executemany("DELETE FROM etl_state WHERE key = ?", [(key,) for key in keys])
+
+    def save_fields(self, key: str, fields: Dict[str, bytes]) -> None:
+        if not fields:
+            return
+        with self._lock, self.connection as conn:
+            conn.executemany(
+                "INSERT INTO etl_fields (key, field, value) VALUES (?, ?, ?) "
+                "ON CONFLICT (key, field) DO UPDATE SET value = excluded.value",
+                [(key, field, value) for field, value in fields.items()],
+            )
+
+    def retrieve_fields(self, key: str, fields: List[str]) -> List[Optional[bytes]]:
+        found: Dict[str, bytes] = {}
+        with self._lock:
+            # Число параметров запроса SQLite ограничено, поэтому поля читаются порциями.
+            for start in range(0, len(fields), SQLITE_MAX_PARAMETERS):
+                chunk = fields[start : start + SQLITE_MAX_PARAMETERS]
+                rows = self.connection.execute(
+                    f"SELECT field, value FROM etl_fields WHERE key = ? AND field IN ({', '.join('?' * len(chunk))})",
+                    [key, *chunk],
+                ).fetchall()
+                found.update(rows)
+        return [found.get(field) for field in fields]
+
+    def retrieve_all_fields(self, key: str) -> Dict[str, bytes]:
+        with self._lock:
+            return dict(self.connection.execute("SELECT field, value FROM etl_fields WHERE key = ?", (key,)).fetchall())
+
+    def delete_fields(self, key: str, fields: List[str]) -> None:
+        if fields:
+            with self._lock, self.connection as conn:
+                conn.executemany(
+                    "DELETE FROM etl_fields WHERE key = ? AND field = ?",
+                    [(key, field) for field in fields],
+                )
+
+    def drop_fields(self, key: str) -> None:
+        with self._lock, self.connection as conn:
+            conn.execute("DELETE FROM etl_fields WHERE key = ?", (key,))
+
+    def move_fields(self, source: str, key: str) -> bool:
+        with self._lock, self.connection as conn:
+            if conn.execute("SELECT 1 FROM etl_fields WHERE key = ? LIMIT 1", (source,)).fetchone() is None:
+                return False
+            conn.execute("DELETE FROM etl_fields WHERE key = ?", (key,))
+            conn.execute("UPDATE etl_fields SET key = ? WHERE key = ?", (key, source))
+        return True
 
 
 class RedisState:
-    """Класс для работы с состояниями."""
+    """Класс для работы с состояниями.
 
-    def __init__(self, redis_conn: Optional[Redis] = None) -> None:
+    Курсоры, хэши документов и недоставленные документы хранятся в BaseStorage,
+    выбранном STATE_BACKEND (по умолчанию - в Redis); с STATE_BACKEND=sqlite
+    ETL к Redis не обращается.
+    """
+
+    def __init__(self, redis_conn: Optional[Redis] = None, storage: Optional[BaseStorage] = None) -> None:
         self._redis_conn = redis_conn
+        self._storage = storage
 
     @property
     def redis_connection(self) -> Redis:
@@ -51,14 +271,91 @@ class RedisState:
             )
         return self._redis_conn  # type: ignore
 
-    @retry(**RETRY_CONFIG)
+    @property
+    def storage(self) -> BaseStorage:
+        if self._storage is None:
+            if ETLConfig.state_backend == "sqlite":
+                self._storage = SQLiteStorage(ETLConfig.state_path)
+            else:
+                self._storage = RedisStorage(self.redis_connection)
+        return self._storage
+
     def set_state(self, key: str, value: Any) -> None:
         """Установить состояние для определённого ключа."""
-        self.redis_connection.set(key, value.encode())
+        self.storage.save_state({key: value})
 
     def get_state(self, key: str, default: Optional[str] = None) -> Optional[str]:
         """Получить состояние по определённому ключу."""
-        data = self.redis_connection.get(key)
-        if data:
-            return data.decode()
-        return default
+        return self.storage.retrieve_state([key]).get(key, default)
+
+    def set_states(self, states: Dict[str, Any]) -> None:
+        """Установить состояние нескольких ключей за одно обращение к хранилищу."""
+        self.storage.save_state(states)
+
+    def get_states(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """Получить состояние нескольких ключей за одно обращение; отсутствующих ключей в ответе нет."""
+        return self.storage.retrieve_state(keys)
+
+    def delete_state(self, *keys: str) -> None:
+        self.storage.delete_state(keys)
+
+
+class DocumentHashStore:
+    """Хэши последних загруженных в ES документов: словарь полей на индекс, поле - id документа."""
+
+    def __init__(self, redis_state: RedisState) -> None:
+        self._state = redis_state
+
+    @staticmethod
+    def _key(index: str) -> str:
+        # Демон передаёт члены ETLIndexes, reindex - их значения: ключ один и тот же.
+        return f"document_hashes_in_{label(index)}"
+
+    def get_many(self, index: str, ids: List[str]) -> List[Optional[bytes]]:
+        return self._state.storage.retrieve_fields(self._key(index), ids)
+
+    def set_many(self, index: str, hashes: Dict[str, bytes]) -> None:
+        self._state.storage.save_fields(self._key(index), hashes)
+
+    def discard(self, index: str, ids: List[str]) -> None:
+        self._state.storage.delete_fields(self._key(index), ids)
+
+    def forget(self, index: str) -> None:
+        self._state.storage.drop_fields(self._key(index))
+
+    def rename(self, source: str, index: str) -> None:
+        """Хэши source заменяют хэши index; без source хэши index забываются: они описывают прежнюю версию."""
+        if not self._state.storage.move_fields(self._key(source), self._key(index)):
+            self._state.storage.drop_fields(self._key(index))
+
+
+class DeadLetterStore:
+    """Документы, которые ES отверг окончательно: словарь полей на индекс, поле - id документа.
+
+    Значение - JSON с самим документом, статусом и причиной отказа ES.
+    """
+
+    def __init__(self, redis_state: RedisState) -> None:
+        self._state = redis_state
+
+    @staticmethod
+    def _key(index: str) -> str:
+        # Как и у хэшей: члены ETLIndexes и их значения дают один ключ.
+        return f"dead_letters_in_{label(index)}"
+
+    def add(self, index: str, letters: Dict[str, str]) -> None:
+        self._state.storage.save_fields(self._key(index), {key: value.encode() for key, value in letters.items()})
+
+    def get_all(self, index: str) -> Dict[str, str]:
+        return {key: value.decode() for key, value in self._state.storage.retrieve_all_fields(self._key(index)).items()}
+
+    def discard(self, index: str, ids: List[str]) -> None:
+        self._state.storage.delete_fields(self._key(index), ids)
+
+    def forget(self, index: str) -> None:
+        self._state.storage.drop_fields(self._key(index))
+
+    def rename(self, source: str, index: str) -> None:
+        """Недоставленные source заменяют недоставленные index; без source список index очищается."""
+        if not self._state.storage.move_fields(self._key(source), self._key(index)):
+            self._state.storage.drop_fields(self._key(index))
@@ -1,33 +1,140 @@
 # Standard Library
+import hashlib
+import json
 import logging
+from itertools import islice
 from typing import (
+    Dict,
     Iterator,
+    List,
+    Optional,
     Tuple,
+    Union,
 )
 
 # First Party
-from config.states import RedisState
+from config.etl_config import ETLConfig
+from config.etl_models import (
+    KeysetCursor,
+    RawDocument,
+    document_id,
+)
+from config.metrics import (
+    SKIPPED_DOCUMENTS,
+    STAGE_ROWS,
+    label,
+)
+from config.states import (
+    DocumentHashStore,
+    RedisState,
+)
 
 
 logger = logging.getLogger(__name__)
 
 
 class PGDataTransformer:
-    def __init__(self, redis_state: RedisState) -> None:
+    """Отсеивает документы, которые не изменились с последней загрузки.
+
+    Хэш документа сравнивается с хэшем, сохранённым при прошлой загрузке;
+    новые хэши записываются только после подтверждения от ES (commit_hashes),
+    чтобы незагруженный документ не посчитался загруженным.
+    """
+
+    def __init__(self, redis_state: RedisState, hash_store: Optional[DocumentHashStore] = None) -> None:
         self._state = redis_state
+        self._hashes = hash_store
+        self._pending: Dict[str, Dict[str, bytes]] = {}
+        self.transformed = 0
+        self.skipped = 0
 
     def transform_data_for_es(
         self,
         index,
-        data: Iterator[Tuple[dict, str]],
-    ) -> Iterator[dict]:
-        last_updated = ""
-        key = f"last_updated_in_{index}"
-
+        data: Iterator[Tuple[Union[dict, RawDocument], KeysetCursor]],
+        skip_unchanged: bool = True,
+    ) -> Iterator[Tuple[Union[dict, RawDocument], KeysetCursor]]:
         logger.info("About to transform data for ES")
-        for filmwork, modified_at in data:
-            last_updated = modified_at
-            yield filmwork
+        pending = self._pending[index] = {}
+        transformed = STAGE_ROWS.labels("transform", label(index))
+        if self._hashes is None:
+            for item in data:
+                transformed.inc()
+                yield item
+            return
+
+        skipped = 0
+        while batch := list(islice(data, ETLConfig.batch_size)):
+            ids = [document_id(document) for document, _ in batch]
+            stored = self._hashes.get_many(index, ids) if skip_unchanged else [None] * len(batch)
+            for (document, cursor), doc_id, old_hash in zip(batch, ids, stored):
+                new_hash = self.document_hash(document)
+                self.transformed += 1
+                transformed.inc()
+                if new_hash == old_hash:
+                    skipped += 1
+                    continue
+                pending[doc_id] = new_hash
+                yield document, cursor
+
+        self.skipped += skipped
+        SKIPPED_DOCUMENTS.labels(label(index)).inc(skipped)
+        if skipped:
+            logger.info(f"{skipped} unchanged documents skipped for index {index}, {self.skipped} in total")
+
+    def drop_unchanged(
+        self,
+        index: str,
+        documents: List[Union[dict, RawDocument]],
+    ) -> Tuple[List[Union[dict, RawDocument]], Dict[str, bytes]]:
+        """Отсеять из пачки документы с прежним хэшем, вернуть остальные и их новые хэши.
+
+        Для асинхронного движка, который не идёт через transform_data_for_es:
+        новые хэши он сохраняет через save_hashes после подтверждения от ES.
+        """
+        if self._hashes is None or not documents:
+            return documents, {}
+        ids = [document_id(document) for document in documents]
+        changed, hashes = [], {}
+        for document, doc_id, old_hash in zip(documents, ids, self._hashes.get_many(index, ids)):
+            new_hash = self.document_hash(document)
+            if new_hash != old_hash:
+                changed.append(document)
+                hashes[doc_id] = new_hash
+        skipped = len(documents) - len(changed)
+        self.transformed += len(documents)
+        self.skipped += skipped
+        SKIPPED_DOCUMENTS.labels(label(index)).inc(skipped)
+        return changed, hashes
+
+    def save_hashes(self, index: str, hashes: Dict[str, bytes]) -> None:
+        if self._hashes is not None:
+            self._hashes.set_many(index, hashes)
+
+    def commit_hashes(self, index: str, ids: List[str]) -> None:
+        """Запомнить хэши документов, которые ES подтвердил."""
+        if self._hashes is not None:
+            pending = self._pending.get(index, {})
+            hashes = {doc_id: pending.pop(doc_id) for doc_id in ids if doc_id in pending}
+            self._hashes.set_many(index, hashes)
+
+    def discard_hashes(self, index: str, ids: List[str]) -> None:
+        """Забыть хэши документов, изменённых в ES в обход полной загрузки (частичным обновлением)."""
+        if self._hashes is not None:
+            self._hashes.discard(index, ids)
+
+    def adopt_hashes(self, source: str, index: str) -> None:
+        if self._hashes is not None:
+            self._hashes.rename(source, index)
 
-        if last_updated:
-            self._state.set_state(key, last_updated)
+    @staticmethod
+    def document_hash(document: Union[dict, RawDocument]) -> bytes:
+        if isinstance(document, RawDocument):
+            source = document.source.encode()
+        else:
+            source = json.dumps(
+                {key: value for key, value in document.items() if key != "_id"},
+                sort_keys=True,
+                default=str,
+            ).encode()
+        return hashlib.blake2b(source, digest_size=16).digest()
@@ -0,0 +1,49 @@
+# Standard Library
+import argparse
+import json
+import logging
+import sys
+
+# Third Party
+from reindex import make_etl
+
+# First Party
+from config.etl_config import ETLIndexes
+from config.states import (
+    DeadLetterStore,
+    RedisState,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+def show(store: DeadLetterStore, name: str) -> None:
+    for doc_id, letter in sorted(store.get_all(name).items()):
+        letter = json.loads(letter)
+        sys.stdout.write(f"{doc_id}\t{letter['status']}\t{letter['failed_at']}\t{json.dumps(letter['reason'])}\n")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Inspect, replay or drop documents rejected by Elasticsearch")
+    parser.add_argument("command", choices=["list", "replay", "purge"])
+    parser.add_argument("--index", default=ETLIndexes.movies.value, choices=[index.value for index in ETLIndexes])
+    parser.add_argument("--target", help="ES index the documents were loaded into, if not the index alias")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    args = parse_args()
+    name = args.target or args.index
+    store = DeadLetterStore(RedisState())
+
+    if args.command == "list":
+        show(store, name)
+    elif args.command == "purge":
+        store.forget(name)
+        logger.info(f"Dead letters of index {name} dropped")
+    else:
+        remaining = make_etl().replay_dead_letters(args.index, args.target)
+        if remaining:
+            sys.exit(f"{remaining} document(s) of index {name} are still dead letters, see the list command")
@@ -0,0 +1,114 @@
+# Standard Library
+import json
+import logging
+import re
+from pathlib import Path
+from typing import (
+    List,
+    Optional,
+)
+
+# Third Party
+from elasticsearch import (
+    Elasticsearch,
+    NotFoundError,
+)
+from tenacity import retry
+
+# First Party
+from config.etl_config import RETRY_CONFIG
+
+
+logger = logging.getLogger(__name__)
+
+INDEXES_DIR = Path(__file__).resolve().parent / "indexes"
+
+
+class ESIndexManager:
+    """Версии индекса вида {alias}_v{n} за алиасом {alias}.
+
+    Новая версия создаётся с настройками для массовой загрузки
+    (refresh_interval -1, без реплик), после загрузки получает настройки
+    из indexes/{alias}.json, сливает сегменты и одним атомарным запросом
+    подменяет собой алиас. Старые версии остаются для отката.
+    """
+
+    bulk_settings = {"refresh_interval": "-1", "number_of_replicas": 0}
+
+    def __init__(self, es_conn: Elasticsearch, alias: str) -> None:
+        self._es_conn = es_conn
+        self._alias = alias
+        self._schema = json.loads((INDEXES_DIR / f"{alias}.json").read_text())
+
+    @property
+    def live_settings(self) -> dict:
+        settings = self._schema.get("settings", {})
+        return {
+            "refresh_interval": settings.get("refresh_interval", "1s"),
+            "number_of_replicas": settings.get("number_of_replicas", 1),
+        }
+
+    def versions(self) -> List[str]:
+        """Все версии индекса, от старых к новым."""
+        pattern = re.compile(rf"^{re.escape(self._alias)}_v(\d+)$")
+        names = self._es_conn.indices.get(index=f"{self._alias}_v*", expand_wildcards="all")
+        return sorted((name for name in names if pattern.match(name)), key=lambda name: int(pattern.match(name)[1]))
+
+    def current(self) -> Optional[str]:
+        """Версия, на которую сейчас указывает алиас."""
+        try:
+            return next(iter(self._es_conn.indices.get_alias(name=self._alias)))
+        except NotFoundError:
+            return None
+
+    @retry(**RETRY_CONFIG)
+    def create_version(self) -> str:
+        versions = self.versions()
+        last = int(versions[-1].rsplit("_v", 1)[1]) if versions else 0
+        name = f"{self._alias}_v{last + 1}"
+        settings = {**self._schema.get("settings", {}), **self.bulk_settings}
+        self._es_conn.indices.create(index=name, settings=settings, mappings=self._schema["mappings"])
+        logger.info(f"Created index {name} for bulk load")
+        return name
+
+    @retry(**RETRY_CONFIG)
+    def finalize(self, name: str) -> None:
+        """Вернуть рабочие настройки, обновить и слить сегменты после загрузки."""
+        self._es_conn.indices.put_settings(index=name, settings={"index": self.live_settings})
+        self._es_conn.indices.refresh(index=name)
+        self._es_conn.options(request_timeout=3600).indices.forcemerge(index=name, max_num_segments=1)
+        logger.info(f"Index {name} finalized with {self.live_settings}")
+
+    @retry(**RETRY_CONFIG)
+    def swap_alias(self, name: str) -> None:
+        """Переключить алиас на name одним атомарным запросом.
+
+        Если под именем алиаса пока живёт обычный индекс (до первой
+        пересборки), он удаляется в том же запросе.
+        """
+        actions: List[dict] = [{"add": {"index": name, "alias": self._alias}}]
+        current = self.current()
+        if current:
+            actions.insert(0, {"remove": {"index": current, "alias": self._alias}})
+        elif self._es_conn.indices.exists(index=self._alias):
+            logger.warning(f"Replacing concrete index {self._alias} with an alias, it cannot be rolled back to")
+            actions.insert(0, {"remove_index": {"index": self._alias}})
+        self._es_conn.indices.update_aliases(actions=actions)
+        logger.info(f"Alias {self._alias} switched from {current} to {name}")
+
+    def previous(self) -> str:
+        """Версия перед той, на которую указывает алиас."""
+        current = self.current()
+        versions = self.versions()
+        if current not in versions or versions.index(current) == 0:
+            raise ValueError(f"No previous version of {self._alias} to roll back to")
+        return versions[versions.index(current) - 1]
+
+    def collect_garbage(self, keep: int) -> List[str]:
+        """Удалить версии старше keep последних, кроме той, на которую указывает алиас."""
+        current = self.current()
+        stale = [name for name in self.versions()[:-keep] if name != current]
+        for name in stale:
+            self._es_conn.indices.delete(index=name)
+            logger.info(f"Deleted old index version {name}")
+        return stale
@@ -1,25 +1,218 @@
 # Standard Library
+import json
 import logging
-from typing import Iterator
+import threading
+import time
+from collections import deque
+from concurrent.futures import (
+    Future,
+    ThreadPoolExecutor,
+)
+from dataclasses import (
+    dataclass,
+    field,
+)
+from datetime import (
+    datetime,
+    timezone,
+)
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
+)
 
 # Third Party
 from elasticsearch import (
+    ApiError,
     Elasticsearch,
     helpers,
 )
-from tenacity import retry
+from tenacity import (
+    Retrying,
+    retry,
+)
 
 # First Party
+from config.es_transport import make_es_client
 from config.etl_config import (
     RETRY_CONFIG,
+    ESConfig,
     ESConfigSettings,
 )
-from config.states import RedisState
+from config.etl_models import (
+    KeysetCursor,
+    RawDocument,
+    document_id,
+)
+from config.metrics import (
+    BULK_CHUNK_BYTES,
+    BULK_CHUNK_DOCUMENTS,
+    BULK_CHUNK_LIMIT_BYTES,
+    BULK_CHUNK_LIMIT_DOCUMENTS,
+    BULK_SECONDS,
+    DEAD_LETTERED_DOCUMENTS,
+    FAILED_DOCUMENTS,
+    FRESHNESS_SECONDS,
+    STAGE_ROWS,
+    label,
+    timed,
+)
+from config.states import (
+    DeadLetterStore,
+    RedisState,
+)
 
 
 logger = logging.getLogger(__name__)
 
 
+# Строка действия bulk {"index":{"_id":"..."}} без id и переводы строк.
+ACTION_OVERHEAD = 22
+# Статусы ответа ES на документ, при которых его стоит отправить ещё раз.
+RETRYABLE_STATUSES = frozenset({408, 429, 502, 503, 504})
+
+
+class RetryableBulkError(Exception):
+    """В ответе bulk остались документы с временными ошибками."""
+
+    def __init__(self, errors: List[dict]) -> None:
+        super().__init__(f"{len(errors)} document(s) rejected with a retryable status")
+        self.errors = errors
+
+
+def bulk_error_id(error: dict) -> str:
+    return str(next(iter(error.values()))["_id"])
+
+
+def split_bulk_errors(errors: List[dict]) -> Tuple[List[dict], List[dict]]:
+    """Разделить ошибки документов из ответа bulk на временные и постоянные.
+
+    Частичное обновление документа, которого ещё нет в индексе (update с 404),
+    ошибкой не считается: документ целиком загрузит проход по таблице индекса.
+    Удаление документа, которого уже нет (delete с 404), - тоже.
+    """
+    retryable, permanent = [], []
+    for error in errors:
+        op_type, item = next(iter(error.items()))
+        if op_type in ("update", "delete") and item.get("status") == 404:
+            continue
+        (retryable if item.get("status") in RETRYABLE_STATUSES else permanent).append(error)
+    return retryable, permanent
+
+
+def make_dead_letters(errors: List[dict], documents: Dict[str, Union[dict, RawDocument]]) -> Dict[str, str]:
+    """Записи хранилища недоставленных: документ, статус и причина отказа ES."""
+    failed_at = datetime.now(timezone.utc).isoformat()
+    letters = {}
+    for error in errors:
+        item = next(iter(error.values()))
+        doc_id = str(item["_id"])
+        _, source = ESLoader.expand_action(documents[doc_id])
+        letters[doc_id] = json.dumps(
+            {
+                "status": item.get("status"),
+                "reason": item.get("error"),
+                "document": json.loads(source) if isinstance(source, (str, bytes)) else source,
+                "failed_at": failed_at,
+            },
+            default=str,
+        )
+    return letters
+
+
+def record_freshness(index: str, cursors: List[KeysetCursor]) -> None:
+    """Записать в FRESHNESS_SECONDS, сколько прошло от updated_at строк до подтверждения их документов в ES."""
+    acknowledged_at = datetime.now(timezone.utc)
+    freshness = FRESHNESS_SECONDS.labels(label(index))
+    for cursor in cursors:
+        freshness.observe((acknowledged_at - cursor.updated_at).total_seconds())
+
+
+class ChunkResult(NamedTuple):
+    indexed: int
+    errors: List[dict]
+    retries: int
+    checkpoint: KeysetCursor
+    ids: List[str]
+    dead_lettered: int
+    documents: int
+    seconds: float
+    throttled: bool
+
+
+@dataclass
+class BulkStats:
+    """Итог загрузки: сколько пачек и документов прошло, упало, ушло в недоставленные и повторялось."""
+
+    chunks: int = 0
+    indexed: int = 0
+    failed: int = 0
+    dead_lettered: int = 0
+    retried: int = 0
+    errors: List[dict] = field(default_factory=list, repr=False)
+
+    def account(self, result: ChunkResult) -> None:
+        self.chunks += 1
+        self.indexed += result.indexed
+        self.failed += len(result.errors)
+        self.dead_lettered += result.dead_lettered
+        self.retried += result.retries
+        self.errors.extend(result.errors)
+
+
+class BulkChunkSizer:
+    """Лимит документов в пачке bulk одного индекса.
+
+    Пачка закрывается, когда набрала ES_BULK_MAX_BYTES байт или лимит
+    документов. Лимит начинается с BATCH_SIZE и, если ES_BULK_ADAPTIVE
+    включён, подстраивается по ответам ES в пределах
+    ES_BULK_MIN_DOCUMENTS..ES_BULK_MAX_DOCUMENTS: при отказах 429 делится
+    пополам, при bulk дольше ES_BULK_TARGET_LATENCY уменьшается
+    пропорционально, а если полная пачка загрузилась быстро - растёт на четверть.
+    """
+
+    def __init__(self, index: str, documents: int) -> None:
+        self.index = index
+        self.documents = self._clamp(documents)
+        self.max_bytes = ESConfig.bulk_max_bytes
+        BULK_CHUNK_LIMIT_DOCUMENTS.labels(label(index)).set(self.documents)
+        BULK_CHUNK_LIMIT_BYTES.labels(label(index)).set(self.max_bytes)
+
+    def observe(self, result: ChunkResult) -> None:
+        if not ESConfig.bulk_adaptive:
+            return
+        target = ESConfig.bulk_target_latency
+        # Уменьшение считается от размера самой пачки: пачки, собранные до
+        # снижения лимита, не уменьшают его повторно.
+        if result.throttled:
+            documents, reason = min(self.documents, result.documents // 2), "429 rejections"
+        elif result.seconds > target * 1.5:
+            documents = min(self.documents, int(result.documents * target / result.seconds))
+            reason = f"bulk took {result.seconds:.2f}s"
+        elif result.seconds < target / 2 and result.documents >= self.documents:
+            documents, reason = self.documents + self.documents // 4 + 1, f"bulk took {result.seconds:.2f}s"
+        else:
+            return
+
+        documents = self._clamp(documents)
+        if documents != self.documents:
+            logger.info(f"Bulk chunk limit of index {self.index}: {self.documents} -> {documents} documents ({reason})")
+            self.documents = documents
+            BULK_CHUNK_LIMIT_DOCUMENTS.labels(label(self.index)).set(documents)
+
+    @staticmethod
+    def _clamp(documents: int) -> int:
+        return max(ESConfig.bulk_min_documents, min(ESConfig.bulk_max_documents, documents))
+
+
 class ESLoader:
     def __init__(
         self,
@@ -30,33 +223,215 @@ class ESLoader:
         self._config = config
         self._es_conn = es_conn
         self._state = redis_state
+        self._dead_letters = DeadLetterStore(redis_state)
+        self._sizers: Dict[str, BulkChunkSizer] = {}
+        self._sizers_lock = threading.Lock()
 
     @retry(**RETRY_CONFIG)
     def create_es_connection(self) -> Elasticsearch:
         if self._es_conn is None:
-            self._es_conn = Elasticsearch(
-                [
-                    f"{self._config.http_schema}://{self._config.host}:{self._config.port}",
-                ],
-            )
+            self._es_conn = make_es_client()
             return self._es_conn
 
-    @retry(**RETRY_CONFIG)
+    @staticmethod
+    def expand_action(data: Union[dict, RawDocument]) -> Tuple[dict, Any]:
+        """Готовый JSON из Postgres отправляется в тело bulk без разбора."""
+        if isinstance(data, RawDocument):
+            return {data.op_type: {"_id": data.id}}, data.source
+        return helpers.expand_action(data)
+
     def upload_data_to_es(
         self,
         index: str,
-        data: Iterator[dict],
+        data: Iterator[Tuple[Union[dict, RawDocument], KeysetCursor]],
         itersize: int,
-    ) -> None:
+        on_checkpoint: Optional[Callable[[KeysetCursor], None]] = None,
+        on_indexed: Optional[Callable[[List[str]], None]] = None,
+    ) -> BulkStats:
+        """Параллельная загрузка в ES пачками, размер которых подбирает BulkChunkSizer (начиная с itersize документов).
 
-        rows, _ = helpers.bulk(
-            client=self._es_conn,
-            actions=data,
-            index=index,
-            chunk_size=itersize,
-        )
+        Одновременно в работе не больше ES_BULK_CHUNKS_IN_FLIGHT пачек
+        на ES_BULK_WORKERS потоках; при сбое повторяется только упавшая пачка.
+        Пачки учитываются в порядке отправки, и после подтверждения каждой
+        on_checkpoint получает позицию её последнего документа, пока все
+        предыдущие пачки загрузились без ошибок; документы, ушедшие в
+        недоставленные, курсор не держат. Если хотя бы один документ так и не
+        загрузился из-за временной ошибки, после учёта всех пачек поднимается
+        BulkIndexError.
+        on_indexed получает id документов каждой пачки, которые ES принял.
+        FRESHNESS_SECONDS пишется только для загрузок с on_checkpoint:
+        это инкрементальная загрузка строк таблицы индекса по курсору
+        (updated_at, id), и только там updated_at - время изменения документа.
+        """
+        stats = BulkStats()
+        sizer = self._sizer(index, itersize)
+        in_flight: Deque[Future] = deque()
+
+        with ThreadPoolExecutor(max_workers=ESConfig.bulk_workers) as executor:
+            try:
+                for chunk in self._chunk_actions(data, sizer):
+                    if len(in_flight) >= ESConfig.bulk_chunks_in_flight:
+                        self._account(in_flight.popleft(), stats, sizer, on_checkpoint, on_indexed)
+                    in_flight.append(executor.submit(self._send_chunk, index, chunk, on_checkpoint is not None))
+                while in_flight:
+                    self._account(in_flight.popleft(), stats, sizer, on_checkpoint, on_indexed)
+            finally:
+                for future in in_flight:
+                    future.cancel()
 
-        if rows == 0:
+        if stats.indexed == 0 and stats.failed == 0 and stats.dead_lettered == 0:
             logger.info(f"No updates for index {index}")
         else:
-            logger.info(f"{rows} saved in index {index}")
+            logger.info(f"{stats.indexed} saved in index {index}: {stats}, chunk limit {sizer.documents} documents")
+
+        if stats.errors:
+            raise helpers.BulkIndexError(f"{len(stats.errors)} document(s) failed to index.", stats.errors)
+        return stats
+
+    def _sizer(self, index: str, itersize: int) -> BulkChunkSizer:
+        """Лимит пачек индекса живёт между загрузками, чтобы не подбираться заново на каждом цикле."""
+        with self._sizers_lock:
+            if index not in self._sizers or not ESConfig.bulk_adaptive:
+                self._sizers[index] = BulkChunkSizer(index, itersize)
+            return self._sizers[index]
+
+    @staticmethod
+    def _account(
+        future: Future,
+        stats: BulkStats,
+        sizer: BulkChunkSizer,
+        on_checkpoint: Optional[Callable[[KeysetCursor], None]],
+        on_indexed: Optional[Callable[[List[str]], None]],
+    ) -> None:
+        result = future.result()
+        stats.account(result)
+        sizer.observe(result)
+        if on_indexed is not None:
+            on_indexed(result.ids)
+        if on_checkpoint is not None and stats.failed == 0:
+            on_checkpoint(result.checkpoint)
+
+    def _send_chunk(
+        self,
+        index: str,
+        chunk: List[Tuple[Union[dict, RawDocument], KeysetCursor]],
+        observe_freshness: bool = False,
+    ) -> ChunkResult:
+        """Отправить пачку, повторяя только документы с временными ошибками.
+
+        Документы с постоянными ошибками (маппинг, разбор) не повторяются,
+        а уходят в хранилище недоставленных; если временные ошибки остались
+        и после всех повторов, они возвращаются в errors.
+        """
+        documents = {document_id(document): document for document, _ in chunk}
+        pending = [document for document, _ in chunk]
+        indexed = 0
+        errors: List[dict] = []
+        dead_letters: List[dict] = []
+        attempts = 0
+        seconds = 0.0
+        throttled = False
+        try:
+            for attempt in Retrying(**{**RETRY_CONFIG, "reraise": True}):
+                with attempt:
+                    attempts += 1
+                    start = time.perf_counter()
+                    try:
+                        with timed(BULK_SECONDS, index):
+                            sent, item_errors = helpers.bulk(
+                                client=self._es_conn,
+                                actions=pending,
+                                index=index,
+                                chunk_size=len(pending),
+                                expand_action_callback=self.expand_action,
+                                raise_on_error=False,
+                            )
+                    except ApiError as e:
+                        throttled = throttled or e.meta.status == 429
+                        raise
+                    finally:
+                        if attempts == 1:
+                            seconds = time.perf_counter() - start
+                    indexed += sent
+                    throttled = throttled or any(
+                        next(iter(error.values())).get("status") == 429 for error in item_errors
+                    )
+                    retryable, permanent = split_bulk_errors(item_errors)
+                    dead_letters.extend(permanent)
+                    if retryable:
+                        pending = [documents[bulk_error_id(error)] for error in retryable]
+                        raise RetryableBulkError(retryable)
+        except RetryableBulkError as e:
+            errors = e.errors
+
+        if dead_letters:
+            self._dead_letters.add(index, make_dead_letters(dead_letters, documents))
+        failed = {bulk_error_id(error) for error in errors + dead_letters}
+        ids = []
+        cursors = []
+        for document, cursor in chunk:
+            doc_id = document_id(document)
+            if doc_id not in failed:
+                ids.append(doc_id)
+                cursors.append(cursor)
+        if observe_freshness:
+            record_freshness(index, cursors)
+        STAGE_ROWS.labels("load", label(index)).inc(indexed)
+        FAILED_DOCUMENTS.labels(label(index)).inc(len(errors))
+        DEAD_LETTERED_DOCUMENTS.labels(label(index)).inc(len(dead_letters))
+        if dead_letters:
+            logger.warning(f"{len(dead_letters)} document(s) rejected by index {index} moved to dead letters")
+        return ChunkResult(
+            indexed=indexed,
+            errors=errors,
+            retries=attempts - 1,
+            checkpoint=chunk[-1][1],
+            ids=ids,
+            dead_lettered=len(dead_letters),
+            documents=len(chunk),
+            seconds=seconds,
+            throttled=throttled,
+        )
+
+    def _chunk_actions(
+        self,
+        data: Iterator[Tuple[Union[dict, RawDocument], KeysetCursor]],
+        sizer: BulkChunkSizer,
+    ) -> Iterator[List[Tuple[RawDocument, KeysetCursor]]]:
+        """Пачки по лимитам sizer: не больше его лимита документов и ES_BULK_MAX_BYTES байт тела bulk.
+
+        Документы сериализуются здесь, один раз: размер пачки известен
+        точно, а helpers.bulk отправляет готовые байты без повторной сериализации.
+        """
+        serializer = self._es_conn.transport.serializers.get_serializer("application/json")
+        chunk: List[Tuple[RawDocument, KeysetCursor]] = []
+        size = 0
+        for document, cursor in data:
+            if isinstance(document, RawDocument):
+                source = document.source.encode() if isinstance(document.source, str) else document.source
+                raw = document._replace(source=source)
+            else:
+                action, source = helpers.expand_action(document)
+                raw = RawDocument(
+                    id=document_id(document),
+                    source=serializer.dumps(source) if source is not None else None,
+                    op_type=next(iter(action)),
+                )
+            document_size = len(raw.source or b"") + len(raw.id) + ACTION_OVERHEAD
+            if chunk and (len(chunk) >= sizer.documents or size + document_size > sizer.max_bytes):
+                yield self._observe_chunk(sizer, chunk, size)
+                chunk, size = [], 0
+            chunk.append((raw, cursor))
+            size += document_size
+        if chunk:
+            yield self._observe_chunk(sizer, chunk, size)
+
+    @staticmethod
+    def _observe_chunk(
+        sizer: BulkChunkSizer,
+        chunk: List[Tuple[RawDocument, KeysetCursor]],
+        size: int,
+    ) -> List[Tuple[RawDocument, KeysetCursor]]:
+        BULK_CHUNK_DOCUMENTS.labels(label(sizer.index)).observe(len(chunk))
+        BULK_CHUNK_BYTES.labels(label(sizer.index)).observe(size)
+        return chunk
@@ -1,11 +1,24 @@
 # Standard Library
-from datetime import datetime
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import (
+    datetime,
+    timedelta,
+    timezone,
+)
+from functools import partial
 from typing import (
+    Callable,
+    Dict,
     Iterator,
     List,
     Optional,
+    Set,
     Tuple,
+    Union,
 )
+from uuid import UUID
 
 # Third Party
 from data_transformer import PGDataTransformer
@@ -15,13 +28,56 @@ from postgres_extractor import PGExtractor
 
 # First Party
 from config.etl_config import (
+    TOMBSTONES,
     ESConfigSettings,
     ETLConfig,
     ETLIndexes,
+    ETLProducers,
     PostgresConnectParameters,
 )
+from config.etl_models import (
+    KeysetCursor,
+    RawDocument,
+    RebuildState,
+    ShardProgress,
+    Tombstone,
+)
+from config.metrics import (
+    DELETED_DOCUMENTS,
+    label,
+)
+from config.index_registry import (
+    get_index_spec,
+    source_tables,
+)
 from config.sql_queries import get_query_by_index
-from config.states import RedisState
+from config.states import (
+    DeadLetterStore,
+    DocumentHashStore,
+    RedisState,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SyncReport:
+    """Итог цикла синхронизации: сколько изменённых строк нашлось и самый старый updated_at среди них."""
+
+    rows: int = 0
+    oldest: Optional[datetime] = None
+
+    @property
+    def lag(self) -> timedelta:
+        if self.oldest is None:
+            return timedelta()
+        return datetime.now(timezone.utc) - self.oldest
+
+    def account(self, page: List[KeysetCursor]) -> None:
+        self.rows += len(page)
+        if page and (self.oldest is None or page[0].updated_at < self.oldest):
+            self.oldest = page[0].updated_at
 
 
 class ETL:
@@ -37,42 +93,571 @@ class ETL:
         self._es_conn = es_conn
         self._es_config = es_config
         self._extractor = PGExtractor(self._postgres_settings)
-        self._transformer = PGDataTransformer(self._state)
+        self._transformer = PGDataTransformer(
+            self._state,
+            DocumentHashStore(self._state) if ETLConfig.skip_unchanged else None,
+        )
         self._loader = ESLoader(self._es_config, self._state, self._es_conn)
+        self._dead_letters = DeadLetterStore(self._state)
+        self._passthrough = ETLConfig.json_passthrough
+        self._partial_updates = ETLConfig.partial_updates
 
     def extract_data(
         self,
         index: str,
         query: str,
+        ids: List[str],
         itersize: int,
-    ) -> Iterator[Tuple[dict, str]]:
-        return self._extractor.get_data(index, query, itersize)
+    ) -> Iterator[Tuple[Union[dict, RawDocument], KeysetCursor]]:
+        return self._extractor.get_data(index, query, ids, itersize, self._passthrough_for(index))
 
     def transform_data(
         self,
         index: str,
-        data: Iterator[Tuple[dict, str]],
-    ) -> Iterator[dict]:
-        return self._transformer.transform_data_for_es(index, data)
+        data: Iterator[Tuple[Union[dict, RawDocument], KeysetCursor]],
+        skip_unchanged: bool = True,
+    ) -> Iterator[Tuple[Union[dict, RawDocument], KeysetCursor]]:
+        return self._transformer.transform_data_for_es(index, data, skip_unchanged)
+
+    def load_data_to_es(
+        self,
+        index: str,
+        data: Iterator[Tuple[Union[dict, RawDocument], KeysetCursor]],
+        itersize: int,
+        on_checkpoint: Optional[Callable[[KeysetCursor], None]] = None,
+        on_indexed: Optional[Callable[[List[str]], None]] = None,
+    ) -> None:
+        def indexed(ids: List[str]) -> None:
+            self._transformer.commit_hashes(index, ids)
+            if on_indexed is not None:
+                on_indexed(ids)
+
+        self._loader.upload_data_to_es(index, data, itersize, on_checkpoint, on_indexed=indexed)
+
+    def get_cursor(
+        self,
+        index: str,
+        table: str = ETLProducers.film_work,
+    ) -> KeysetCursor:
+        """Последний сохранённый курсор индекса по таблице table.
+
+        Если курсора по film_work ещё нет, продолжаем со старого строкового
+        водяного знака last_updated_in_{index}, чтобы не переиндексировать всё заново.
+        """
+        cursor = self._state.get_state(key=self._cursor_key(index, table))
+        if cursor:
+            return KeysetCursor.model_validate_json(cursor)
+
+        last_updated = self._state.get_state(key=f"last_updated_in_{index}")
+        if table == ETLProducers.film_work and last_updated:
+            return KeysetCursor(updated_at=last_updated)
+        return KeysetCursor()
+
+    def set_cursor(self, index: str, cursor: KeysetCursor, table: str = ETLProducers.film_work) -> None:
+        self._state.set_state(self._cursor_key(index, table), cursor.model_dump_json())
+
+    def set_cursors(self, cursors: Dict[str, KeysetCursor], table: str) -> None:
+        """Сохранить курсоры нескольких индексов по table за одно обращение к хранилищу."""
+        self._state.set_states(
+            {self._cursor_key(index, table): cursor.model_dump_json() for index, cursor in cursors.items()},
+        )
+
+    def load_documents(
+        self,
+        index: str,
+        ids: List[str],
+        target: Optional[str] = None,
+        on_checkpoint: Optional[Callable[[KeysetCursor], None]] = None,
+        skip_unchanged: bool = True,
+        on_indexed: Optional[Callable[[List[str]], None]] = None,
+    ) -> None:
+        """Загрузить документы индекса index по id строк его таблицы.
+
+        target - имя индекса ES, если оно отличается от index. Документы,
+        совпадающие с уже загруженными в target, не отправляются, если
+        skip_unchanged не выключен. on_indexed получает id документов, которые ES принял.
+        """
+        itersize = ETLConfig.batch_size
+        extracted_data = self.extract_data(
+            index=index,
+            query=get_query_by_index(index=index, passthrough=self._passthrough_for(index)),
+            ids=ids,
+            itersize=itersize,
+        )
+        transformed_data = self.transform_data(
+            index=target or index,
+            data=extracted_data,
+            skip_unchanged=skip_unchanged,
+        )
+        self.load_data_to_es(
+            index=target or index,
+            data=transformed_data,
+            itersize=itersize,
+            on_checkpoint=on_checkpoint,
+            on_indexed=on_indexed,
+        )
+
+    def update_documents(
+        self,
+        index: str,
+        table: str,
+        ids: List[str],
+        target: Optional[str] = None,
+    ) -> None:
+        """Обновить в документах index по id строк его таблицы только поля, которые зависят от table.
+
+        Хэши обновлённых документов забываются: сохранённый хэш описывает
+        документ до обновления, и следующая полная загрузка не должна его пропустить.
+        """
+        itersize = ETLConfig.batch_size
+        self._loader.upload_data_to_es(
+            target or index,
+            self._extractor.get_partial_data(index, table, ids, itersize),
+            itersize,
+            on_indexed=partial(self._transformer.discard_hashes, target or index),
+        )
+
+    def delete_documents(self, index: str, tombstones: Dict[str, Tombstone], target: Optional[str] = None) -> None:
+        """Удалить из index документы по id удалённых строк его таблицы.
+
+        Вместе с документом забываются его хэш и запись в недоставленных.
+        """
+        name = target or index
+
+        def deleted(ids: List[str]) -> None:
+            self._transformer.discard_hashes(name, ids)
+            self._dead_letters.discard(name, ids)
+            DELETED_DOCUMENTS.labels(label(name)).inc(len(ids))
+
+        self._loader.upload_data_to_es(
+            name,
+            (({"_op_type": "delete", "_id": doc_id}, tombstone.cursor) for doc_id, tombstone in tombstones.items()),
+            ETLConfig.batch_size,
+            on_indexed=deleted,
+        )
+
+    def resolve_tombstones(
+        self,
+        index: str,
+        tombstones: List[Tombstone],
+    ) -> Tuple[Dict[str, Tombstone], Dict[str, Set[str]]]:
+        """Удалённые строки в удаляемые документы index и документы, которые надо пересобрать.
 
-    def load_data_to_es(self, index: str, data: Iterator[dict], itersize: int) -> None:
-        return self._loader.upload_data_to_es(index, data, itersize)
+        Удалённая строка таблицы индекса удаляет документ. Удалённая строка
+        таблицы связей меняет документ на своём конце связи, если индекс
+        зависит от таблицы на другом конце: такие id возвращаются по ней.
+        Удаление персоны или жанра приходит через удаление их связей.
+        """
+        spec = get_index_spec(index)
+        deleted: Dict[str, Tombstone] = {}
+        touched: Dict[str, Set[str]] = {}
+        for tombstone in tombstones:
+            if tombstone.table_name == spec.table:
+                deleted[str(tombstone.row_id)] = tombstone
+                continue
+            ends = tombstone.ends
+            doc_id = ends.get(spec.table)
+            if doc_id is None:
+                continue
+            for table, end_id in ends.items():
+                if end_id is not None and table != spec.table and table in spec.depends_on:
+                    touched.setdefault(table, set()).add(str(doc_id))
+        return deleted, touched
+
+    def resolve_changes(self, table: str, ids: List[str], indexes: List[str]) -> Dict[str, List[str]]:
+        """Изменённые строки table в id строк таблиц, по которым собираются документы indexes.
 
-    def run(self, indexes: ETLIndexes) -> None:
+        Общий для всех индексов шаг: каждая связь таблиц запрашивается один раз.
+        """
+        table = ETLProducers(table).value
+        changes = {table: ids}
         for index in indexes:
-            load_from = self._state.get_state(
-                key=f"last_updated_in_{index}",
-                default=str(datetime.min),
+            spec = get_index_spec(index)
+            if spec.table in changes or table not in spec.depends_on:
+                continue
+            if spec.table == ETLProducers.film_work:
+                changes[spec.table] = self._extractor.get_film_work_ids(table, ids)
+            else:
+                changes[spec.table] = self._extractor.get_related_ids(spec.table, ids)
+        return changes
+
+    def sync_table(
+        self,
+        table: str,
+        cursors: Dict[str, KeysetCursor],
+        targets: Optional[Dict[str, str]] = None,
+        persist: bool = True,
+        report: Optional[SyncReport] = None,
+    ) -> Dict[str, KeysetCursor]:
+        """Один проход по изменениям table для всех индексов cursors.
+
+        Страница изменённых строк читается и разворачивается в id документов
+        один раз, начиная с самого отстающего курсора, а загрузка в каждый
+        индекс идёт параллельно, своим загрузчиком и со своим курсором.
+        Индекс, чей курсор уже дальше страницы, её пропускает. Курсор своей
+        таблицы индекса сдвигается после каждой подтверждённой ES пачки,
+        а после страницы курсоры всех индексов сохраняются одной записью.
+        """
+        table = ETLProducers(table).value
+        targets = targets or {}
+        page_size = ETLConfig.page_size
+        positions = dict(cursors)
+        cursor = min(positions.values(), key=self._cursor_order)
+
+        with ThreadPoolExecutor(max_workers=len(positions)) as executor:
+            while page := self._extractor.get_page(table, cursor, page_size):
+                if report is not None:
+                    report.account(page)
+                cursor = page[-1]
+                pending = [
+                    index
+                    for index, position in positions.items()
+                    if self._cursor_order(position) < self._cursor_order(cursor)
+                ]
+                changes = self.resolve_changes(table, [str(row.id) for row in page], pending)
+                futures = [
+                    executor.submit(self._sync_page, index, table, changes, cursor, targets.get(index), persist)
+                    for index in pending
+                ]
+                for index, future in zip(pending, futures):
+                    future.result()
+                    positions[index] = cursor
+                if persist:
+                    self.set_cursors({index: cursor for index in pending}, table)
+                if len(page) < page_size:
+                    break
+        return positions
+
+    def _sync_page(
+        self,
+        index: str,
+        table: str,
+        changes: Dict[str, List[str]],
+        cursor: KeysetCursor,
+        target: Optional[str],
+        persist: bool,
+    ) -> None:
+        spec = get_index_spec(index)
+        ids = changes.get(spec.table, [])
+        # Контрольные точки (и вместе с ними метрика свежести) - только у страниц своей таблицы индекса.
+        on_checkpoint = None
+        if persist and table == spec.table:
+            on_checkpoint = partial(self.set_cursor, index, table=table)
+
+        page_size = ETLConfig.page_size
+        partially = self._updates_partially(index, table)
+        for start in range(0, len(ids), page_size):
+            if partially:
+                self.update_documents(index, table, ids[start : start + page_size], target)
+            else:
+                self.load_documents(index, ids[start : start + page_size], target, on_checkpoint)
+        logger.info(
+            f"{len(changes[table])} changed rows of {table} touched {len(ids)} documents in index {target or index}"
+            f"{' (partial update)' if partially else ''}",
+        )
+
+    def sync_tombstones(
+        self,
+        cursors: Dict[str, KeysetCursor],
+        targets: Optional[Dict[str, str]] = None,
+        persist: bool = True,
+        report: Optional[SyncReport] = None,
+    ) -> Dict[str, KeysetCursor]:
+        """Один проход по надгробиям удалённых строк для всех индексов cursors.
+
+        Как и sync_table, страница читается один раз с самого отстающего
+        курсора, а курсоры всех индексов сохраняются после неё одной записью.
+        """
+        targets = targets or {}
+        page_size = ETLConfig.page_size
+        positions = dict(cursors)
+        cursor = min(positions.values(), key=self._cursor_order)
+
+        self._extractor.seal_tombstones()
+        while page := self._extractor.get_tombstones(cursor, page_size):
+            if report is not None:
+                report.account(page)
+            cursor = page[-1].cursor
+            pending = [
+                index
+                for index, position in positions.items()
+                if self._cursor_order(position) < self._cursor_order(cursor)
+            ]
+            for index in pending:
+                position = self._cursor_order(positions[index])
+                fresh = [tombstone for tombstone in page if self._cursor_order(tombstone) > position]
+                self._apply_tombstones(index, fresh, targets.get(index))
+                positions[index] = cursor
+            if persist:
+                self.set_cursors({index: cursor for index in pending}, TOMBSTONES)
+            if len(page) < page_size:
+                break
+        return positions
+
+    def _apply_tombstones(self, index: str, tombstones: List[Tombstone], target: Optional[str]) -> None:
+        deleted, touched = self.resolve_tombstones(index, tombstones)
+        table = get_index_spec(index).table
+        # Строку могли удалить и вставить заново с тем же id: такой документ пересобирается, а не удаляется.
+        restored = set(self._extractor.get_existing_ids(table, sorted(deleted))) if deleted else set()
+        self.delete_documents(index, {doc_id: deleted[doc_id] for doc_id in deleted if doc_id not in restored}, target)
+
+        loads = set(restored)
+        for source, ids in touched.items():
+            ids = ids - deleted.keys()
+            if self._updates_partially(index, source):
+                ids -= restored
+                if ids:
+                    self.update_documents(index, source, sorted(ids), target)
+            else:
+                loads |= ids
+        if loads:
+            self.load_documents(index, sorted(loads), target)
+        logger.info(
+            f"{len(tombstones)} deleted rows removed {len(deleted) - len(restored)} documents"
+            f" and touched {sum(map(len, touched.values()))} in index {target or index}",
+        )
+
+    def sync_deletions(self, indexes: ETLIndexes) -> None:
+        """Применить к indexes надгробия, накопившиеся с прошлого прохода (режимы listen и cdc)."""
+        cursors = self.prepare_tombstone_cursors(self._known_indexes(indexes))
+        if cursors:
+            self.sync_tombstones(cursors)
+
+    def purge_tombstones(self) -> None:
+        """Удалить надгробия старше TOMBSTONE_RETENTION_DAYS, которые применены во все индексы.
+
+        Граница - самый отстающий сохранённый курсор надгробий, считая снимки
+        незавершённых пересборок. Пока курсоров нет, ничего не удаляется.
+        """
+        cursors = self.stored_tombstone_cursors()
+        if not cursors:
+            return
+        applied = min(cursors, key=self._cursor_order)
+        before = datetime.now(timezone.utc) - timedelta(days=ETLConfig.tombstone_retention)
+        purged = self._extractor.purge_tombstones(applied, before)
+        if purged:
+            logger.info(f"{purged} tombstones applied up to {applied.updated_at} and older than {before} purged")
+
+    def stored_tombstone_cursors(self) -> List[KeysetCursor]:
+        """Сохранённые курсоры надгробий всех индексов и снимков их незавершённых пересборок."""
+        keys = [self._cursor_key(index, TOMBSTONES) for index in ETLIndexes]
+        rebuilds = [RebuildState.key(index.value) for index in ETLIndexes]
+        saved = self._state.get_states(keys + rebuilds)
+        cursors = [KeysetCursor.model_validate_json(saved[key]) for key in keys if key in saved]
+        for key in rebuilds:
+            if key in saved:
+                snapshot = RebuildState.model_validate_json(saved[key]).cursors
+                # Снимок, сделанный до появления надгробий, применит их с начала.
+                cursors.append(snapshot.get(TOMBSTONES, KeysetCursor()))
+        return cursors
+
+    def adopt_hashes(self, index: str, target: str) -> None:
+        """Хэши документов target становятся хэшами индекса index (после переключения алиаса)."""
+        self._transformer.adopt_hashes(target, index)
+
+    def adopt_dead_letters(self, index: str, target: str) -> None:
+        """Недоставленные документы target заменяют недоставленные индекса index (после переключения алиаса)."""
+        self._dead_letters.rename(target, index)
+
+    def replay_dead_letters(self, index: str, target: Optional[str] = None) -> int:
+        """Заново собрать из Postgres и загрузить недоставленные документы, вернуть сколько их осталось.
+
+        Принятые ES документы удаляются из недоставленных, снова отвергнутые
+        перезаписываются с новой причиной. Документы, строк которых больше
+        нет в Postgres, остаются, пока их не удалить вручную.
+        """
+        name = target or index
+        ids = sorted(self._dead_letters.get_all(name))
+        page_size = ETLConfig.page_size
+        for start in range(0, len(ids), page_size):
+            self.load_documents(
+                index,
+                ids[start : start + page_size],
+                target,
+                skip_unchanged=False,
+                on_indexed=partial(self._dead_letters.discard, name),
             )
+        remaining = len(self._dead_letters.get_all(name))
+        logger.info(f"{len(ids) - remaining} of {len(ids)} dead letters of index {name} replayed")
+        return remaining
+
+    def sync_changes(self, indexes: ETLIndexes, changes: Dict[str, Set[str]]) -> None:
+        """Переиндексировать документы, затронутые изменениями changes (id по таблицам-источникам).
+
+        Курсоры не сдвигаются: следующий полный проход пройдёт по тем же
+        строкам, но неизменившиеся документы в ES уже не отправит. Документы,
+        которые затронуты только таблицами с частичным обновлением, обновляются частично.
+        """
+        indexes = self._known_indexes(indexes)
+        loads: Dict[str, Set[str]] = {index: set() for index in indexes}
+        updates: Dict[str, Dict[str, Set[str]]] = {index: {} for index in indexes}
+        for table, ids in changes.items():
+            if not ids:
+                continue
+            resolved = self.resolve_changes(table, sorted(ids), indexes)
+            table = ETLProducers(table).value
+            for index in indexes:
+                doc_ids = resolved.get(get_index_spec(index).table, ())
+                if self._updates_partially(index, table):
+                    updates[index].setdefault(table, set()).update(doc_ids)
+                else:
+                    loads[index].update(doc_ids)
+
+        jobs = {
+            index: (
+                sorted(loads[index]),
+                {table: sorted(ids - loads[index]) for table, ids in updates[index].items() if ids - loads[index]},
+            )
+            for index in indexes
+        }
+        jobs = {index: job for index, job in jobs.items() if job[0] or job[1]}
+        if not jobs:
+            return
+
+        with ThreadPoolExecutor(max_workers=len(jobs)) as executor:
+            futures = [executor.submit(self._load_pages, index, *job) for index, job in jobs.items()]
+            for future in futures:
+                future.result()
+
+    def _load_pages(self, index: str, ids: List[str], updates: Dict[str, List[str]]) -> None:
+        page_size = ETLConfig.page_size
+        for start in range(0, len(ids), page_size):
+            self.load_documents(index, ids[start : start + page_size])
+        for table, table_ids in updates.items():
+            for start in range(0, len(table_ids), page_size):
+                self.update_documents(index, table, table_ids[start : start + page_size])
+        updated = sum(len(table_ids) for table_ids in updates.values())
+        logger.info(f"{len(ids)} changed documents synced to index {index}, {updated} updated partially")
+
+    def snapshot_cursors(self) -> Dict[str, KeysetCursor]:
+        """Текущие концы таблиц-источников индексов и надгробий."""
+        cursors = {table: self._extractor.get_tail(table) for table in source_tables()}
+        cursors[TOMBSTONES] = self._extractor.get_tombstone_tail()
+        return cursors
+
+    def applied_cursors(self, index: str) -> Dict[str, KeysetCursor]:
+        """Сохранённые курсоры демона по таблицам индекса и надгробиям: всё до них уже загружено через алиас."""
+        member = ETLIndexes(index)
+        tables = [*get_index_spec(index).depends_on, TOMBSTONES]
+        return {table: self.get_cursor(member, table) for table in tables}
+
+    def catch_up(self, index: str, target: str, cursors: Dict[str, KeysetCursor]) -> None:
+        """Догрузить в target всё, что изменилось или удалено после снимка cursors, не трогая курсоры демона."""
+        for table in get_index_spec(index).depends_on:
+            self.sync_table(table, {index: cursors[table]}, targets={index: target}, persist=False)
+        # Снимок пересборки, начатой до появления надгробий, их курсора не содержит.
+        if TOMBSTONES in cursors:
+            self.sync_tombstones({index: cursors[TOMBSTONES]}, targets={index: target}, persist=False)
+
+    def reindex_shard(self, index: str, shard: int, shards: int, target: Optional[str] = None) -> ShardProgress:
+        """Полная переиндексация одного шарда таблицы индекса в индекс target (по умолчанию index).
+
+        Прогресс сохраняется после каждой страницы, поэтому упавший шард
+        можно перезапустить отдельно, и он продолжит с последней страницы.
+        """
+        table = get_index_spec(index).table
+        key = f"reindex_in_{target or index}_{shard}_of_{shards}"
+        page_size = ETLConfig.page_size
+
+        saved = self._state.get_state(key=key)
+        progress = ShardProgress.model_validate_json(saved) if saved else ShardProgress.start(shard, shards)
+        while not progress.done:
+            page = self._extractor.get_id_range_page(progress.last_id, progress.upper, page_size, table)
+            if page:
+                self.load_documents(index, page, target, skip_unchanged=False)
+                progress.last_id = UUID(page[-1])
+                progress.films += len(page)
+            progress.done = len(page) < page_size
+            self._state.set_state(key, progress.model_dump_json())
+            logger.info(f"Shard {shard}/{shards} of index {index}: {progress.films} documents")
+        return progress
+
+    def run(self, indexes: ETLIndexes) -> SyncReport:
+        """Синхронизировать indexes: по одному общему проходу на таблицу-источник."""
+        report = SyncReport()
+        cursors = {index: self.prepare_cursors(index) for index in self._known_indexes(indexes)}
+        tombstone_cursors = self.prepare_tombstone_cursors(list(cursors))
+        for table in source_tables():
+            table_cursors = {index: tables[table] for index, tables in cursors.items() if table in tables}
+            if table_cursors:
+                self.sync_table(table, table_cursors, report=report)
+        if tombstone_cursors:
+            self.sync_tombstones(tombstone_cursors, report=report)
+            self.purge_tombstones()
+        return report
+
+    def prepare_cursors(self, index: str) -> Dict[str, KeysetCursor]:
+        """Курсоры индекса по таблицам-источникам, от которых он зависит, своя таблица первой."""
+        spec = get_index_spec(index)
+        own_cursor = self.get_cursor(index, spec.table)
+        related = [table for table in spec.depends_on if table != spec.table]
+        saved = self._state.get_states(self._cursor_key(index, table) for table in related)
+
+        cursors = {spec.table: own_cursor}
+        initial = {}
+        for table in related:
+            key = self._cursor_key(index, table)
+            if key in saved:
+                cursors[table] = KeysetCursor.model_validate_json(saved[key])
+            else:
+                cursors[table] = initial[key] = self._initial_related_cursor(table, own_cursor)
+        self._state.set_states({key: cursor.model_dump_json() for key, cursor in initial.items()})
+        return cursors
+
+    def prepare_tombstone_cursors(self, indexes: List[str]) -> Dict[str, KeysetCursor]:
+        """Курсоры индексов по надгробиям.
+
+        Пустой индекс начинает с конца надгробий: удалённых строк в нём и так
+        нет. Уже загруженный индекс без курсора начинает с начала, чтобы
+        применить всё, что удалили после появления надгробий.
+        """
+        saved = self._state.get_states(self._cursor_key(index, TOMBSTONES) for index in indexes)
+        cursors = {}
+        initial = {}
+        for index in indexes:
+            key = self._cursor_key(index, TOMBSTONES)
+            if key in saved:
+                cursors[index] = KeysetCursor.model_validate_json(saved[key])
+            elif self.get_cursor(index, get_index_spec(index).table) == KeysetCursor():
+                cursors[index] = initial[key] = self._extractor.get_tombstone_tail()
+            else:
+                cursors[index] = initial[key] = KeysetCursor()
+        self._state.set_states({key: cursor.model_dump_json() for key, cursor in initial.items()})
+        return cursors
+
+    def _initial_related_cursor(self, table: str, own_cursor: KeysetCursor) -> KeysetCursor:
+        # На пустом индексе полный проход по своей таблице и так подтянет
+        # актуальные связанные данные, поэтому остальные курсоры начинаем с конца таблиц.
+        if own_cursor == KeysetCursor():
+            return self._extractor.get_tail(table)
+        return KeysetCursor(updated_at=own_cursor.updated_at)
+
+    def _passthrough_for(self, index: str) -> bool:
+        return self._passthrough and get_index_spec(index).passthrough
+
+    def _updates_partially(self, index: str, table: str) -> bool:
+        return self._partial_updates and table in get_index_spec(index).partial
+
+    @staticmethod
+    def _known_indexes(indexes: ETLIndexes) -> List[str]:
+        known = []
+        for index in indexes:
             try:
-                itersize = ETLConfig.batch_size
-                query = get_query_by_index(index=index, load_from=load_from)
-                extracted_data = self.extract_data(
-                    index=index,
-                    query=query,
-                    itersize=itersize,
-                )
-            except ValueError:
+                get_index_spec(index)
+            except ValueError as e:
+                logger.error(e)
                 continue
-            transformed_data = self.transform_data(index=index, data=extracted_data)
-            self.load_data_to_es(index=index, data=transformed_data, itersize=itersize)
+            known.append(index)
+        return known
+
+    @staticmethod
+    def _cursor_order(cursor: KeysetCursor) -> Tuple[datetime, str]:
+        return cursor.updated_at, str(cursor.id)
+
+    @staticmethod
+    def _cursor_key(index: str, table: str) -> str:
+        if table == ETLProducers.film_work:
+            return f"cursor_in_{index}"
+        if table == TOMBSTONES:
+            return f"cursor_in_{index}_{TOMBSTONES}"
+        return f"cursor_in_{index}_{ETLProducers(table).value}"
@@ -1,13 +1,28 @@
 # Standard Library
+import asyncio
 import logging
 import time
 
 # Third Party
-from elasticsearch import Elasticsearch
+import psycopg
+import psycopg2
+from async_etl import AsyncETL
+from elasticsearch import (
+    ApiError,
+    AsyncElasticsearch,
+    TransportError,
+    helpers,
+)
+from prometheus_client import start_http_server
+from pg_cdc import PGChangeStream
+from pg_listener import PGChangeListener
+from postgres_extractor import PGExtractor
+from scheduler import AdaptiveScheduler
+from tenacity import RetryError
 
 # First Party
+from config.es_transport import make_es_client
 from config.etl_config import (
-    ESConfig,
     ESConfigSettings,
     ETLConfig,
     ETLIndexes,
@@ -19,28 +34,178 @@ from etl import ETL
 
 indexes = ETLIndexes
 frequency = ETLConfig.frequency
+logger = logging.getLogger(__name__)
 
-if __name__ == "__main__":
-    logger = logging.getLogger(__name__)
+# Ошибки цикла, после которых демон продолжает работу: курсоры уже стоят
+# на последней подтверждённой пачке, и повтор догрузит остальное.
+SYNC_ERRORS = (
+    ValueError,
+    helpers.BulkIndexError,
+    # ES ответил ошибкой или недоступен и после повторов загрузчика.
+    ApiError,
+    TransportError,
+    # Повторы @retry исчерпаны.
+    RetryError,
+    # Соединение с Postgres оборвалось, в том числе посреди чтения именованного курсора.
+    psycopg2.OperationalError,
+    psycopg2.InterfaceError,
+    psycopg.OperationalError,
+    psycopg.InterfaceError,
+)
 
+
+def run_sync_engine() -> None:
     etl = ETL(
         postgres_settings=PostgresConnectParameters,
         state=RedisState(),
-        es_conn=Elasticsearch(
-            [f"{ESConfig.http_schema}://{ESConfig.host}:{ESConfig.port}"],
-        ),
+        es_conn=make_es_client(),
         es_config=ESConfigSettings,
     )
+    scheduler = AdaptiveScheduler(ETLConfig)
 
     while True:
         logger.info("Starting sync...")
         try:
-            etl.run(indexes=indexes)
+            report = etl.run(indexes=indexes)
 
-        except ValueError as e:
-            logger.error(e)
-            Elasticsearch.transport.close()
+        except SYNC_ERRORS as e:
+            logger.exception(f"Sync failed: {e!r}")
+            time.sleep(scheduler.backoff())
             continue
 
-        logger.info(f"Sleep for {frequency} seconds")
-        time.sleep(frequency)
+        time.sleep(scheduler.next_interval(report))
+
+
+async def run_async_engine() -> None:
+    etl = AsyncETL(
+        postgres_settings=PostgresConnectParameters,
+        state=RedisState(),
+        es_conn=make_es_client(AsyncElasticsearch),
+        es_config=ESConfigSettings,
+    )
+    scheduler = AdaptiveScheduler(ETLConfig)
+
+    try:
+        while True:
+            logger.info("Starting async sync...")
+            try:
+                report = await etl.arun(indexes=indexes)
+
+            except SYNC_ERRORS as e:
+                logger.exception(f"Async sync failed: {e!r}")
+                await asyncio.sleep(scheduler.backoff())
+                continue
+
+            await asyncio.sleep(scheduler.next_interval(report))
+    finally:
+        await etl.close()
+
+
+def run_listen_engine() -> None:
+    """Индексировать изменения по NOTIFY от триггеров Postgres.
+
+    Полный проход по курсорам остаётся страховкой и выполняется раз в
+    SWEEP_INTERVAL секунд, а также после обрыва соединения слушателя
+    и после упавшей загрузки: он догрузит и изменения из её уведомлений.
+    """
+    etl = ETL(
+        postgres_settings=PostgresConnectParameters,
+        state=RedisState(),
+        es_conn=make_es_client(),
+        es_config=ESConfigSettings,
+    )
+    listener = PGChangeListener(PostgresConnectParameters)
+    listener.connect()
+    scheduler = AdaptiveScheduler(ETLConfig)
+    next_sweep = time.monotonic()
+
+    while True:
+        try:
+            if time.monotonic() >= next_sweep:
+                logger.info("Starting safety-net sweep...")
+                etl.run(indexes=indexes)
+                next_sweep = time.monotonic() + ETLConfig.sweep_interval
+
+            changes = listener.collect(
+                timeout=next_sweep - time.monotonic(),
+                debounce=ETLConfig.notify_debounce,
+                max_delay=ETLConfig.notify_max_delay,
+                max_batch=ETLConfig.notify_max_batch,
+            )
+            if changes is None:
+                next_sweep = time.monotonic()
+            elif changes:
+                etl.sync_changes(indexes=indexes, changes=changes)
+                etl.sync_deletions(indexes=indexes)
+        except SYNC_ERRORS as e:
+            logger.exception(f"Sync failed: {e!r}")
+            time.sleep(scheduler.backoff())
+            next_sweep = time.monotonic()
+
+
+def run_cdc_engine() -> None:
+    """Индексировать изменения из слота логической репликации.
+
+    Полного прохода по курсорам нет: он выполняется один раз, только когда
+    слот создаётся заново. Микропачки используют те же настройки NOTIFY_*,
+    что и режим listen. LSN подтверждается после загрузки пачки в ES;
+    если загрузка упала, чтение слота начинается заново с подтверждённого LSN.
+    """
+    etl = ETL(
+        postgres_settings=PostgresConnectParameters,
+        state=RedisState(),
+        es_conn=make_es_client(),
+        es_config=ESConfigSettings,
+    )
+    stream = PGChangeStream(PostgresConnectParameters, ETLConfig.cdc_slot_name)
+    scheduler = AdaptiveScheduler(ETLConfig)
+    # Полный проход нужен после создания слота и остаётся нужным, пока не пройдёт успешно.
+    resync = stream.connect()
+
+    while True:
+        try:
+            if resync:
+                etl.run(indexes=indexes)
+                resync = False
+            batch = stream.read_batch(
+                timeout=frequency,
+                debounce=ETLConfig.notify_debounce,
+                max_delay=ETLConfig.notify_max_delay,
+                max_batch=ETLConfig.notify_max_batch,
+            )
+            if batch is None:
+                stream.ack_idle()
+                continue
+            etl.sync_changes(indexes=indexes, changes=batch.changes)
+            etl.sync_deletions(indexes=indexes)
+            stream.ack(batch.lsn)
+        except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+            logger.warning(f"Lost replication connection: {e!r}")
+            resync = stream.connect() or resync
+        except SYNC_ERRORS as e:
+            logger.exception(f"Sync failed: {e!r}")
+            time.sleep(scheduler.backoff())
+            resync = stream.connect() or resync
+
+
+def track_document_table() -> None:
+    """Включить отслеживание content.film_work_document, только если ETL читает документы из неё."""
+    extractor = PGExtractor(PostgresConnectParameters)
+    try:
+        extractor.track_document_table(ETLConfig.document_table)
+    finally:
+        extractor.close()
+
+
+if __name__ == "__main__":
+    if ETLConfig.metrics_port:
+        start_http_server(ETLConfig.metrics_port)
+    track_document_table()
+    if ETLConfig.engine == "async":
+        asyncio.run(run_async_engine())
+    elif ETLConfig.engine == "listen":
+        run_listen_engine()
+    elif ETLConfig.engine == "cdc":
+        run_cdc_engine()
+    else:
+        run_sync_engine()
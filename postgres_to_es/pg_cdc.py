@@ -0,0 +1,269 @@
+# Standard Library
+import logging
+import select
+import struct
+import time
+from typing import (
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+)
+
+# Third Party
+import psycopg2
+from psycopg2.extras import (
+    LogicalReplicationConnection,
+    ReplicationCursor,
+)
+from tenacity import retry
+
+# First Party
+from config.etl_config import (
+    RETRY_CONFIG,
+    ETLProducers,
+    PostgresConnectParameters,
+)
+from config.index_registry import source_tables
+
+
+logger = logging.getLogger(__name__)
+
+# Таблица схемы content -> (таблица-источник ETL, колонка с её id).
+CONTENT_TABLES = {
+    "film_work": (ETLProducers.film_work.value, "id"),
+    "person": (ETLProducers.person.value, "id"),
+    "genre": (ETLProducers.genre.value, "id"),
+    "person_film_work": (ETLProducers.film_work.value, "film_work_id"),
+    "genre_film_work": (ETLProducers.film_work.value, "film_work_id"),
+    "film_work_document": (ETLProducers.film_work_document.value, "id"),
+}
+CONTENT_SCHEMA = "content"
+
+
+class ChangeBatch(NamedTuple):
+    """Изменения завершённых транзакций и LSN последнего их COMMIT."""
+
+    changes: Dict[str, Set[str]]
+    lsn: int
+
+
+class Relation(NamedTuple):
+    schema: str
+    table: str
+    columns: List[str]
+
+
+class PGChangeStream:
+    """Источник изменений из слота логической репликации (плагин pgoutput).
+
+    Читает публикацию content_changes; строки изменений схемы content
+    переводятся в id таблиц-источников ETL.
+    Пачка всегда заканчивается на границе транзакции, и её LSN
+    подтверждается серверу (ack) только после загрузки в ES, поэтому после
+    падения слот отдаст неподтверждённые изменения заново.
+    """
+
+    output_plugin = "pgoutput"
+    publication = "content_changes"
+
+    def __init__(self, dsn: PostgresConnectParameters, slot_name: str) -> None:
+        self._dsn = dsn
+        self._slot_name = slot_name
+        self._conn: Optional[LogicalReplicationConnection] = None
+        self._cursor: Optional[ReplicationCursor] = None
+        self._relations: Dict[int, Relation] = {}
+        self._transaction: Dict[str, Set[str]] = {}
+        self._in_transaction = False
+        self._acked = 0
+        self._tables = source_tables()
+
+    @staticmethod
+    def _count(changes: Dict[str, Set[str]]) -> int:
+        return sum(map(len, changes.values()))
+
+    @staticmethod
+    def _read_tuples(payload: bytes, offset: int) -> Iterator[List[Optional[str]]]:
+        """Кортежи сообщения I/U/D: старый (K/O), если есть, и новый (N)."""
+        while offset < len(payload):
+            offset += 1
+            (columns_count,) = struct.unpack_from(">h", payload, offset)
+            offset += 2
+            values: List[Optional[str]] = []
+            for _ in range(columns_count):
+                kind = payload[offset : offset + 1]
+                offset += 1
+                if kind == b"t":
+                    (length,) = struct.unpack_from(">i", payload, offset)
+                    values.append(payload[offset + 4 : offset + 4 + length].decode())
+                    offset += 4 + length
+                else:
+                    values.append(None)
+            yield values
+
+    @staticmethod
+    def _read_string(payload: bytes, offset: int) -> Tuple[str, int]:
+        end = payload.index(b"\0", offset)
+        return payload[offset:end].decode(), end + 1
+
+    @retry(**RETRY_CONFIG)
+    def connect(self) -> bool:
+        """Начать чтение слота, создав его при необходимости.
+
+        Возвращает True, если слот только что создан: изменений до этого
+        момента в нём нет, и их надо догрузить обычным проходом по курсорам.
+        """
+        self.close()
+        self._conn = psycopg2.connect(
+            connection_factory=LogicalReplicationConnection,
+            **self._dsn().model_dump(),
+        )
+        self._cursor = self._conn.cursor()
+        created = False
+        try:
+            self._cursor.create_replication_slot(self._slot_name, output_plugin=self.output_plugin)
+            created = True
+            logger.info(f"Created replication slot {self._slot_name}")
+        except psycopg2.errors.DuplicateObject:
+            pass
+        self._cursor.start_replication(
+            slot_name=self._slot_name,
+            decode=False,
+            options={"proto_version": "1", "publication_names": self.publication},
+        )
+        self._relations = {}
+        self._transaction = {}
+        self._in_transaction = False
+        self._acked = 0
+        logger.info(f"Streaming changes from replication slot {self._slot_name}")
+        return created
+
+    def close(self) -> None:
+        if self._conn is not None and not self._conn.closed:
+            self._conn.close()
+        self._conn = None
+        self._cursor = None
+
+    def read_batch(
+        self,
+        timeout: float,
+        debounce: float,
+        max_delay: float,
+        max_batch: int,
+    ) -> Optional[ChangeBatch]:
+        """Собрать изменения завершённых транзакций в микропачку.
+
+        Пачка отдаётся, когда поток затих на debounce секунд, накопилось
+        max_batch id или с первого изменения прошло max_delay секунд.
+        Если за timeout секунд не завершилось ни одной транзакции, возвращает None.
+        """
+        changes: Dict[str, Set[str]] = {}
+        lsn = 0
+        deadline = time.monotonic() + timeout
+        while True:
+            commit_lsn = self._read_available(changes, max_batch)
+            if commit_lsn and not lsn:
+                deadline = time.monotonic() + max_delay
+            lsn = commit_lsn or lsn
+            if lsn and self._count(changes) >= max_batch:
+                break
+            if not self._wait(deadline, debounce if lsn else None):
+                break
+
+        if not lsn:
+            return None
+        summary = ", ".join(f"{len(ids)} of {table}" for table, ids in changes.items())
+        logger.info(f"Read changes up to LSN {lsn}: {summary}")
+        return ChangeBatch(changes=changes, lsn=lsn)
+
+    def ack(self, lsn: int) -> None:
+        """Подтвердить, что всё до lsn загружено: сервер может освободить WAL."""
+        self._cursor.send_feedback(write_lsn=lsn, flush_lsn=lsn, force=True)
+        self._acked = lsn
+
+    def ack_idle(self) -> None:
+        """Подтвердить последний полученный LSN, когда пачка пуста.
+
+        Без этого keepalive и изменения таблиц вне публикации не сдвигают слот,
+        и сервер копит WAL. Внутри незавершённой транзакции подтверждать нельзя:
+        её изменения ещё не загружены.
+        """
+        lsn = self._cursor.wal_end
+        if not self._in_transaction and lsn > self._acked:
+            self.ack(lsn)
+
+    def _read_available(self, changes: Dict[str, Set[str]], max_batch: int) -> int:
+        """Прочитать уже пришедшие сообщения; вернуть LSN последнего COMMIT или 0.
+
+        Чтение останавливается на COMMIT, после которого в пачке max_batch id.
+        """
+        lsn = 0
+        while (message := self._cursor.read_message()) is not None:
+            lsn = self._consume(message.payload, changes) or lsn
+            if lsn and self._count(changes) >= max_batch:
+                break
+        return lsn
+
+    def _wait(self, deadline: float, debounce: Optional[float]) -> bool:
+        """Ждать новых сообщений до deadline, а с debounce - не дольше паузы потока.
+
+        Возвращает False, если ждать дальше не нужно и пачку пора отдавать.
+        """
+        left = deadline - time.monotonic()
+        if left <= 0:
+            return False
+        ready, _, _ = select.select([self._cursor], [], [], left if debounce is None else min(debounce, left))
+        return bool(ready) or debounce is None
+
+    def _consume(self, payload: bytes, changes: Dict[str, Set[str]]) -> int:
+        """Разобрать сообщение pgoutput; для COMMIT вернуть LSN конца транзакции."""
+        kind = payload[:1]
+        if kind == b"B":
+            self._transaction = {}
+            self._in_transaction = True
+        elif kind == b"C":
+            for table, ids in self._transaction.items():
+                changes.setdefault(table, set()).update(ids)
+            self._transaction = {}
+            self._in_transaction = False
+            _, _, end_lsn = struct.unpack_from(">bQQ", payload, 1)
+            return end_lsn
+        elif kind == b"R":
+            self._read_relation(payload)
+        elif kind in (b"I", b"U", b"D"):
+            self._read_change(payload)
+        return 0
+
+    def _read_relation(self, payload: bytes) -> None:
+        (relation_id,) = struct.unpack_from(">I", payload, 1)
+        schema, offset = self._read_string(payload, 5)
+        table, offset = self._read_string(payload, offset)
+        (columns_count,) = struct.unpack_from(">h", payload, offset + 1)
+        offset += 3
+        columns = []
+        for _ in range(columns_count):
+            name, offset = self._read_string(payload, offset + 1)
+            columns.append(name)
+            offset += 8
+        self._relations[relation_id] = Relation(schema, table, columns)
+
+    def _read_change(self, payload: bytes) -> None:
+        (relation_id,) = struct.unpack_from(">I", payload, 1)
+        relation = self._relations[relation_id]
+        if relation.schema != CONTENT_SCHEMA or relation.table not in CONTENT_TABLES:
+            return
+        table, column = CONTENT_TABLES[relation.table]
+        if table not in self._tables:
+            return
+        position = relation.columns.index(column)
+
+        ids = set()
+        for values in self._read_tuples(payload, 5):
+            if position < len(values) and values[position] is not None:
+                ids.add(values[position])
+        if not ids:
+            logger.warning(f"No {column} in change of content.{relation.table}, check its REPLICA IDENTITY")
+        self._transaction.setdefault(table, set()).update(ids)
@@ -0,0 +1,120 @@
+# Standard Library
+import json
+import logging
+import select
+import time
+from typing import (
+    Dict,
+    Optional,
+    Set,
+)
+
+# Third Party
+import psycopg2
+from psycopg2.extensions import (
+    ISOLATION_LEVEL_AUTOCOMMIT,
+    connection,
+)
+from tenacity import retry
+
+# First Party
+from config.etl_config import (
+    RETRY_CONFIG,
+    ETLProducers,
+    PostgresConnectParameters,
+)
+
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_CHANNEL = "content_changes"
+
+
+class PGChangeListener:
+    """Слушает NOTIFY от триггеров content.notify_content_change.
+
+    Каждое уведомление - JSON вида {"table": ..., "id": ...}, где table -
+    таблица-источник ETL (изменения таблиц связей приходят как film_work).
+    Уведомления собираются в микропачки: пачка отдаётся, когда изменения
+    затихли на debounce секунд, накопилось max_batch id или с первого
+    уведомления прошло max_delay секунд.
+    """
+
+    def __init__(self, dsn: PostgresConnectParameters) -> None:
+        self._dsn = dsn
+        self._conn: Optional[connection] = None
+
+    @retry(**RETRY_CONFIG)
+    def connect(self) -> None:
+        """Подписаться на канал; уведомления копятся с этого момента."""
+        self.close()
+        self._conn = psycopg2.connect(**self._dsn().model_dump())
+        self._conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        with self._conn.cursor() as cur:
+            cur.execute(f"LISTEN {NOTIFY_CHANNEL}")
+        logger.info(f"Listening to {NOTIFY_CHANNEL}")
+
+    def close(self) -> None:
+        if self._conn is not None and not self._conn.closed:
+            self._conn.close()
+        self._conn = None
+
+    def collect(
+        self,
+        timeout: float,
+        debounce: float,
+        max_delay: float,
+        max_batch: int,
+    ) -> Optional[Dict[str, Set[str]]]:
+        """Дождаться микропачки изменений: id по таблицам-источникам.
+
+        Если за timeout секунд изменений не было, возвращает пустой словарь.
+        Если соединение оборвалось, переподключается и возвращает None:
+        уведомления за время обрыва потеряны, и нужен полный проход.
+        """
+        changes: Dict[str, Set[str]] = {}
+        received = 0
+        try:
+            if not self._wait(timeout):
+                return changes
+            deadline = time.monotonic() + max_delay
+            while True:
+                received += self._drain(changes)
+                left = deadline - time.monotonic()
+                if sum(map(len, changes.values())) >= max_batch or left <= 0:
+                    break
+                if not self._wait(min(debounce, left)):
+                    break
+        except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+            logger.warning(f"Lost {NOTIFY_CHANNEL} listener connection: {e!r}")
+            self.connect()
+            return None
+
+        summary = ", ".join(f"{len(ids)} of {table}" for table, ids in changes.items())
+        logger.info(f"Collected {received} change notifications: {summary}")
+        return changes
+
+    def _wait(self, timeout: float) -> bool:
+        if self._conn is None:
+            self.connect()
+        deadline = time.monotonic() + timeout
+        while not self._conn.notifies:
+            left = deadline - time.monotonic()
+            if left <= 0:
+                return False
+            ready, _, _ = select.select([self._conn], [], [], left)
+            if ready:
+                self._conn.poll()
+        return True
+
+    def _drain(self, changes: Dict[str, Set[str]]) -> int:
+        self._conn.poll()
+        received = len(self._conn.notifies)
+        for notify in self._conn.notifies:
+            try:
+                payload = json.loads(notify.payload)
+                changes.setdefault(ETLProducers(payload["table"]).value, set()).add(payload["id"])
+            except (ValueError, KeyError) as e:
+                logger.warning(f"Skipping malformed notification {notify.payload!r}: {e!r}")
+        self._conn.notifies.clear()
+        return received
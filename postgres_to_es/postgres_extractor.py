@@ -1,26 +1,56 @@
 # Standard Library
 import logging
-from contextlib import closing
+import random
+from datetime import datetime
 from typing import (
     Iterator,
+    List,
     Tuple,
     Type,
+    Union,
 )
+from uuid import UUID
 
 # Third Party
-import psycopg2
-from psycopg2.extras import DictCursor
+from postgres_pool import PGConnectionPool
+from psycopg2.extras import DictRow
 from tenacity import retry
 
 # First Party
 from config.etl_config import (
     RETRY_CONFIG,
+    ETLConfig,
     ETLIndexes,
+    ETLProducers,
+    PGPoolConfig,
     PostgresConnectParameters,
 )
 from config.etl_models import (
     BaseETLModel,
-    MovieETLSchema,
+    KeysetCursor,
+    RawDocument,
+    Tombstone,
+)
+from config.index_registry import get_index_spec
+from config.metrics import (
+    PG_QUERY_SECONDS,
+    STAGE_ROWS,
+    label,
+    timed,
+)
+from config.sql_queries import (
+    existing_ids_sql_script,
+    film_work_ids_sql_script,
+    get_partial_query,
+    id_range_page_sql_script,
+    keyset_page_sql_script,
+    keyset_tail_sql_script,
+    related_ids_sql_script,
+    tombstone_page_sql_script,
+    tombstone_purge_sql_script,
+    tombstone_seal_sql_script,
+    tombstone_tail_sql_script,
+    track_document_table_sql_script,
 )
 
 
@@ -30,38 +60,191 @@ logger = logging.getLogger(__name__)
 class PGExtractor:
     def __init__(self, dsn: PostgresConnectParameters) -> None:
         self._dsn = dsn
+        # Индексы загружаются параллельно, каждый своим потоком со своим соединением.
+        self._pool = PGConnectionPool(dsn, PGPoolConfig, concurrency=len(ETLIndexes))
+
+    @retry(**RETRY_CONFIG)
+    def get_page(
+        self,
+        table: str,
+        cursor: KeysetCursor,
+        page_size: int,
+    ) -> List[KeysetCursor]:
+        """Ключи следующей страницы изменённых строк table после cursor."""
+        rows = self._pool.fetch_prepared(
+            keyset_page_sql_script(table),
+            (cursor.updated_at, str(cursor.id), page_size),
+        )
+        return [KeysetCursor(**row) for row in rows]
+
+    @retry(**RETRY_CONFIG)
+    def get_tail(self, table: str) -> KeysetCursor:
+        """Курсор, указывающий на самую свежую строку table."""
+        rows = self._pool.fetch_prepared(keyset_tail_sql_script(table))
+        return KeysetCursor(**rows[0]) if rows else KeysetCursor()
+
+    @retry(**RETRY_CONFIG)
+    def seal_tombstones(self) -> int:
+        """Поставить в очередь чтения надгробия, зафиксированные с прошлого раза, вернуть их число."""
+        return self._pool.execute(tombstone_seal_sql_script())
+
+    @retry(**RETRY_CONFIG)
+    def get_tombstones(self, cursor: KeysetCursor, page_size: int) -> List[Tombstone]:
+        """Следующая страница надгробий удалённых строк после cursor."""
+        rows = self._pool.fetch_prepared(
+            tombstone_page_sql_script(),
+            (cursor.updated_at, str(cursor.id), page_size),
+        )
+        return [Tombstone(**row) for row in rows]
+
+    @retry(**RETRY_CONFIG)
+    def get_tombstone_tail(self) -> KeysetCursor:
+        rows = self._pool.fetch_prepared(tombstone_tail_sql_script())
+        return KeysetCursor(**rows[0]) if rows else KeysetCursor()
+
+    @retry(**RETRY_CONFIG)
+    def purge_tombstones(self, applied: KeysetCursor, before: datetime) -> int:
+        """Удалить надгробия до курсора applied включительно и старше before, вернуть сколько удалено."""
+        return self._pool.execute(
+            tombstone_purge_sql_script(),
+            {"sealed_at": applied.updated_at, "id": str(applied.id), "before": before},
+        )
+
+    @retry(**RETRY_CONFIG)
+    def track_document_table(self, enabled: bool) -> None:
+        """Сообщать ли об изменениях content.film_work_document через NOTIFY, надгробия и публикацию."""
+        self._pool.execute(track_document_table_sql_script(), {"enabled": enabled})
+
+    @retry(**RETRY_CONFIG)
+    def get_existing_ids(self, table: str, ids: List[str]) -> List[str]:
+        rows = self._pool.fetch_prepared(existing_ids_sql_script(table), (ids,))
+        return [str(row["id"]) for row in rows]
+
+    @retry(**RETRY_CONFIG)
+    def get_film_work_ids(self, table: str, ids: List[str]) -> List[str]:
+        """Идентификаторы фильмов, связанных с изменёнными строками table."""
+        rows = self._pool.fetch_prepared(film_work_ids_sql_script(table), (ids,))
+        return [str(row["id"]) for row in rows]
+
+    @retry(**RETRY_CONFIG)
+    def get_related_ids(self, table: str, film_ids: List[str]) -> List[str]:
+        """Идентификаторы строк table (персон или жанров), связанных с фильмами film_ids."""
+        rows = self._pool.fetch_prepared(related_ids_sql_script(table), (film_ids,))
+        return [str(row["id"]) for row in rows]
+
+    @retry(**RETRY_CONFIG)
+    def get_id_range_page(
+        self,
+        last_id: UUID,
+        upper: UUID,
+        page_size: int,
+        table: str = ETLProducers.film_work,
+    ) -> List[str]:
+        """Идентификаторы следующей страницы строк table в диапазоне (last_id, upper]."""
+        rows = self._pool.fetch_prepared(
+            id_range_page_sql_script(table),
+            (str(last_id), str(upper), page_size),
+        )
+        return [str(row["id"]) for row in rows]
+
+    def close(self) -> None:
+        self._pool.close()
 
     def get_data(
         self,
         index: str,
         query: str,
+        ids: List[str],
         itersize: int,
-    ) -> Iterator[Tuple[dict, str]]:
-        if index == ETLIndexes.movies:
-            model = MovieETLSchema
-            return self._make_data_request(model, query, itersize)
+        passthrough: bool = False,
+    ) -> Iterator[Tuple[Union[dict, RawDocument], KeysetCursor]]:
+        model = self.get_model(index)
+        return self._make_data_request(index, model, query, ids, itersize, passthrough)
 
-        raise ValueError(f"There is no extraction rule for index {index}")
+    def get_partial_data(
+        self,
+        index: str,
+        table: str,
+        ids: List[str],
+        itersize: int,
+    ) -> Iterator[Tuple[dict, KeysetCursor]]:
+        """Частичные обновления документов index: только поля, которые зависят от table."""
+        model = get_index_spec(index).partial[table]
+        for document, cursor in self._make_data_request(
+            index,
+            model,
+            get_partial_query(index, table),
+            ids,
+            itersize,
+            passthrough=False,
+        ):
+            yield self.to_update(document), cursor
+
+    @staticmethod
+    def get_model(index: str) -> Type[BaseETLModel]:
+        return get_index_spec(index).model
 
-    @retry(**RETRY_CONFIG)
     def _make_data_request(
         self,
+        index: str,
         model: Type[BaseETLModel],
         query: str,
+        ids: List[str],
         itersize: int,
-    ) -> Iterator[Tuple[dict, str]]:
-        with closing(
-            psycopg2.connect(
-                **self._dsn().model_dump(),
-                cursor_factory=DictCursor,
-            )  # noqa
-        ) as conn:  # noqa
-            with conn.cursor() as cur:
+        passthrough: bool,
+    ) -> Iterator[Tuple[Union[dict, RawDocument], KeysetCursor]]:
+        """Потоковое извлечение данных через именованный (серверный) курсор.
+
+        Postgres отдаёт строки пачками по itersize, поэтому в памяти
+        одновременно находится не больше одной пачки, а загрузчик начинает
+        отправку в ES, пока запрос ещё выполняется. Вместе с документом
+        отдаётся его позиция (updated_at, id) для контрольных точек.
+        Ошибка посреди потока не повторяется здесь: генератор уже частично
+        прочитан. Оборванное соединение пул закрывает, ошибка завершает цикл
+        ETL, а демон (main.SYNC_ERRORS) повторяет его с последней контрольной точки.
+        """
+        name = f"{model.__name__.lower()}_extractor"
+        extracted = STAGE_ROWS.labels("extract", label(index))
+        with self._pool.connection() as conn:
+            with conn.cursor(name=name) as cur:
                 cur.itersize = itersize
-                cur.execute(query)
-                data = cur.fetchall()
+                cur.execute(query, {"ids": ids})
                 logger.info("About to extract data from Postgres")
-            for row in data:
-                instance = model(**row).model_dump()
-                instance["_id"] = instance["id"]
-                yield instance, str(row["modified"])
+                while True:
+                    with timed(PG_QUERY_SECONDS, name):
+                        rows = cur.fetchmany(itersize)
+                    if not rows:
+                        break
+                    extracted.inc(len(rows))
+                    for row in rows:
+                        yield (
+                            self.to_document(model, row, passthrough),
+                            KeysetCursor.model_construct(id=UUID(str(row["id"])), updated_at=row["modified"]),
+                        )
+
+    @staticmethod
+    def to_document(
+        model: Type[BaseETLModel],
+        row: DictRow,
+        passthrough: bool,
+    ) -> Union[dict, RawDocument]:
+        """Строка запроса в документ ES.
+
+        В режиме passthrough документ уже собран в Postgres и уходит в ES
+        как есть, а схема проверяется лишь на случайной выборке строк.
+        """
+        if passthrough:
+            if random.random() < ETLConfig.validation_sample_rate:
+                model.model_validate_json(row["document"])
+            return RawDocument(id=str(row["id"]), source=row["document"])
+
+        instance = model(**row).model_dump()
+        instance["_id"] = instance["id"]
+        return instance
+
+    @staticmethod
+    def to_update(document: dict) -> dict:
+        """Документ с частью полей в действие bulk update: ES заменит только их."""
+        doc_id = document.pop("_id")
+        document.pop("id")
+        return {"_op_type": "update", "_id": doc_id, "doc": document}
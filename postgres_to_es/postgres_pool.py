@@ -0,0 +1,179 @@
+# Standard Library
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import (
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+)
+
+# Third Party
+import psycopg2
+from psycopg2.errors import InvalidSqlStatementName
+from psycopg2.extensions import connection
+from psycopg2.extras import (
+    DictCursor,
+    DictRow,
+)
+from psycopg2.pool import ThreadedConnectionPool
+
+# First Party
+from config.etl_config import (
+    PostgresConnectParameters,
+    PostgresPoolSettings,
+)
+from config.metrics import (
+    PG_QUERY_SECONDS,
+    timed,
+)
+from config.sql_queries import PreparedStatement
+
+
+logger = logging.getLogger(__name__)
+
+
+class PooledConnection(connection):
+    """Соединение пула со своим состоянием: подготовленные запросы и время последнего возврата.
+
+    Состояние живёт и закрывается вместе с соединением, поэтому новое
+    соединение не унаследует его от закрытого.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.prepared: Set[str] = set()
+        self.last_used: Optional[float] = None
+
+
+class PGConnectionPool:
+    """Пул долгоживущих соединений с Postgres.
+
+    Соединение, простоявшее дольше health_check_interval, перед выдачей
+    проверяется запросом SELECT 1. Соединение, на котором случилась ошибка
+    связи, закрывается и не возвращается в пул, а повтор запроса
+    (tenacity) получит уже новое соединение.
+
+    Пул держит открытыми не меньше concurrency соединений (по одному на поток,
+    который ходит в Postgres одновременно с другими), а когда заняты все
+    max_size, поток ждёт освобождения соединения.
+    """
+
+    def __init__(
+        self,
+        dsn: PostgresConnectParameters,
+        config: PostgresPoolSettings,
+        concurrency: int = 1,
+    ) -> None:
+        self._dsn = dsn
+        self._config = config
+        # ThreadedConnectionPool закрывает возвращённое соединение, если свободных уже minconn.
+        self._min_size = max(config.min_size, concurrency)
+        self._max_size = max(config.max_size, self._min_size)
+        self._slots = threading.BoundedSemaphore(self._max_size)
+        self._lock = threading.Lock()
+        self._pool: Optional[ThreadedConnectionPool] = None
+
+    @property
+    def pool(self) -> ThreadedConnectionPool:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadedConnectionPool(
+                    minconn=self._min_size,
+                    maxconn=self._max_size,
+                    connection_factory=PooledConnection,
+                    cursor_factory=DictCursor,
+                    keepalives=1,
+                    **self._dsn().model_dump(),
+                )
+            return self._pool
+
+    @contextmanager
+    def connection(self) -> Iterator[PooledConnection]:
+        # getconn у полного пула бросает PoolError, поэтому очередь за соединением - на семафоре.
+        with self._slots:
+            conn = self._get_healthy_connection()
+            broken = False
+            try:
+                yield conn
+            except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                broken = True
+                raise
+            finally:
+                if not broken and not conn.closed:
+                    try:
+                        conn.rollback()
+                    except psycopg2.Error:
+                        broken = True
+                self._put(conn, close=broken or bool(conn.closed))
+
+    def fetch_all(self, query: str, params: Optional[dict] = None) -> List[DictRow]:
+        with self.connection() as conn:
+            with conn.cursor() as cur, timed(PG_QUERY_SECONDS, "query"):
+                cur.execute(query, params)
+                return cur.fetchall()
+
+    def execute(self, query: str, params: Optional[dict] = None) -> int:
+        """Выполнить изменяющий запрос и зафиксировать его, вернуть число затронутых строк."""
+        with self.connection() as conn:
+            with conn.cursor() as cur, timed(PG_QUERY_SECONDS, "execute"):
+                cur.execute(query, params)
+                rowcount = cur.rowcount
+            conn.commit()
+            return rowcount
+
+    def fetch_prepared(self, statement: PreparedStatement, params: Sequence = ()) -> List[DictRow]:
+        """Выполнить запрос как серверный prepared statement.
+
+        PREPARE выполняется один раз на соединение, дальше только EXECUTE.
+        """
+        with self.connection() as conn:
+            with conn.cursor() as cur:
+                if statement.name not in conn.prepared:
+                    cur.execute(statement.prepare)
+                    conn.prepared.add(statement.name)
+                with timed(PG_QUERY_SECONDS, statement.name):
+                    try:
+                        cur.execute(statement.execute, params)
+                    except InvalidSqlStatementName:
+                        # Сервер не знает запроса (например, после DISCARD ALL): подготовить его заново в следующий раз.
+                        conn.prepared.discard(statement.name)
+                        raise
+                    return cur.fetchall()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._pool is not None:
+                self._pool.closeall()
+                self._pool = None
+
+    def _get_healthy_connection(self) -> PooledConnection:
+        for _ in range(self._max_size + 1):
+            conn = self.pool.getconn()
+            if self._is_healthy(conn):
+                return conn
+            logger.warning("Dropping broken Postgres connection from pool")
+            self._put(conn, close=True)
+        raise psycopg2.OperationalError("No healthy Postgres connection available")
+
+    def _is_healthy(self, conn: PooledConnection) -> bool:
+        if conn.closed:
+            return False
+        last_used = conn.last_used
+        if last_used is None or time.monotonic() - last_used < self._config.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+        except psycopg2.Error:
+            return False
+        return True
+
+    def _put(self, conn: PooledConnection, close: bool) -> None:
+        if not close:
+            conn.last_used = time.monotonic()
+        self.pool.putconn(conn, close=close)
@@ -0,0 +1,194 @@
+# Standard Library
+import argparse
+import logging
+import os
+import sys
+from concurrent.futures import (
+    ProcessPoolExecutor,
+    as_completed,
+)
+from datetime import (
+    datetime,
+    timedelta,
+    timezone,
+)
+from typing import (
+    List,
+    Optional,
+)
+
+# Third Party
+from es_index_manager import ESIndexManager
+
+# First Party
+from config.es_transport import make_es_client
+from config.etl_config import (
+    ESConfigSettings,
+    ETLConfig,
+    ETLIndexes,
+    PostgresConnectParameters,
+)
+from config.etl_models import (
+    RebuildState,
+    RetiredVersion,
+    ShardProgress,
+)
+from config.states import RedisState
+from etl import ETL
+
+
+logger = logging.getLogger(__name__)
+
+
+def make_etl() -> ETL:
+    return ETL(
+        postgres_settings=PostgresConnectParameters,
+        state=RedisState(),
+        es_conn=make_es_client(),
+        es_config=ESConfigSettings,
+    )
+
+
+def reindex_shard(index: str, shard: int, shards: int, target: Optional[str]) -> ShardProgress:
+    """Точка входа процесса-воркера: своё соединение с Postgres, ES и Redis."""
+    return make_etl().reindex_shard(index, shard, shards, target)
+
+
+def reindex(
+    index: str,
+    shards: int,
+    selected: List[int],
+    restart: bool,
+    target: Optional[str] = None,
+) -> List[int]:
+    """Переиндексировать шарды selected параллельно, вернуть номера упавших."""
+    if restart:
+        RedisState().delete_state(*(f"reindex_in_{target or index}_{shard}_of_{shards}" for shard in selected))
+
+    failed = []
+    with ProcessPoolExecutor(max_workers=len(selected)) as executor:
+        futures = {executor.submit(reindex_shard, index, shard, shards, target): shard for shard in selected}
+        for future in as_completed(futures):
+            shard = futures[future]
+            try:
+                progress = future.result()
+            except Exception as e:  # noqa: B902
+                logger.error(f"Shard {shard}/{shards} of index {index} failed: {e!r}")
+                failed.append(shard)
+                continue
+            logger.info(f"Shard {shard}/{shards} of index {index} done: {progress.films} films")
+    return sorted(failed)
+
+
+def rebuild(index: str, shards: int, keep: int) -> List[int]:
+    """Пересобрать индекс в новую версию и атомарно переключить на неё алиас.
+
+    Незавершённая пересборка запоминается в хранилище состояния и при повторном запуске
+    продолжается в ту же версию. Изменения, сделанные во время загрузки,
+    догружаются из снимка курсоров до и после переключения алиаса. Для версии,
+    с которой снимается алиас, запоминаются курсоры демона, чтобы на неё можно было откатиться.
+    """
+    etl = make_etl()
+    state = RedisState()
+    manager = ESIndexManager(make_es_client(), index)
+    key = RebuildState.key(index)
+
+    saved = state.get_state(key=key)
+    if saved:
+        progress = RebuildState.model_validate_json(saved)
+        logger.info(f"Resuming rebuild of {index} into {progress.target}")
+    else:
+        cursors = etl.snapshot_cursors()
+        progress = RebuildState(target=manager.create_version(), cursors=cursors)
+        state.set_state(key, progress.model_dump_json())
+
+    failed = reindex(index, shards, list(range(shards)), restart=False, target=progress.target)
+    if failed:
+        return failed
+
+    manager.finalize(progress.target)
+    etl.catch_up(index, progress.target, progress.cursors)
+    current = manager.current()
+    if current and current != progress.target:
+        retired = RetiredVersion(retired_at=datetime.now(timezone.utc), cursors=etl.applied_cursors(index))
+        state.set_state(RetiredVersion.key(current), retired.model_dump_json())
+    manager.swap_alias(progress.target)
+    etl.catch_up(index, progress.target, progress.cursors)
+    etl.adopt_hashes(index, progress.target)
+    etl.adopt_dead_letters(index, progress.target)
+    state.delete_state(key)
+    stale = manager.collect_garbage(keep)
+    if stale:
+        state.delete_state(*(RetiredVersion.key(name) for name in stale))
+    return []
+
+
+def rollback(index: str) -> str:
+    """Вернуть алиас на предыдущую версию и догрузить в неё изменения, сделанные после снятия с неё алиаса.
+
+    Догрузка идёт от курсоров демона на момент переключения, до и после возврата
+    алиаса, как при пересборке. Затем хэши и недоставленные документы версии
+    заменяют хэши индекса: прежние описывают версию, с которой уходит алиас,
+    и с ними неизменившиеся относительно неё документы в предыдущую версию бы не попали.
+    Версию без снимка курсоров или снятую раньше TOMBSTONE_RETENTION_DAYS назад
+    откатить нельзя: часть удалений в неё уже не догрузить.
+    """
+    etl = make_etl()
+    state = RedisState()
+    manager = ESIndexManager(make_es_client(), index)
+    previous = manager.previous()
+
+    saved = state.get_state(key=RetiredVersion.key(previous))
+    if not saved:
+        raise ValueError(f"No cursor snapshot of {previous} to catch it up, rebuild {index} instead")
+    retired = RetiredVersion.model_validate_json(saved)
+    if retired.retired_at < datetime.now(timezone.utc) - timedelta(days=ETLConfig.tombstone_retention):
+        raise ValueError(f"Tombstones since {previous} was retired may be purged, rebuild {index} instead")
+
+    etl.catch_up(index, previous, retired.cursors)
+    manager.swap_alias(previous)
+    etl.catch_up(index, previous, retired.cursors)
+    etl.adopt_hashes(index, previous)
+    etl.adopt_dead_letters(index, previous)
+    return previous
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Full sharded reindex of an index from its source table")
+    parser.add_argument("--index", default=ETLIndexes.movies.value, choices=[index.value for index in ETLIndexes])
+    parser.add_argument("--shards", type=int, default=os.cpu_count() or 1, help="number of id-range shards")
+    parser.add_argument("--shard", type=int, action="append", help="run only these shards (repeatable)")
+    parser.add_argument("--restart", action="store_true", help="drop saved shard progress and start over")
+    parser.add_argument("--rebuild", action="store_true", help="load a new index version and swap the alias to it")
+    parser.add_argument("--rollback", action="store_true", help="point the alias back to the previous version")
+    parser.add_argument("--keep", type=int, default=2, help="index versions to keep after a rebuild")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    args = parse_args()
+    shards = args.shard or list(range(args.shards))
+    if any(shard < 0 or shard >= args.shards for shard in shards):
+        sys.exit(f"Shard numbers must be in range 0..{args.shards - 1}")
+
+    if args.keep < 1:
+        sys.exit("--keep must be at least 1")
+
+    if args.rollback:
+        try:
+            previous = rollback(args.index)
+        except ValueError as e:
+            sys.exit(str(e))
+        logger.info(f"Alias {args.index} rolled back to {previous}")
+        sys.exit()
+
+    if args.rebuild:
+        failed = rebuild(args.index, args.shards, args.keep)
+        if failed:
+            sys.exit(f"Failed shards {failed}, rerun with --rebuild to resume into the same version")
+    else:
+        failed = reindex(ETLIndexes(args.index), args.shards, shards, args.restart)
+    if failed:
+        retry_args = " ".join(f"--shard {shard}" for shard in failed)
+        sys.exit(f"Failed shards, retry with: python3 reindex.py --shards {args.shards} {retry_args}")
@@ -0,0 +1,71 @@
+# Standard Library
+import logging
+from typing import Optional
+
+# Third Party
+from etl import SyncReport
+
+# First Party
+from config.etl_config import ETLProcessConfig
+from config.metrics import (
+    SCHEDULE_INTERVAL,
+    SYNC_BACKLOG_ROWS,
+    SYNC_LAG_SECONDS,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptiveScheduler:
+    """Пауза между циклами синхронизации по отставанию прошлого цикла.
+
+    Пустой цикл удлиняет паузу в factor раз, цикл с изменениями укорачивает
+    её во столько же раз, а если самое старое найденное изменение ждало
+    дольше target_lag, следующий цикл начинается через min_interval.
+    После упавшего цикла пауза растёт так же, как после пустого.
+    Пауза не выходит за [min_interval, max_interval]. С выключенным
+    ADAPTIVE_SCHEDULE пауза всегда равна FREQUENCY.
+    """
+
+    factor = 2
+
+    def __init__(self, config: ETLProcessConfig) -> None:
+        self._config = config
+        self.interval = float(config.frequency)
+        self.decision = "fixed"
+        self.last_report: Optional[SyncReport] = None
+
+    def next_interval(self, report: SyncReport) -> float:
+        self.last_report = report
+        lag = report.lag.total_seconds()
+        if not self._config.adaptive_schedule:
+            self.interval, self.decision = float(self._config.frequency), "fixed"
+        elif report.rows == 0:
+            self.interval, self.decision = self.interval * self.factor, "idle"
+        elif lag >= self._config.target_lag:
+            self.interval, self.decision = self._config.min_interval, "behind"
+        else:
+            self.interval, self.decision = self.interval / self.factor, "busy"
+        self.interval = min(max(self.interval, self._config.min_interval), self._config.max_interval)
+        SCHEDULE_INTERVAL.set(self.interval)
+        SYNC_BACKLOG_ROWS.set(report.rows)
+        SYNC_LAG_SECONDS.set(lag)
+
+        logger.info(
+            f"Schedule: {self.decision}, {report.rows} changed rows, lag {lag:.1f}s, "
+            f"next sync in {self.interval:.1f} seconds",
+        )
+        return self.interval
+
+    def backoff(self) -> float:
+        """Пауза перед повтором упавшего цикла; повтор продолжит с последней контрольной точки."""
+        if self._config.adaptive_schedule:
+            self.interval = self.interval * self.factor
+        else:
+            self.interval = float(self._config.frequency)
+        self.decision = "failed"
+        self.interval = min(max(self.interval, self._config.min_interval), self._config.max_interval)
+        SCHEDULE_INTERVAL.set(self.interval)
+        logger.warning(f"Schedule: sync failed, retrying in {self.interval:.1f} seconds")
+        return self.interval
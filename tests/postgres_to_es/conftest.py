@@ -0,0 +1,53 @@
+# Standard Library
+import os
+import sys
+from pathlib import Path
+from typing import Iterator
+
+# Third Party
+import psycopg2
+import pytest
+
+
+# Модули postgres_to_es импортируют друг друга как модули верхнего уровня, как при запуске из его папки.
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "postgres_to_es"))
+
+# Обязательные настройки config.etl_config; заданные в окружении значения не перезаписываются.
+REQUIRED_SETTINGS = {
+    "POSTGRES_DB": "movies_database",
+    "POSTGRES_USER": "app",
+    "POSTGRES_PASSWORD": "",
+    "POSTGRES_HOST": "127.0.0.1",
+    "POSTGRES_PORT": "5432",
+    "ELASTICSEARCH_SCHEMA": "http",
+    "ELASTICSEARCH_HOST": "127.0.0.1",
+    "ELASTICSEARCH_PORT": "9200",
+    "REDIS_HOST": "127.0.0.1",
+    "REDIS_PORT": "6379",
+    "BATCH_SIZE": "100",
+    "FREQUENCY": "15",
+    "MAX_RETRIES": "1",
+    "MAX_WAIT": "1",
+    "JITTER": "0",
+}
+for name, value in REQUIRED_SETTINGS.items():
+    os.environ.setdefault(name, value)
+
+
+@pytest.fixture()
+def pg_conn() -> Iterator:
+    """Соединение с базой со схемой content; всё, что сделал тест, откатывается.
+
+    Без доступной базы тест пропускается.
+    """
+    from config.etl_config import PostgresConnectParameters
+
+    try:
+        conn = psycopg2.connect(connect_timeout=3, **PostgresConnectParameters().model_dump())
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"Postgres is not available: {e}")
+    try:
+        yield conn
+    finally:
+        conn.rollback()
+        conn.close()
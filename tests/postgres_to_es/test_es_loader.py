@@ -0,0 +1,278 @@
+# Standard Library
+import json
+import threading
+import time
+import uuid
+from datetime import (
+    datetime,
+    timezone,
+)
+from types import SimpleNamespace
+from typing import (
+    Dict,
+    List,
+    Optional,
+    Tuple,
+)
+
+# Third Party
+import es_loader
+import pytest
+import tenacity
+from elasticsearch import (
+    Elasticsearch,
+    helpers,
+)
+from es_loader import (
+    ACTION_OVERHEAD,
+    BulkChunkSizer,
+    ChunkResult,
+    ESLoader,
+)
+from prometheus_client import REGISTRY
+
+# First Party
+from config.etl_config import ESConfig
+from config.etl_models import (
+    KeysetCursor,
+    RawDocument,
+)
+from config.states import (
+    RedisState,
+    SQLiteStorage,
+)
+
+
+SOURCE = b'{"title":"Heat"}'
+
+
+class StubElasticsearch:
+    """Клиент ES только с bulk: статус документа берётся из statuses (201 по умолчанию).
+
+    Запрос, в котором есть документ из delays, отвечает с задержкой;
+    requests - id документов запросов в порядке ответов.
+    """
+
+    def __init__(self, statuses: Optional[Dict[str, int]] = None, delays: Optional[Dict[str, float]] = None) -> None:
+        self.transport = Elasticsearch("http://localhost:9200").transport
+        self.statuses = statuses or {}
+        self.delays = delays or {}
+        self.requests: List[List[str]] = []
+        self._lock = threading.Lock()
+
+    def options(self, **kwargs) -> "StubElasticsearch":
+        return self
+
+    def bulk(self, operations: List[bytes], **kwargs) -> SimpleNamespace:
+        lines = iter(operations)
+        items = []
+        for line in lines:
+            op_type, meta = next(iter(json.loads(line).items()))
+            if op_type != "delete":
+                next(lines)
+            status = self.statuses.get(meta["_id"], 201)
+            item = {"_id": meta["_id"], "status": status}
+            if status >= 300:
+                item["error"] = {"type": "rejected", "reason": f"status {status}"}
+            items.append({op_type: item})
+        ids = [next(iter(item.values()))["_id"] for item in items]
+        time.sleep(max(self.delays.get(doc_id, 0) for doc_id in ids))
+        with self._lock:
+            self.requests.append(ids)
+        errors = any(next(iter(item.values()))["status"] >= 300 for item in items)
+        return SimpleNamespace(body={"took": 1, "errors": errors, "items": items})
+
+
+def cursor(number: int) -> KeysetCursor:
+    return KeysetCursor(id=uuid.UUID(int=number), updated_at=datetime.now(timezone.utc))
+
+
+def documents(count: int, source: bytes = SOURCE) -> List[Tuple[RawDocument, KeysetCursor]]:
+    return [(RawDocument(id=f"doc-{number}", source=source), cursor(number)) for number in range(count)]
+
+
+def result(documents: int, seconds: float, throttled: bool = False) -> ChunkResult:
+    return ChunkResult(
+        indexed=documents,
+        errors=[],
+        retries=0,
+        checkpoint=KeysetCursor(),
+        ids=[],
+        dead_lettered=0,
+        documents=documents,
+        seconds=seconds,
+        throttled=throttled,
+    )
+
+
+@pytest.fixture(autouse=True)
+def es_config(monkeypatch):
+    """Лимиты пачек для тестов и повтор bulk без ожидания."""
+    settings = {
+        "bulk_adaptive": True,
+        "bulk_min_documents": 2,
+        "bulk_max_documents": 100,
+        "bulk_max_bytes": 5 * 1024 * 1024,
+        "bulk_target_latency": 1.0,
+        "bulk_workers": 1,
+        "bulk_chunks_in_flight": 1,
+    }
+    for name, value in settings.items():
+        monkeypatch.setattr(ESConfig, name, value)
+    monkeypatch.setitem(es_loader.RETRY_CONFIG, "wait", tenacity.wait_none())
+    monkeypatch.setitem(es_loader.RETRY_CONFIG, "stop", tenacity.stop_after_attempt(2))
+
+
+def make_loader(tmp_path, client: StubElasticsearch) -> ESLoader:
+    state = RedisState(storage=SQLiteStorage(str(tmp_path / "state.sqlite3")))
+    return ESLoader(ESConfig, state, client)
+
+
+def chunk_ids(chunks) -> List[List[str]]:
+    return [[document.id for document, _ in chunk] for chunk in chunks]
+
+
+def test_chunks_limited_by_documents(tmp_path):
+    loader = make_loader(tmp_path, StubElasticsearch())
+    chunks = list(loader._chunk_actions(iter(documents(7)), BulkChunkSizer("movies", 3)))
+    assert [len(chunk) for chunk in chunks] == [3, 3, 1]
+    assert chunk_ids(chunks)[0] == ["doc-0", "doc-1", "doc-2"]
+
+
+def test_chunks_limited_by_bytes(tmp_path, monkeypatch):
+    document_size = len(SOURCE) + len("doc-0") + ACTION_OVERHEAD
+    monkeypatch.setattr(ESConfig, "bulk_max_bytes", document_size * 2)
+    loader = make_loader(tmp_path, StubElasticsearch())
+    chunks = list(loader._chunk_actions(iter(documents(5)), BulkChunkSizer("movies", 100)))
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+
+
+def test_oversized_document_gets_own_chunk(tmp_path, monkeypatch):
+    monkeypatch.setattr(ESConfig, "bulk_max_bytes", 10)
+    loader = make_loader(tmp_path, StubElasticsearch())
+    chunks = list(loader._chunk_actions(iter(documents(2)), BulkChunkSizer("movies", 100)))
+    assert [len(chunk) for chunk in chunks] == [1, 1]
+
+
+def test_dict_actions_serialized_once(tmp_path):
+    loader = make_loader(tmp_path, StubElasticsearch())
+    actions = [
+        ({"_id": "a", "_source": {"title": "Heat"}}, cursor(1)),
+        ({"_op_type": "delete", "_id": "b"}, cursor(2)),
+    ]
+    [chunk] = loader._chunk_actions(iter(actions), BulkChunkSizer("movies", 100))
+    assert [document for document, _ in chunk] == [
+        RawDocument(id="a", source=b'{"title":"Heat"}', op_type="index"),
+        RawDocument(id="b", source=None, op_type="delete"),
+    ]
+
+
+def test_sizer_halves_on_429():
+    sizer = BulkChunkSizer("movies", 40)
+    sizer.observe(result(30, seconds=0.1, throttled=True))
+    assert sizer.documents == 15
+
+
+def test_sizer_shrinks_in_proportion_to_latency():
+    sizer = BulkChunkSizer("movies", 40)
+    sizer.observe(result(40, seconds=4.0))
+    assert sizer.documents == 10
+    # Пачка, собранная до снижения, не уменьшает лимит повторно.
+    sizer.observe(result(40, seconds=2.0))
+    assert sizer.documents == 10
+
+
+def test_sizer_grows_after_fast_full_chunk():
+    sizer = BulkChunkSizer("movies", 40)
+    sizer.observe(result(30, seconds=0.1))
+    assert sizer.documents == 40
+    sizer.observe(result(40, seconds=0.1))
+    assert sizer.documents == 51
+
+
+def test_sizer_stays_within_limits():
+    sizer = BulkChunkSizer("movies", 1000)
+    assert sizer.documents == 100
+    sizer.observe(result(100, seconds=0.1))
+    assert sizer.documents == 100
+    sizer.observe(result(3, seconds=0.1, throttled=True))
+    assert sizer.documents == 2
+
+
+def test_sizer_fixed_when_not_adaptive(monkeypatch):
+    monkeypatch.setattr(ESConfig, "bulk_adaptive", False)
+    sizer = BulkChunkSizer("movies", 40)
+    sizer.observe(result(40, seconds=0.1, throttled=True))
+    assert sizer.documents == 40
+
+
+def test_429_response_shrinks_next_chunks(tmp_path):
+    client = StubElasticsearch(statuses={"doc-0": 429})
+    loader = make_loader(tmp_path, client)
+    with pytest.raises(helpers.BulkIndexError):
+        loader.upload_data_to_es("movies", iter(documents(20)), itersize=8)
+    # Из первой пачки повторён отклонённый документ. Вторая пачка собрана, пока
+    # первая была в работе, а следующие - уже по лимиту 8 // 2.
+    assert [len(ids) for ids in client.requests] == [8, 1, 8, 4]
+
+
+def test_checkpoints_follow_submit_order(tmp_path, monkeypatch):
+    monkeypatch.setattr(ESConfig, "bulk_workers", 3)
+    monkeypatch.setattr(ESConfig, "bulk_chunks_in_flight", 3)
+    # Первая пачка отвечает последней.
+    client = StubElasticsearch(delays={"doc-0": 0.2})
+    loader = make_loader(tmp_path, client)
+    data = documents(6)
+    checkpoints: List[KeysetCursor] = []
+
+    stats = loader.upload_data_to_es("movies", iter(data), itersize=2, on_checkpoint=checkpoints.append)
+    assert stats.indexed == 6
+    assert client.requests[-1] == ["doc-0", "doc-1"]
+    assert checkpoints == [data[1][1], data[3][1], data[5][1]]
+
+
+def test_checkpoints_stop_at_first_failed_chunk(tmp_path):
+    client = StubElasticsearch(statuses={"doc-3": 503})
+    loader = make_loader(tmp_path, client)
+    data = documents(6)
+    checkpoints: List[KeysetCursor] = []
+    indexed: List[str] = []
+
+    with pytest.raises(helpers.BulkIndexError):
+        loader.upload_data_to_es(
+            "movies",
+            iter(data),
+            itersize=2,
+            on_checkpoint=checkpoints.append,
+            on_indexed=indexed.extend,
+        )
+    assert checkpoints == [data[1][1]]
+    # Остальные пачки загружены, но курсор за упавшую не уходит.
+    assert indexed == ["doc-0", "doc-1", "doc-2", "doc-4", "doc-5"]
+
+
+def test_dead_letters_do_not_hold_checkpoint(tmp_path):
+    client = StubElasticsearch(statuses={"doc-3": 400})
+    loader = make_loader(tmp_path, client)
+    data = documents(6)
+    checkpoints: List[KeysetCursor] = []
+
+    stats = loader.upload_data_to_es("movies", iter(data), itersize=2, on_checkpoint=checkpoints.append)
+    assert (stats.indexed, stats.dead_lettered) == (5, 1)
+    assert checkpoints == [data[1][1], data[3][1], data[5][1]]
+    assert list(loader._dead_letters.get_all("movies")) == ["doc-3"]
+
+
+def freshness_count(index: str) -> float:
+    return REGISTRY.get_sample_value("etl_freshness_lag_seconds_count", {"index": index}) or 0
+
+
+def test_freshness_observed_only_for_checkpointed_loads(tmp_path):
+    client = StubElasticsearch(statuses={"doc-1": 400})
+    loader = make_loader(tmp_path, client)
+
+    loader.upload_data_to_es("freshness", iter(documents(3)), itersize=2, on_indexed=lambda ids: None)
+    assert freshness_count("freshness") == 0
+    loader.upload_data_to_es("freshness", iter(documents(3)), itersize=2, on_checkpoint=lambda cursor: None)
+    # Отвергнутый документ в ES не попал, и его свежесть не считается.
+    assert freshness_count("freshness") == 2
@@ -0,0 +1,53 @@
+# Standard Library
+import uuid
+
+# Third Party
+import pytest
+
+# First Party
+from config.etl_config import ETLConfig
+from config.sql_queries import (
+    PreparedStatement,
+    keyset_page_sql_script,
+    keyset_tail_sql_script,
+)
+
+
+def fetch(cur, statement: PreparedStatement, params: tuple = ()) -> list:
+    cur.execute(statement.prepare)
+    cur.execute(statement.execute, params)
+    return [row[0] for row in cur.fetchall()]
+
+
+def insert_film(cur, seconds_ago: float) -> str:
+    film_id = str(uuid.uuid4())
+    cur.execute(
+        "INSERT INTO content.film_work (id, title, type, created_at, updated_at)"
+        " VALUES (%s, 'test keyset', 'movie', now(), now() - make_interval(secs => %s))",
+        (film_id, seconds_ago),
+    )
+    return film_id
+
+
+@pytest.fixture()
+def films(pg_conn, monkeypatch):
+    """Фильм старше окна COMMIT_LAG_SECONDS и только что записанный."""
+    monkeypatch.setattr(ETLConfig, "commit_lag", 60)
+    with pg_conn.cursor() as cur:
+        yield cur, insert_film(cur, 3600), insert_film(cur, 0)
+
+
+def test_page_skips_rows_inside_commit_lag(films):
+    cur, old, fresh = films
+    cur.execute("SELECT updated_at - interval '1 microsecond' FROM content.film_work WHERE id = %s", (old,))
+    (since,) = cur.fetchone()
+    page = fetch(cur, keyset_page_sql_script("film_work"), (since, str(uuid.UUID(int=0)), 100000))
+    assert old in page
+    assert fresh not in page
+
+
+def test_tail_skips_rows_inside_commit_lag(films):
+    cur, _, _ = films
+    [tail] = fetch(cur, keyset_tail_sql_script("film_work"))
+    cur.execute("SELECT updated_at > now() - interval '60 seconds' FROM content.film_work WHERE id = %s", (tail,))
+    assert cur.fetchone() == (False,)
@@ -0,0 +1,105 @@
+# Standard Library
+import uuid
+from typing import (
+    Dict,
+    List,
+)
+
+# Third Party
+import pytest
+from psycopg2.extras import RealDictCursor
+
+# First Party
+from benchmark.movie_query import LEGACY_MOVIE_QUERY
+from config.sql_queries import movie_index_sql_script
+
+
+# Фильм -> (жанры, персоны с ролями); персоны общие, актёр Bob ещё и сценарист.
+CATALOG = {
+    "full": (["Drama", "Comedy"], [("Ann", "director"), ("Bob", "actor"), ("Cid", "actor"), ("Bob", "writer")]),
+    "no_genres": ([], [("Cid", "actor"), ("Ann", "writer")]),
+    "no_persons": (["Drama"], []),
+    "empty": ([], []),
+}
+
+
+def create_catalog(cur) -> Dict[str, str]:
+    """Вставить CATALOG в content.*, вернуть id фильмов по их ключам."""
+    genres = {genre: str(uuid.uuid4()) for film_genres, _ in CATALOG.values() for genre in film_genres}
+    persons = {name: str(uuid.uuid4()) for _, film_persons in CATALOG.values() for name, _ in film_persons}
+    films = {key: str(uuid.uuid4()) for key in CATALOG}
+    for name, genre_id in genres.items():
+        cur.execute(
+            "INSERT INTO content.genre (id, name, created_at, updated_at) VALUES (%s, %s, now(), now())",
+            (genre_id, f"test {name}"),
+        )
+    for name, person_id in persons.items():
+        cur.execute(
+            "INSERT INTO content.person (id, full_name, created_at, updated_at) VALUES (%s, %s, now(), now())",
+            (person_id, f"test {name}"),
+        )
+    for key, (film_genres, film_persons) in CATALOG.items():
+        cur.execute(
+            "INSERT INTO content.film_work (id, title, rating, type, created_at, updated_at)"
+            " VALUES (%s, %s, 7.5, 'movie', now(), now())",
+            (films[key], f"test {key}"),
+        )
+        for genre in film_genres:
+            cur.execute(
+                "INSERT INTO content.genre_film_work (id, film_work_id, genre_id, created_at)"
+                " VALUES (%s, %s, %s, now())",
+                (str(uuid.uuid4()), films[key], genres[genre]),
+            )
+        for name, role in film_persons:
+            cur.execute(
+                "INSERT INTO content.person_film_work (id, film_work_id, person_id, role, created_at)"
+                " VALUES (%s, %s, %s, %s, now())",
+                (str(uuid.uuid4()), films[key], persons[name], role),
+            )
+    return films
+
+
+def fetch(cur, query: str, ids: List[str]) -> Dict[str, dict]:
+    cur.execute(query, {"ids": ids})
+    return {str(row["id"]): dict(row) for row in cur.fetchall()}
+
+
+@pytest.fixture()
+def documents(pg_conn) -> Dict[str, tuple]:
+    """Документы CATALOG по старому и текущему запросу movies: ключ фильма -> (legacy, current)."""
+    with pg_conn.cursor(cursor_factory=RealDictCursor) as cur:
+        films = create_catalog(cur)
+        ids = list(films.values())
+        legacy = fetch(cur, LEGACY_MOVIE_QUERY, ids)
+        current = fetch(cur, movie_index_sql_script(), ids)
+    return {key: (legacy[film_id], current[film_id]) for key, film_id in films.items()}
+
+
+@pytest.mark.parametrize("key", ["full", "no_persons"])
+def test_films_with_genres_match_legacy_query(documents, key):
+    legacy, current = documents[key]
+    assert current == legacy
+
+
+@pytest.mark.parametrize("key", ["no_genres", "empty"])
+def test_films_without_genres_get_empty_genre_list(documents, key):
+    # Старый запрос отдавал фильму без жанров [null]: LEFT JOIN жанров без FILTER.
+    legacy, current = documents[key]
+    assert legacy["genre"] == [None]
+    assert current == {**legacy, "genre": []}
+
+
+def test_person_aggregates(documents):
+    _, current = documents["full"]
+    assert current["director"] == ["test Ann"]
+    assert current["actors_names"] == ["test Bob", "test Cid"]
+    assert current["writers_names"] == ["test Bob"]
+    assert sorted(actor["name"] for actor in current["actors"]) == ["test Bob", "test Cid"]
+    assert [writer["name"] for writer in current["writers"]] == ["test Bob"]
+    assert current["genre"] == ["test Comedy", "test Drama"]
+
+
+def test_films_without_persons_get_empty_lists(documents):
+    _, current = documents["no_persons"]
+    for field in ("director", "actors", "writers", "actors_names", "writers_names"):
+        assert current[field] == []
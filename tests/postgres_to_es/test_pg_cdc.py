@@ -0,0 +1,222 @@
+# Standard Library
+from types import SimpleNamespace
+from typing import (
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+
+# Third Party
+import pytest
+from pg_cdc import (
+    PGChangeStream,
+    Relation,
+)
+
+# First Party
+from config.etl_config import PostgresConnectParameters
+
+
+# Сообщения pgoutput (proto_version 1, публикация content_changes), снятые
+# pg_logical_slot_get_binary_changes с трёх транзакций:
+#   1) вставка жанра GENRE, фильма FILM и их связи LINK;
+#   2) переименование жанра;
+#   3) удаление связи (REPLICA IDENTITY FULL - старая строка целиком, O),
+#      фильма и жанра (только ключ, K).
+GENRE = "11111111-1111-1111-1111-111111111111"
+FILM = "22222222-2222-2222-2222-222222222222"
+LINK = "33333333-3333-3333-3333-333333333333"
+CREATED = "2026-01-01 00:00:00+00"
+FILM_WORK_COLUMNS = [
+    "created_at",
+    "updated_at",
+    "id",
+    "title",
+    "description",
+    "creation_date",
+    "rating",
+    "type",
+    "file_path",
+]
+
+BEGIN_1 = bytes.fromhex("42000000003077b80000030120e167a3c900000451")
+RELATION_GENRE = bytes.fromhex(
+    "5200004094636f6e74656e740067656e72650064000500637265617465645f617400000004a0ffffffff007570646174"
+    "65645f617400000004a0ffffffff0169640000000b86ffffffff006e616d650000000413000001030064657363726970"
+    "74696f6e0000000019ffffffff",
+)
+INSERT_GENRE = bytes.fromhex(
+    "49000040944e00057400000016323032362d30312d30312030303a30303a30302b30307400000016323032362d30312d"
+    "30312030303a30303a30302b3030740000002431313131313131312d313131312d313131312d313131312d3131313131"
+    "3131313131313174000000044e6f69726e",
+)
+RELATION_FILM_WORK = bytes.fromhex(
+    "520000408d636f6e74656e740066696c6d5f776f726b0064000900637265617465645f617400000004a0ffffffff0075"
+    "7064617465645f617400000004a0ffffffff0169640000000b86ffffffff007469746c65000000041300000103006465"
+    "736372697074696f6e0000000019ffffffff006372656174696f6e5f64617465000000043affffffff00726174696e67"
+    "00000002bdffffffff00747970650000000019ffffffff0066696c655f70617468000000041300000204",
+)
+INSERT_FILM_WORK = bytes.fromhex(
+    "490000408d4e00097400000016323032362d30312d30312030303a30303a30302b30307400000016323032362d30312d"
+    "30312030303a30303a30302b3030740000002432323232323232322d323232322d323232322d323232322d3232323232"
+    "323232323232327400000004486561746e6e6e74000000056d6f7669656e",
+)
+RELATION_GENRE_FILM_WORK = bytes.fromhex(
+    "52000040a7636f6e74656e740067656e72655f66696c6d5f776f726b006600040169640000000b86ffffffff01637265"
+    "617465645f617400000004a0ffffffff0166696c6d5f776f726b5f69640000000b86ffffffff0167656e72655f696400"
+    "00000b86ffffffff",
+)
+INSERT_GENRE_FILM_WORK = bytes.fromhex(
+    "49000040a74e0004740000002433333333333333332d333333332d333333332d333333332d3333333333333333333333"
+    "337400000016323032362d30312d30312030303a30303a30302b3030740000002432323232323232322d323232322d32"
+    "3232322d323232322d323232323232323232323232740000002431313131313131312d313131312d313131312d313131"
+    "312d313131313131313131313131",
+)
+COMMIT_1 = bytes.fromhex("4300000000003077b800000000003077b83000030120e167a3c9")
+BEGIN_2 = bytes.fromhex("42000000003077bb0800030120e167ae5f00000452")
+UPDATE_GENRE = bytes.fromhex(
+    "55000040944e00057400000016323032362d30312d30312030303a30303a30302b30307400000016323032362d30312d"
+    "30312030303a30303a30302b3030740000002431313131313131312d313131312d313131312d313131312d3131313131"
+    "31313131313131740000000946696c6d206e6f69726e",
+)
+COMMIT_2 = bytes.fromhex("4300000000003077bb08000000003077bb3800030120e167ae5f")
+BEGIN_3 = bytes.fromhex("42000000003077c32000030120e167c18100000453")
+DELETE_GENRE_FILM_WORK = bytes.fromhex(
+    "44000040a74f0004740000002433333333333333332d333333332d333333332d333333332d3333333333333333333333"
+    "337400000016323032362d30312d30312030303a30303a30302b3030740000002432323232323232322d323232322d32"
+    "3232322d323232322d323232323232323232323232740000002431313131313131312d313131312d313131312d313131"
+    "312d313131313131313131313131",
+)
+DELETE_FILM_WORK = bytes.fromhex(
+    "440000408d4b00096e6e740000002432323232323232322d323232322d323232322d323232322d323232323232323232"
+    "3232326e6e6e6e6e6e",
+)
+DELETE_GENRE = bytes.fromhex(
+    "44000040944b00056e6e740000002431313131313131312d313131312d313131312d313131312d3131313131313131313131316e6e",
+)
+COMMIT_3 = bytes.fromhex("4300000000003077c320000000003077c35000030120e167c181")
+
+FIRST = [
+    BEGIN_1,
+    RELATION_GENRE,
+    INSERT_GENRE,
+    RELATION_FILM_WORK,
+    INSERT_FILM_WORK,
+    RELATION_GENRE_FILM_WORK,
+    INSERT_GENRE_FILM_WORK,
+    COMMIT_1,
+]
+SECOND = [BEGIN_2, UPDATE_GENRE, COMMIT_2]
+THIRD = [BEGIN_3, DELETE_GENRE_FILM_WORK, DELETE_FILM_WORK, DELETE_GENRE, COMMIT_3]
+
+
+class StubCursor:
+    """Курсор репликации: отдаёт сообщения из списка, wal_end - конец WAL из последнего keepalive."""
+
+    def __init__(self, messages: Iterable[bytes] = (), wal_end: int = 0) -> None:
+        self.messages = list(messages)
+        self.wal_end = wal_end
+        self.feedback: List[Tuple[int, int]] = []
+
+    def read_message(self) -> Optional[SimpleNamespace]:
+        if not self.messages:
+            return None
+        return SimpleNamespace(payload=self.messages.pop(0))
+
+    def send_feedback(self, write_lsn: int, flush_lsn: int, force: bool) -> None:
+        self.feedback.append((write_lsn, flush_lsn))
+
+
+@pytest.fixture()
+def stream() -> PGChangeStream:
+    return PGChangeStream(PostgresConnectParameters, "test_slot")
+
+
+def read_batch(stream: PGChangeStream, messages: Iterable[bytes], max_batch: int):
+    stream._cursor = StubCursor(messages)
+    return stream.read_batch(timeout=0, debounce=0, max_delay=0, max_batch=max_batch)
+
+
+def consume(stream: PGChangeStream, messages: Iterable[bytes]) -> Dict[str, Set[str]]:
+    changes: Dict[str, Set[str]] = {}
+    for message in messages:
+        stream._consume(message, changes)
+    return changes
+
+
+def tuples(message: bytes) -> List[List[str]]:
+    return list(PGChangeStream._read_tuples(message, 5))
+
+
+def test_relation_messages(stream):
+    consume(stream, FIRST)
+    assert sorted(stream._relations.values()) == [
+        Relation("content", "film_work", FILM_WORK_COLUMNS),
+        Relation("content", "genre", ["created_at", "updated_at", "id", "name", "description"]),
+        Relation("content", "genre_film_work", ["id", "created_at", "film_work_id", "genre_id"]),
+    ]
+
+
+def test_insert_tuple_data():
+    assert tuples(INSERT_GENRE) == [[CREATED, CREATED, GENRE, "Noir", None]]
+    assert tuples(INSERT_FILM_WORK) == [[CREATED, CREATED, FILM, "Heat", None, None, None, "movie", None]]
+    assert tuples(INSERT_GENRE_FILM_WORK) == [[LINK, CREATED, FILM, GENRE]]
+
+
+def test_update_tuple_data():
+    # Ключ не менялся, поэтому старого кортежа нет, только новый (N).
+    assert tuples(UPDATE_GENRE) == [[CREATED, CREATED, GENRE, "Film noir", None]]
+
+
+def test_delete_tuple_data():
+    assert tuples(DELETE_GENRE_FILM_WORK) == [[LINK, CREATED, FILM, GENRE]]
+    assert tuples(DELETE_FILM_WORK) == [[None, None, FILM, None, None, None, None, None, None]]
+    assert tuples(DELETE_GENRE) == [[None, None, GENRE, None, None]]
+
+
+def test_commit_returns_end_lsn(stream):
+    changes: Dict[str, Set[str]] = {}
+    lsns = [stream._consume(message, changes) for message in FIRST + SECOND]
+    assert lsns == [0] * 7 + [0x3077B830, 0, 0, 0x3077BB38]
+
+
+def test_changes_map_to_source_tables(stream):
+    assert consume(stream, FIRST) == {"genre": {GENRE}, "film_work": {FILM}}
+    assert consume(stream, SECOND) == {"genre": {GENRE}}
+    assert consume(stream, THIRD) == {"film_work": {FILM}, "genre": {GENRE}}
+
+
+def test_changes_wait_for_commit(stream):
+    changes = consume(stream, FIRST[:-1])
+    assert changes == {}
+    # Новый BEGIN без COMMIT (повтор после переподключения) отбрасывает незавершённую транзакцию.
+    assert consume(stream, [BEGIN_2, COMMIT_2]) == {}
+
+
+def test_batch_ends_at_commit_with_max_batch(stream):
+    batch = read_batch(stream, FIRST + SECOND, max_batch=2)
+    assert batch.changes == {"genre": {GENRE}, "film_work": {FILM}}
+    assert batch.lsn == 0x3077B830
+    # Вторая транзакция осталась в потоке до следующей пачки.
+    assert stream._cursor.messages == SECOND
+
+
+def test_batch_without_commit_is_empty(stream):
+    assert read_batch(stream, FIRST[:-1], max_batch=100) is None
+
+
+def test_idle_ack_sends_last_received_lsn(stream):
+    stream._cursor = StubCursor(wal_end=0x3077C350)
+    stream.ack_idle()
+    stream.ack_idle()
+    assert stream._cursor.feedback == [(0x3077C350, 0x3077C350)]
+
+
+def test_idle_ack_waits_for_open_transaction(stream):
+    read_batch(stream, FIRST[:-1], max_batch=100)
+    stream._cursor.wal_end = 0x3077C350
+    stream.ack_idle()
+    assert stream._cursor.feedback == []
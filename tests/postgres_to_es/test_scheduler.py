@@ -0,0 +1,80 @@
+# Standard Library
+from datetime import (
+    datetime,
+    timedelta,
+    timezone,
+)
+
+# Third Party
+import pytest
+from etl import SyncReport
+from scheduler import AdaptiveScheduler
+
+# First Party
+from config.etl_config import ETLProcessConfig
+
+
+def make_scheduler(adaptive: bool = True) -> AdaptiveScheduler:
+    config = ETLProcessConfig(
+        FREQUENCY=10,
+        ADAPTIVE_SCHEDULE=adaptive,
+        SCHEDULE_MIN_INTERVAL=1,
+        SCHEDULE_MAX_INTERVAL=40,
+        SCHEDULE_TARGET_LAG=30,
+    )
+    return AdaptiveScheduler(config)
+
+
+def report(rows: int = 0, lag: float = 0) -> SyncReport:
+    if not rows:
+        return SyncReport()
+    return SyncReport(rows=rows, oldest=datetime.now(timezone.utc) - timedelta(seconds=lag))
+
+
+@pytest.fixture()
+def scheduler() -> AdaptiveScheduler:
+    return make_scheduler()
+
+
+def test_fixed_interval_when_not_adaptive():
+    scheduler = make_scheduler(adaptive=False)
+    assert scheduler.next_interval(report()) == 10
+    assert scheduler.next_interval(report(rows=500, lag=100)) == 10
+    assert scheduler.decision == "fixed"
+
+
+def test_idle_cycles_grow_interval_up_to_max(scheduler):
+    intervals = [scheduler.next_interval(report()) for _ in range(4)]
+    assert intervals == [20, 40, 40, 40]
+    assert scheduler.decision == "idle"
+
+
+def test_backlog_shrinks_interval_down_to_min(scheduler):
+    intervals = [scheduler.next_interval(report(rows=10, lag=1)) for _ in range(5)]
+    assert intervals == [5, 2.5, 1.25, 1, 1]
+    assert scheduler.decision == "busy"
+
+
+def test_behind_target_lag_jumps_to_min(scheduler):
+    scheduler.next_interval(report())
+    assert scheduler.next_interval(report(rows=10, lag=60)) == 1
+    assert scheduler.decision == "behind"
+
+
+def test_report_kept_for_next_cycle(scheduler):
+    cycle = report(rows=3, lag=1)
+    scheduler.next_interval(cycle)
+    assert scheduler.last_report is cycle
+
+
+def test_backoff_grows_like_idle_cycle(scheduler):
+    assert [scheduler.backoff() for _ in range(3)] == [20, 40, 40]
+    assert scheduler.decision == "failed"
+    # Успешный цикл после сбоя снова укорачивает паузу.
+    assert scheduler.next_interval(report(rows=10, lag=1)) == 20
+
+
+def test_backoff_fixed_when_not_adaptive():
+    scheduler = make_scheduler(adaptive=False)
+    assert scheduler.backoff() == 10
+    assert scheduler.backoff() == 10
@@ -0,0 +1,70 @@
+# Third Party
+import pytest
+
+# First Party
+from config.etl_config import ETLIndexes
+from config.states import (
+    SQLITE_MAX_PARAMETERS,
+    DeadLetterStore,
+    DocumentHashStore,
+    RedisState,
+    SQLiteStorage,
+)
+
+
+@pytest.fixture()
+def state(tmp_path) -> RedisState:
+    return RedisState(storage=SQLiteStorage(str(tmp_path / "state.sqlite3")))
+
+
+def test_hashes_round_trip(state):
+    hashes = DocumentHashStore(state)
+    ids = [f"doc-{number}" for number in range(SQLITE_MAX_PARAMETERS * 2 + 1)]
+    hashes.set_many("movies", {doc_id: doc_id.encode() for doc_id in ids})
+    hashes.discard("movies", ids[:1])
+
+    assert hashes.get_many("movies", ["missing", *ids]) == [None, None, *(doc_id.encode() for doc_id in ids[1:])]
+    assert hashes.get_many("persons", ids[:2]) == [None, None]
+
+
+def test_hashes_rename_replaces_target(state):
+    hashes = DocumentHashStore(state)
+    hashes.set_many("movies", {"a": b"1"})
+    hashes.set_many("movies_v2", {"b": b"2"})
+    hashes.rename("movies_v2", "movies")
+    assert hashes.get_many("movies", ["a", "b"]) == [None, b"2"]
+    assert hashes.get_many("movies_v2", ["b"]) == [None]
+
+
+def test_hashes_rename_drops_target_without_source(state):
+    hashes = DocumentHashStore(state)
+    hashes.set_many("movies", {"a": b"1"})
+    hashes.rename("movies_v2", "movies")
+    assert hashes.get_many("movies", ["a"]) == [None]
+
+
+def test_hashes_keyed_by_index_value(state):
+    hashes = DocumentHashStore(state)
+    hashes.set_many(ETLIndexes.movies, {"a": b"1"})
+    assert hashes.get_many("movies", ["a"]) == [b"1"]
+
+
+def test_dead_letters_rename_drops_target_without_source(state):
+    letters = DeadLetterStore(state)
+    letters.add("movies", {"a": '{"status": 400}', "b": '{"status": 400}'})
+    letters.discard("movies", ["b"])
+    assert letters.get_all("movies") == {"a": '{"status": 400}'}
+
+    letters.rename("movies_v2", "movies")
+    assert letters.get_all("movies") == {}
+
+
+def test_fields_do_not_touch_state_keys(state):
+    state.set_state("document_hashes_in_movies", "cursor")
+    DocumentHashStore(state).forget("movies")
+    assert state.get_state("document_hashes_in_movies") == "cursor"
+
+
+def test_dead_letters_keyed_by_index_value(state):
+    DeadLetterStore(state).add(ETLIndexes.movies, {"a": '{"status": 400}'})
+    assert DeadLetterStore(state).get_all("movies") == {"a": '{"status": 400}'}
@@ -0,0 +1,109 @@
+# Standard Library
+import uuid
+from datetime import (
+    datetime,
+    timezone,
+)
+
+# Third Party
+import psycopg2
+import pytest
+
+# First Party
+from config.etl_config import (
+    TOMBSTONES,
+    ETLIndexes,
+    PostgresConnectParameters,
+)
+from config.etl_models import (
+    KeysetCursor,
+    RebuildState,
+)
+from config.sql_queries import (
+    tombstone_purge_sql_script,
+    tombstone_seal_sql_script,
+)
+from config.states import (
+    RedisState,
+    SQLiteStorage,
+)
+from etl import ETL
+
+
+def cursor_at(second: int) -> KeysetCursor:
+    return KeysetCursor(id=uuid.UUID(int=second), updated_at=datetime(2026, 1, 1, second=second, tzinfo=timezone.utc))
+
+
+def insert_tombstone(cur) -> str:
+    cur.execute(
+        "INSERT INTO content.tombstone (table_name, row_id) VALUES ('film_work', %s) RETURNING id::text",
+        (str(uuid.uuid4()),),
+    )
+    return cur.fetchone()[0]
+
+
+def test_seal_follows_commit_order(pg_conn):
+    """Надгробие долгой транзакции читается после более позднего, но раньше зафиксированного."""
+    other = psycopg2.connect(connect_timeout=3, **PostgresConnectParameters().model_dump())
+    other.autocommit = True
+    ids = []
+    try:
+        with pg_conn.cursor() as long_cur, other.cursor() as cur:
+            ids.append(insert_tombstone(long_cur))
+            ids.append(insert_tombstone(cur))
+            cur.execute(tombstone_seal_sql_script())
+            pg_conn.commit()
+            cur.execute(tombstone_seal_sql_script())
+
+            cur.execute(
+                "SELECT id::text, deleted_at, sealed_at FROM content.tombstone WHERE id = ANY(%s::uuid[])",
+                (ids,),
+            )
+            rows = {row[0]: row[1:] for row in cur.fetchall()}
+            (long_deleted, long_sealed), (deleted, sealed) = rows[ids[0]], rows[ids[1]]
+            assert long_deleted < deleted
+            assert long_sealed > sealed
+
+            cur.execute(tombstone_purge_sql_script(), {"sealed_at": sealed, "id": ids[1], "before": long_sealed})
+            cur.execute("SELECT id::text FROM content.tombstone WHERE id = ANY(%s::uuid[])", (ids,))
+            assert [row[0] for row in cur.fetchall()] == [ids[0]]
+    finally:
+        with other.cursor() as cur:
+            cur.execute("DELETE FROM content.tombstone WHERE id = ANY(%s::uuid[])", (ids,))
+        other.close()
+
+
+class PurgeRecorder:
+    def __init__(self) -> None:
+        self.calls = []
+
+    def purge_tombstones(self, applied: KeysetCursor, before: datetime) -> int:
+        self.calls.append(applied)
+        return 0
+
+
+@pytest.fixture()
+def etl(tmp_path) -> ETL:
+    etl = ETL.__new__(ETL)
+    etl._state = RedisState(storage=SQLiteStorage(str(tmp_path / "state.sqlite3")))
+    etl._extractor = PurgeRecorder()
+    return etl
+
+
+def test_purge_waits_for_stored_cursors(etl):
+    etl.purge_tombstones()
+    assert etl._extractor.calls == []
+
+
+def test_purge_stops_at_slowest_cursor(etl):
+    etl.set_cursors({ETLIndexes.movies: cursor_at(30), ETLIndexes.persons: cursor_at(20)}, TOMBSTONES)
+    etl.purge_tombstones()
+    assert etl._extractor.calls == [cursor_at(20)]
+
+
+def test_purge_keeps_tombstones_of_unfinished_rebuild(etl):
+    etl.set_cursors({ETLIndexes.movies: cursor_at(30)}, TOMBSTONES)
+    rebuild = RebuildState(target="genres_v2", cursors={TOMBSTONES: cursor_at(10)})
+    etl._state.set_state(RebuildState.key(ETLIndexes.genres.value), rebuild.model_dump_json())
+    etl.purge_tombstones()
+    assert etl._extractor.calls == [cursor_at(10)]